@@ -0,0 +1,544 @@
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import time
+from collections import deque
+import httpx
+from http_pool import client_for, close_clients
+from circuit_breaker import allow_request, record_result, release_probe, breaker_states
+from rate_limit import acquire, settle
+from token_budget import count_tokens
+import metrics
+
+log = logging.getLogger(__name__)
+
+GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+
+# Base URLs can be pointed at a local fake provider (see loadtest.py)
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL", "https://api.groq.com/openai/v1")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta")
+GROQ_MODEL = "llama-3.3-70b-versatile"
+OPENAI_MODEL = "gpt-4o-mini"
+# responseSchema needs a 1.5+ model
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+
+# Ask providers for structured output when the caller passes a schema (set to 0 to rely on parsing alone)
+AI_JSON_MODE = os.getenv("AI_JSON_MODE", "1") == "1"
+
+AI_TIMEOUT = float(os.getenv("AI_TIMEOUT", "60"))
+AI_RETRY_BACKOFF = float(os.getenv("AI_RETRY_BACKOFF", "0.5"))
+# Completion limit for callers that do not size their own (see token_budget.MAX_OUTPUT_TOKENS)
+AI_MAX_TOKENS = int(os.getenv("AI_MAX_TOKENS", "16000"))
+
+# Provider quotas (per minute, across all workers; 0 disables). Calls queue for up to
+# PROVIDER_MAX_QUEUE_WAIT seconds for room, otherwise the provider is skipped before it can 429.
+PROVIDER_MAX_QUEUE_WAIT = float(os.getenv("PROVIDER_MAX_QUEUE_WAIT", "5"))
+# The last configured provider has nothing to fall back to, so it waits for room past a full window
+PROVIDER_LAST_QUEUE_WAIT = float(os.getenv("PROVIDER_LAST_QUEUE_WAIT", "90"))
+# Completion tokens reserved against a provider's TPM quota before a call (less when max_tokens is
+# smaller); the reservation is corrected to the usage the provider reports once the call is done
+PROVIDER_OUTPUT_ESTIMATE = int(os.getenv("PROVIDER_OUTPUT_ESTIMATE", "1000"))
+
+# Hedged mode starts the next provider in parallel once the current one is slower than usual
+AI_HEDGE = os.getenv("AI_HEDGE", "0") == "1"
+AI_HEDGE_DELAY = os.getenv("AI_HEDGE_DELAY")  # fixed delay in seconds, overrides the adaptive one
+AI_HEDGE_DEFAULT_DELAY = float(os.getenv("AI_HEDGE_DEFAULT_DELAY", "10"))
+AI_HEDGE_MIN_DELAY = float(os.getenv("AI_HEDGE_MIN_DELAY", "2"))
+AI_HEDGE_MAX_DELAY = float(os.getenv("AI_HEDGE_MAX_DELAY", "30"))
+AI_HEDGE_PERCENTILE = float(os.getenv("AI_HEDGE_PERCENTILE", "95"))
+
+PROVIDER_TIMEOUT = httpx.Timeout(AI_TIMEOUT, connect=10)
+
+# USD per million input and output tokens, for the cost metric
+PROVIDER_PRICES = {
+    "Groq": (0.59, 0.79),
+    "OpenAI": (0.15, 0.60),
+    "Gemini": (0.075, 0.30)
+}
+
+metrics.counter("svl_provider_requests_total", "Provider attempts by outcome (success, empty, error, json_mode_rejected, circuit_open, over_budget)")
+metrics.histogram("svl_provider_duration_seconds", "Provider call latency, to the last token for streams")
+metrics.histogram("svl_provider_ttfb_seconds", "Time to the first streamed token")
+metrics.counter("svl_provider_tokens_total", "Tokens reported by the provider, by direction (prompt, completion)")
+metrics.counter("svl_provider_cost_usd_total", "Estimated spend from reported tokens and PROVIDER_PRICES")
+metrics.counter("svl_ai_calls_total", "AI calls by the provider that answered (none when all failed)")
+
+# Total tokens the provider reported for the current call, read back to settle its TPM reservation
+_reported_tokens = contextvars.ContextVar("reported_tokens", default=None)
+
+def record_usage(name: str, prompt_tokens: int, completion_tokens: int):
+    prompt_tokens, completion_tokens = prompt_tokens or 0, completion_tokens or 0
+    _reported_tokens.set(prompt_tokens + completion_tokens)
+    metrics.inc("svl_provider_tokens_total", prompt_tokens, provider=name, direction="prompt")
+    metrics.inc("svl_provider_tokens_total", completion_tokens, provider=name, direction="completion")
+    input_price, output_price = PROVIDER_PRICES.get(name, (0, 0))
+    metrics.inc("svl_provider_cost_usd_total", (prompt_tokens * input_price + completion_tokens * output_price) / 1e6, provider=name)
+
+def _record_openai_usage(name: str, usage: dict):
+    if usage:
+        record_usage(name, usage.get("prompt_tokens"), usage.get("completion_tokens"))
+
+def _record_gemini_usage(usage: dict):
+    if usage:
+        record_usage("Gemini", usage.get("promptTokenCount"), usage.get("candidatesTokenCount"))
+
+async def close_client():
+    await close_clients()
+
+def _object_schema(schema: dict) -> bool:
+    # OpenAI-compatible JSON modes only accept an object at the top level
+    return bool(schema) and schema.get("type") == "object"
+
+def gemini_schema(schema: dict):
+    """schemas.py entry as a Gemini responseSchema, or None if part of it is untyped
+
+    Gemini only emits declared, typed properties, so a schema with a free-form
+    field (like a quiz answer that is an index or a boolean) is not sent at all.
+    """
+    kind = schema.get("type")
+    if not kind:
+        return None
+    converted = {"type": kind.upper()}
+    if "properties" in schema:
+        converted["properties"] = {}
+        for key, sub in schema["properties"].items():
+            sub = gemini_schema(sub)
+            if sub is None:
+                return None
+            converted["properties"][key] = sub
+    if "required" in schema:
+        converted["required"] = schema["required"]
+    if "items" in schema:
+        converted["items"] = gemini_schema(schema["items"])
+        if converted["items"] is None:
+            return None
+    return converted
+
+async def _chat_completion(name: str, base_url: str, api_key: str, model: str, prompt: str, max_tokens: int, response_format: dict = None) -> str:
+    """OpenAI-compatible chat completion (used by Groq and OpenAI)"""
+    body = {
+        "model": model,
+        "messages": [{"role": "user", "content": prompt}],
+        "max_tokens": max_tokens,
+        "temperature": 0.2
+    }
+    if response_format:
+        body["response_format"] = response_format
+    response = await client_for(base_url).post(
+        f"{base_url}/chat/completions",
+        headers={"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"},
+        json=body,
+        timeout=PROVIDER_TIMEOUT
+    )
+    response.raise_for_status()
+    data = response.json()
+    _record_openai_usage(name, data.get("usage"))
+    return data["choices"][0]["message"]["content"].strip()
+
+async def call_groq(prompt: str, max_tokens: int, schema: dict = None) -> str:
+    # Groq's Llama models support JSON object mode but not full schemas
+    response_format = {"type": "json_object"} if _object_schema(schema) else None
+    return await _chat_completion("Groq", GROQ_BASE_URL, GROQ_API_KEY, GROQ_MODEL, prompt, max_tokens, response_format)
+
+async def call_openai(prompt: str, max_tokens: int, schema: dict = None) -> str:
+    response_format = None
+    if _object_schema(schema):
+        response_format = {"type": "json_schema", "json_schema": {"name": "response", "schema": schema, "strict": False}}
+    return await _chat_completion("OpenAI", OPENAI_BASE_URL, OPENAI_API_KEY, OPENAI_MODEL, prompt, max_tokens, response_format)
+
+async def call_gemini(prompt: str, max_tokens: int, schema: dict = None) -> str:
+    generation_config = {"temperature": 0.2, "maxOutputTokens": max_tokens}
+    if schema:
+        generation_config["responseMimeType"] = "application/json"
+        response_schema = gemini_schema(schema)
+        if response_schema:
+            generation_config["responseSchema"] = response_schema
+    response = await client_for(GEMINI_BASE_URL).post(
+        f"{GEMINI_BASE_URL}/models/{GEMINI_MODEL}:generateContent",
+        params={"key": GEMINI_API_KEY},
+        headers={"Content-Type": "application/json"},
+        json={
+            "contents": [{"parts": [{"text": prompt}]}],
+            "generationConfig": generation_config
+        },
+        timeout=PROVIDER_TIMEOUT
+    )
+    response.raise_for_status()
+    data = response.json()
+    _record_gemini_usage(data.get("usageMetadata"))
+    return data["candidates"][0]["content"]["parts"][0]["text"].strip()
+
+async def _stream_chat_completion(name: str, base_url: str, api_key: str, model: str, prompt: str, max_tokens: int, stream_options: dict = None):
+    """Yield content deltas from an OpenAI-compatible streaming completion"""
+    body = {
+        "model": model,
+        "messages": [{"role": "user", "content": prompt}],
+        "max_tokens": max_tokens,
+        "temperature": 0.2,
+        "stream": True
+    }
+    if stream_options:
+        body["stream_options"] = stream_options
+    async with client_for(base_url).stream(
+        "POST",
+        f"{base_url}/chat/completions",
+        headers={"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"},
+        json=body,
+        timeout=PROVIDER_TIMEOUT
+    ) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                break
+            chunk = json.loads(data)
+            # OpenAI sends usage in a final chunk when asked to, Groq on its last chunk under x_groq
+            _record_openai_usage(name, chunk.get("usage") or (chunk.get("x_groq") or {}).get("usage"))
+            choices = chunk.get("choices") or [{}]
+            delta = choices[0].get("delta", {}).get("content")
+            if delta:
+                yield delta
+
+async def stream_groq(prompt: str, max_tokens: int):
+    async for chunk in _stream_chat_completion("Groq", GROQ_BASE_URL, GROQ_API_KEY, GROQ_MODEL, prompt, max_tokens):
+        yield chunk
+
+async def stream_openai(prompt: str, max_tokens: int):
+    async for chunk in _stream_chat_completion(
+        "OpenAI", OPENAI_BASE_URL, OPENAI_API_KEY, OPENAI_MODEL, prompt, max_tokens, {"include_usage": True}
+    ):
+        yield chunk
+
+async def stream_gemini(prompt: str, max_tokens: int):
+    async with client_for(GEMINI_BASE_URL).stream(
+        "POST",
+        f"{GEMINI_BASE_URL}/models/{GEMINI_MODEL}:streamGenerateContent",
+        params={"key": GEMINI_API_KEY, "alt": "sse"},
+        headers={"Content-Type": "application/json"},
+        json={
+            "contents": [{"parts": [{"text": prompt}]}],
+            "generationConfig": {"temperature": 0.2, "maxOutputTokens": max_tokens}
+        },
+        timeout=PROVIDER_TIMEOUT
+    ) as response:
+        response.raise_for_status()
+        usage = None
+        async for line in response.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            chunk = json.loads(line[5:].strip())
+            # Every chunk carries the running totals, so only the last one is recorded
+            usage = chunk.get("usageMetadata") or usage
+            candidates = chunk.get("candidates") or []
+            for part in candidates[0].get("content", {}).get("parts", []) if candidates else []:
+                if part.get("text"):
+                    yield part["text"]
+        _record_gemini_usage(usage)
+
+# Fallback order: name, api key, attempts, caller, streaming caller, model and its completion
+# limit, requests/tokens per minute
+PROVIDERS = [
+    {"name": "Groq", "key": GROQ_API_KEY, "attempts": 2, "call": call_groq, "stream": stream_groq,
+     "model": GROQ_MODEL, "max_output": 32768,
+     "rpm": int(os.getenv("GROQ_RPM", "30")), "tpm": int(os.getenv("GROQ_TPM", "12000"))},
+    {"name": "OpenAI", "key": OPENAI_API_KEY, "attempts": 1, "call": call_openai, "stream": stream_openai,
+     "model": OPENAI_MODEL, "max_output": 16384,
+     "rpm": int(os.getenv("OPENAI_RPM", "500")), "tpm": int(os.getenv("OPENAI_TPM", "200000"))},
+    {"name": "Gemini", "key": GEMINI_API_KEY, "attempts": 1, "call": call_gemini, "stream": stream_gemini,
+     "model": GEMINI_MODEL, "max_output": 8192,
+     "rpm": int(os.getenv("GEMINI_RPM", "15")), "tpm": int(os.getenv("GEMINI_TPM", "1000000"))},
+]
+
+def _max_tokens(provider: dict, max_tokens: int = None) -> int:
+    return min(max_tokens or AI_MAX_TOKENS, provider["max_output"])
+
+def estimate_tokens(provider: dict, prompt: str, max_tokens: int = None) -> int:
+    """Prompt tokens plus the expected completion; max_tokens is a cap most calls stay well under"""
+    return count_tokens(prompt, provider["model"]) + min(max_tokens or PROVIDER_OUTPUT_ESTIMATE, PROVIDER_OUTPUT_ESTIMATE)
+
+async def within_budget(provider: dict, prompt: str, max_tokens: int = None, max_wait: float = PROVIDER_MAX_QUEUE_WAIT):
+    """Reserve one request and the estimated tokens against the provider's per-minute quota
+
+    Returns None when the provider should be skipped, otherwise the reservation
+    (request time, token time and token estimate; times are None for a quota
+    that is off) for settle_budget or release_budget.
+    """
+    name = provider["name"]
+    requests_at = tokens_at = None
+    estimate = 0
+    if provider["rpm"]:
+        requests_at = await acquire(f"provider:{name}:requests", 1, provider["rpm"], 60, max_wait)
+        if not requests_at:
+            return None
+    if provider["tpm"]:
+        estimate = estimate_tokens(provider, prompt, max_tokens)
+        tokens_at = await acquire(f"provider:{name}:tokens", estimate, provider["tpm"], 60, max_wait)
+        if not tokens_at:
+            release_budget(provider, (requests_at, None, 0))
+            return None
+    _reported_tokens.set(None)
+    return (requests_at, tokens_at, estimate)
+
+def settle_budget(provider: dict, reservation):
+    """Replace the estimate with the tokens the provider reported for the call, when it did"""
+    _, tokens_at, estimate = reservation
+    used = _reported_tokens.get()
+    if tokens_at is not None and used is not None:
+        settle(f"provider:{provider['name']}:tokens", tokens_at, estimate, used)
+
+def release_budget(provider: dict, reservation):
+    """Give back a reservation for a call that was not made"""
+    requests_at, tokens_at, estimate = reservation
+    if requests_at is not None:
+        settle(f"provider:{provider['name']}:requests", requests_at, 1, 0)
+    if tokens_at is not None:
+        settle(f"provider:{provider['name']}:tokens", tokens_at, estimate, 0)
+
+async def claim_provider(provider: dict, prompt: str, max_tokens: int, max_wait: float, mode: str):
+    """Breaker permit and budget reservation for one call, or None to skip the provider
+
+    The budget is reserved before the breaker's half-open probe is claimed, so a
+    probe is never held by a caller that then gives up waiting for quota.
+    """
+    name = provider["name"]
+    if not allow_request(name, claim=False):
+        log.info("Provider skipped, circuit open", extra={"provider": name})
+        metrics.inc("svl_provider_requests_total", provider=name, mode=mode, outcome="circuit_open")
+        return None
+    reservation = await within_budget(provider, prompt, max_tokens, max_wait)
+    if reservation is None:
+        log.info("Provider skipped, over rate budget", extra={"provider": name})
+        metrics.inc("svl_provider_requests_total", provider=name, mode=mode, outcome="over_budget")
+        return None
+    permit = allow_request(name)
+    if not permit:
+        # Another caller took the probe while this one waited for quota
+        release_budget(provider, reservation)
+        log.info("Provider skipped, circuit open", extra={"provider": name})
+        metrics.inc("svl_provider_requests_total", provider=name, mode=mode, outcome="circuit_open")
+        return None
+    return permit, reservation
+
+def queue_wait(providers: list, provider: dict) -> float:
+    return PROVIDER_LAST_QUEUE_WAIT if provider is providers[-1] else PROVIDER_MAX_QUEUE_WAIT
+
+# Recent successful call latencies per provider, used to size the hedge delay
+provider_latencies = {provider["name"]: deque(maxlen=200) for provider in PROVIDERS}
+# Time to first streamed token per provider
+provider_ttfb = {provider["name"]: deque(maxlen=200) for provider in PROVIDERS}
+
+def percentile(samples, pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(len(ordered) * pct / 100))
+    return ordered[index]
+
+def hedge_delay(name: str) -> float:
+    """How long to wait on a provider before racing the next one"""
+    if AI_HEDGE_DELAY:
+        return float(AI_HEDGE_DELAY)
+    samples = provider_latencies[name]
+    if len(samples) < 20:
+        return AI_HEDGE_DEFAULT_DELAY
+    return min(AI_HEDGE_MAX_DELAY, max(AI_HEDGE_MIN_DELAY, percentile(samples, AI_HEDGE_PERCENTILE)))
+
+def provider_stats() -> dict:
+    stats = {}
+    for name, samples in provider_latencies.items():
+        stats[name] = {
+            "samples": len(samples),
+            "p50": round(percentile(samples, 50), 3) if samples else None,
+            "p95": round(percentile(samples, 95), 3) if samples else None,
+            "hedge_delay": hedge_delay(name),
+            "ttfb_p50": round(percentile(provider_ttfb[name], 50), 3) if provider_ttfb[name] else None
+        }
+    return stats
+
+def _retryable(error: Exception) -> bool:
+    """Client errors such as a bad key or bad request fail the same way on retry"""
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        return status >= 500 or status in (408, 429)
+    return True
+
+def _rejected_json_mode(error: Exception) -> bool:
+    return isinstance(error, httpx.HTTPStatusError) and error.response.status_code == 400
+
+async def _try_provider(provider: dict, prompt: str, schema: dict = None, max_tokens: int = None,
+                        max_wait: float = PROVIDER_MAX_QUEUE_WAIT) -> str:
+    """Run all attempts for one provider, returning an empty string on failure
+
+    With a schema the provider is asked for structured output; if it rejects the
+    request (unsupported mode, or generated JSON it could not validate itself)
+    the call is repeated once as plain text and left to json_extract.
+    """
+    name = provider["name"]
+    json_schema = schema if AI_JSON_MODE else None
+    attempt = 0
+    while attempt < provider["attempts"]:
+        claimed = await claim_provider(provider, prompt, max_tokens, max_wait, "call")
+        if claimed is None:
+            return ""
+        permit, reservation = claimed
+        log.debug("Calling provider", extra={"provider": name, "attempt": attempt + 1})
+        start = time.perf_counter()
+        recorded = False
+        try:
+            result = await provider["call"](prompt, _max_tokens(provider, max_tokens), json_schema)
+            latency = time.perf_counter() - start
+            settle_budget(provider, reservation)
+            record_result(name, bool(result), latency)
+            recorded = True
+        except Exception as e:
+            if json_schema and _rejected_json_mode(e):
+                log.warning("Provider rejected JSON mode, retrying as plain text", extra={"provider": name})
+                metrics.inc("svl_provider_requests_total", provider=name, mode="call", outcome="json_mode_rejected")
+                # Not the provider's fault, so it does not use up an attempt
+                json_schema = None
+                continue
+            record_result(name, False, time.perf_counter() - start)
+            recorded = True
+            metrics.inc("svl_provider_requests_total", provider=name, mode="call", outcome="error")
+            log.warning("Provider call failed", extra={"provider": name, "attempt": attempt + 1, "error": str(e)[:200]})
+            if not _retryable(e):
+                return ""
+            attempt += 1
+            if attempt < provider["attempts"]:
+                await asyncio.sleep(AI_RETRY_BACKOFF)
+            continue
+        finally:
+            # Cancelled (a lost hedge race) or repeated as plain text: hand the probe back
+            if not recorded:
+                release_probe(name, permit)
+        metrics.observe("svl_provider_duration_seconds", latency, provider=name, mode="call")
+        metrics.inc("svl_provider_requests_total", provider=name, mode="call", outcome="success" if result else "empty")
+        if result:
+            provider_latencies[name].append(latency)
+            log.debug("Provider succeeded", extra={"provider": name, "chars": len(result), "seconds": round(latency, 3)})
+            return result
+        attempt += 1
+    return ""
+
+def provider_health() -> dict:
+    return breaker_states([provider["name"] for provider in PROVIDERS])
+
+async def _call_hedged(providers: list, prompt: str, schema: dict = None, max_tokens: int = None):
+    """Start providers in fallback order, racing the next one when the current one is slow
+
+    The first non-empty response wins and the losing requests are cancelled.
+    Returns the response and the name of the provider that gave it.
+    """
+    queue = list(providers)
+    pending = set()
+    names = {}
+    try:
+        while queue or pending:
+            delay = None
+            if queue:
+                provider = queue.pop(0)
+                task = asyncio.create_task(_try_provider(provider, prompt, schema, max_tokens, queue_wait(providers, provider)))
+                names[task] = provider["name"]
+                pending.add(task)
+                if queue:
+                    delay = hedge_delay(provider["name"])
+            done, pending = await asyncio.wait(pending, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                result = task.result()
+                if result:
+                    return result, names[task]
+            if not done and queue:
+                log.info("Hedging with next provider", extra={"provider": queue[0]["name"], "delay": round(delay, 1)})
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+    return "", None
+
+async def call_ai_with_fallback(prompt: str, schema: dict = None, max_tokens: int = None) -> str:
+    """Try Groq -> OpenAI -> Gemini without blocking the event loop
+
+    Pass the response schema from schemas.py to request provider-native JSON output,
+    and max_tokens from token_budget to size the completion.
+    """
+    providers = [provider for provider in PROVIDERS if provider["key"]]
+    if AI_HEDGE:
+        result, name = await _call_hedged(providers, prompt, schema, max_tokens)
+        if result:
+            metrics.inc("svl_ai_calls_total", mode="call", provider=name)
+            return result
+    else:
+        for provider in providers:
+            result = await _try_provider(provider, prompt, schema, max_tokens, queue_wait(providers, provider))
+            if result:
+                metrics.inc("svl_ai_calls_total", mode="call", provider=provider["name"])
+                return result
+
+    log.error("All AI providers failed")
+    metrics.inc("svl_ai_calls_total", mode="call", provider="none")
+    return ""
+
+async def stream_ai_with_fallback(prompt: str, stats: dict = None, max_tokens: int = None):
+    """Yield response text as the provider streams it
+
+    A provider whose stream fails before the first token falls through to the
+    next one. Once tokens have been sent the stream cannot switch providers, so
+    a later failure is raised to the caller. Provider name and time to first
+    token are written into stats.
+    """
+    stats = stats if stats is not None else {}
+    providers = [provider for provider in PROVIDERS if provider["key"]]
+    for provider in providers:
+        name = provider["name"]
+        claimed = await claim_provider(provider, prompt, max_tokens, queue_wait(providers, provider), "stream")
+        if claimed is None:
+            continue
+        permit, reservation = claimed
+        log.debug("Streaming from provider", extra={"provider": name})
+        start = time.perf_counter()
+        ttfb = None
+        chars = 0
+        recorded = False
+        try:
+            async for chunk in provider["stream"](prompt, _max_tokens(provider, max_tokens)):
+                if ttfb is None:
+                    ttfb = time.perf_counter() - start
+                    provider_ttfb[name].append(ttfb)
+                    metrics.observe("svl_provider_ttfb_seconds", ttfb, provider=name)
+                    stats.update({"provider": name, "ttfb": round(ttfb, 3)})
+                    log.debug("First token", extra={"provider": name, "ttfb": round(ttfb, 3)})
+                chars += len(chunk)
+                yield chunk
+            latency = time.perf_counter() - start
+            settle_budget(provider, reservation)
+            record_result(name, ttfb is not None, latency)
+            recorded = True
+        except Exception as e:
+            record_result(name, False, time.perf_counter() - start)
+            recorded = True
+            metrics.inc("svl_provider_requests_total", provider=name, mode="stream", outcome="error")
+            log.warning("Provider stream failed", extra={"provider": name, "error": str(e)[:200]})
+            if ttfb is not None:
+                raise
+            continue
+        finally:
+            # The client went away mid-stream (cancelled or closed): hand the probe back
+            if not recorded:
+                release_probe(name, permit)
+        metrics.observe("svl_provider_duration_seconds", latency, provider=name, mode="stream")
+        metrics.inc("svl_provider_requests_total", provider=name, mode="stream", outcome="success" if ttfb is not None else "empty")
+        if ttfb is not None:
+            metrics.inc("svl_ai_calls_total", mode="stream", provider=name)
+            provider_latencies[name].append(latency)
+            stats["total"] = round(latency, 3)
+            log.debug("Stream complete", extra={"provider": name, "chars": chars, "seconds": round(latency, 3)})
+            return
+
+    log.error("All AI provider streams failed")
+    metrics.inc("svl_ai_calls_total", mode="stream", provider="none")
@@ -1,22 +1,97 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, JSONResponse
 from pydantic import BaseModel
 import re
-import requests
 from typing import List, Dict
 import json
+import logging
 import os
 import time
-from youtube_transcript_api import YouTubeTranscriptApi
+import uuid
 from dotenv import load_dotenv
 import google.generativeai as genai
-from youtubesearchpython import VideosSearch
-import ast
+import asyncio
+import hmac
+import zlib
 
 load_dotenv()
 
+import logs
+logs.setup()
+from logs import log_payload
+from ai_client import call_ai_with_fallback, stream_ai_with_fallback, close_client, provider_stats, provider_health, GEMINI_API_KEY
+from http_pool import client_for, pool_stats
+from store import SqliteCache
+from context_store import create_context_store
+from study_sections import SECTIONS, generate_section, generate_sections
+import jobs
+import catalog
+import item_pool
+import metrics
+from code_resources import get_resources, get_resources_batch, resource_stats, video_search_store, practice_store, close as close_resources
+from transcripts import load_transcript, transcript_store, condensed_store, fit_transcript
+from token_budget import CONTEXT_TOKENS, count_tokens, load_encodings, max_output_tokens, truncate_to_tokens
+from retrieval import retrieve, format_passages, passage_sources, forget_index
+from semantic_cache import create_answer_cache
+from singleflight import single_flight, single_flight_stats
+from pipeline import Pipeline, server_timing, pipeline_stats
+from rate_limit import hit, client_id, client_limit, retry_after, MORE_ITEMS_LIMIT
+from json_extract import extract_json, extraction_stats
+from schemas import FLASHCARDS, QUIZ_QUESTIONS, MINDMAP, INFOGRAPHIC, ROADMAP_TOPICS, CODE_TREE, CUSTOM_ROADMAP, EXPLANATIONS
+
+log = logging.getLogger(__name__)
+
 app = FastAPI(title="SVL Smart Video Learner")
 
+# Registered before CORS so CORS stays outermost and 429 responses are readable by the browser
+@app.middleware("http")
+async def limit_clients(request: Request, call_next):
+    """Per-client sliding-window limits on POST endpoints, shared by all workers"""
+    matched = client_limit(request.method, request.url.path)
+    if matched:
+        prefix, (limit, window) = matched
+        wait = hit(f"{client_id(request)}:{prefix}", limit, window)
+        if wait:
+            seconds = retry_after(wait)
+            return JSONResponse(
+                status_code=429,
+                content={"detail": f"Too many requests, wait {seconds}s"},
+                headers={"Retry-After": str(seconds)}
+            )
+    return await call_next(request)
+
+metrics.histogram("svl_http_request_duration_seconds", "Time to response headers per route (streams are timed to their first byte)")
+
+# Outside the rate limiter so rejected requests are counted too
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # The route template, not the raw path, so video ids do not become labels
+        route = request.scope.get("route")
+        metrics.observe(
+            "svl_http_request_duration_seconds", time.perf_counter() - started,
+            method=request.method, route=getattr(route, "path", "unmatched"), status=status
+        )
+
+# Outermost of the app's own middleware so everything logged for a request carries its id
+@app.middleware("http")
+async def assign_request_id(request: Request, call_next):
+    request_id = request.headers.get("x-request-id") or logs.new_request_id()
+    token = logs.request_id.set(request_id[:64])
+    try:
+        response = await call_next(request)
+    finally:
+        logs.request_id.reset(token)
+    response.headers["X-Request-ID"] = request_id[:64]
+    return response
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -25,15 +100,54 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
 if GEMINI_API_KEY:
     genai.configure(api_key=GEMINI_API_KEY)
 
-video_contexts = {}
-rate_limit_tracker = {}
+video_contexts = create_context_store()
+# Tutor answers reused for similarly worded questions in the same scope
+answer_cache = create_answer_cache()
+
+# Bump when the study-material prompts change so stale generations are not served
+STUDY_PROMPT_VERSION = "v1"
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+generation_cache = SqliteCache(
+    "generation_cache",
+    ttl=float(os.getenv("GENERATION_CACHE_TTL", 7 * 24 * 3600)),
+    max_bytes=int(os.getenv("GENERATION_CACHE_MAX_MB", "200")) * 1024 * 1024
+)
+# "<video_id>:<prompt version>:<term>" -> flashcard explanation and its sources, filled by single and batch requests
+explanation_cache = SqliteCache(
+    "flashcard_explanations",
+    ttl=float(os.getenv("GENERATION_CACHE_TTL", 7 * 24 * 3600)),
+    max_bytes=int(os.getenv("EXPLANATION_CACHE_MAX_MB", "100")) * 1024 * 1024
+)
+EXPLAIN_PROMPT_VERSION = "v1"
+# Cards explained per generation in a batch request (kept within every provider's completion limit)
+EXPLAIN_BATCH_SIZE = int(os.getenv("EXPLAIN_BATCH_SIZE", "6"))
+MAX_EXPLAIN_CARDS = 30
+# "More" flashcards and quiz questions come from per-video pools (item_pool); kind -> response field
+POOL_FIELDS = {"flashcards": "flashcards", "quiz": "quiz_questions"}
+# A generation asks for this many times the missing items, at least POOL_BATCH and at most POOL_MAX_BATCH
+POOL_OVERSAMPLE = 2
+POOL_BATCH = int(os.getenv("POOL_BATCH", "10"))
+POOL_MAX_BATCH = 30
+# Queue a background refill once a client has fewer unseen items than this
+POOL_LOW_WATER = int(os.getenv("POOL_LOW_WATER", "5"))
+QUIZ_DIFFICULTIES = ("easy", "medium", "hard")
+# Questions generated per difficulty into a video's question bank once its study material is built
+QUESTION_BANK_PREFILL = int(os.getenv("QUESTION_BANK_PREFILL", "10"))
+# Sections of in-flight generations, shared so any worker can answer a progress poll
+section_progress = SqliteCache("study_sections", ttl=24 * 3600, max_bytes=64 * 1024 * 1024)
+# Seconds each process-video stage may take; metadata and topic fall back to the title, a transcript
+# that times out to none (generation goes ahead from the title), and sections fail the build
+STAGE_TIMEOUTS = {
+    "metadata": float(os.getenv("METADATA_TIMEOUT", "10")),
+    "transcript": float(os.getenv("TRANSCRIPT_TIMEOUT", "90")),
+    "topic": float(os.getenv("TOPIC_TIMEOUT", "20")),
+    "sections": float(os.getenv("SECTIONS_TIMEOUT", "300"))
+}
 
 class VideoRequest(BaseModel):
     url: str
@@ -45,11 +159,14 @@ class ChatRequest(BaseModel):
 class GenerateFlashcardsRequest(BaseModel):
     video_id: str
     count: int = 5
+    session_id: str = None
 
 class GenerateQuizRequest(BaseModel):
     video_id: str
     count: int = 5
     difficulty: str = "medium"
+    question_type: str = None
+    session_id: str = None
 
 class LearnRequest(BaseModel):
     topic: str
@@ -61,6 +178,10 @@ class CodeResourcesRequest(BaseModel):
     language: str
     topic: str
 
+class CodeResourcesBatchRequest(BaseModel):
+    language: str
+    topics: List[str] = []
+
 class CodeChatRequest(BaseModel):
     language: str
     topic: str
@@ -71,6 +192,14 @@ class ExplainFlashcardRequest(BaseModel):
     term: str
     definition: str
 
+class FlashcardTerm(BaseModel):
+    term: str
+    definition: str
+
+class ExplainFlashcardsRequest(BaseModel):
+    video_id: str
+    cards: List[FlashcardTerm]
+
 class MindMapRequest(BaseModel):
     video_id: str
 
@@ -87,6 +216,8 @@ class StudyMaterial(BaseModel):
     key_points: List[str]
     flashcards: List[Dict[str, str]]
     quiz_questions: List[Dict]
+    # Issued with each response for the item pools (see pool_consumer), never cached
+    session_id: str = None
 
 def extract_video_id(url: str) -> str:
     patterns = [
@@ -99,109 +230,69 @@ def extract_video_id(url: str) -> str:
             return match.group(1)
     raise ValueError("Invalid YouTube URL")
 
-def get_video_metadata(video_id: str) -> Dict:
+OEMBED_URL = "https://www.youtube.com/oembed"
+
+async def get_video_metadata(video_id: str) -> Dict:
     try:
-        response = requests.get(
-            f"https://www.youtube.com/oembed?url=https://www.youtube.com/watch?v={video_id}&format=json",
+        response = await client_for(OEMBED_URL).get(
+            OEMBED_URL,
+            params={"url": f"https://www.youtube.com/watch?v={video_id}", "format": "json"},
             timeout=10
         )
         if response.status_code == 200:
             return {"title": response.json().get("title", "Educational Video")}
-    except:
-        pass
-    return {"title": "Educational Content"}
-
-def get_transcript(video_id: str) -> str:
-    try:
-        transcript_list = YouTubeTranscriptApi.list_transcripts(video_id)
-        for transcript in transcript_list:
-            try:
-                data = transcript.fetch()
-                text = " ".join([entry['text'] for entry in data])
-                # Clean control characters
-                text = text.replace('\n', ' ').replace('\r', ' ').replace('\t', ' ')
-                text = ' '.join(text.split())  # Remove extra spaces
-                return text.strip()
-            except Exception as e:
-                print(f"Transcript fetch error: {e}")
-                continue
     except Exception as e:
-        print(f"Transcript list error: {e}")
-    return ""
+        log.warning("oEmbed failed", extra={"video_id": video_id, "error": str(e)[:200]})
+    return {"title": "Educational Content"}
 
-def call_ai_with_fallback(prompt: str) -> str:
-    """Try Groq -> OpenAI -> Gemini"""
-    
-    # Try Groq
-    if GROQ_API_KEY:
-        print("→ Trying Groq...")
-        for attempt in range(2):
-            try:
-                response = requests.post(
-                    "https://api.groq.com/openai/v1/chat/completions",
-                    headers={"Authorization": f"Bearer {GROQ_API_KEY}", "Content-Type": "application/json"},
-                    json={
-                        "model": "llama-3.3-70b-versatile",
-                        "messages": [{"role": "user", "content": prompt}],
-                        "max_tokens": 16000,
-                        "temperature": 0.2
-                    },
-                    timeout=60
-                )
-                if response.status_code == 200:
-                    result = response.json()["choices"][0]["message"]["content"].strip()
-                    print(f"✓ Groq success ({len(result)} chars)")
-                    return result
-            except Exception as e:
-                print(f"⚠ Groq attempt {attempt+1} failed: {str(e)[:100]}")
-                time.sleep(3)
-    
-    # Try OpenAI
-    if OPENAI_API_KEY:
-        print("→ Trying OpenAI...")
+def sse_event(data: Dict, event: str = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+def sse_stream(events) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def sse_response(prompt: str, fallback: str, max_tokens: int = None, done: Dict = None, on_complete=None) -> StreamingResponse:
+    """Forward provider tokens to the client as Server-Sent Events
+
+    Each token arrives as a data event with a "token" field. A final "done" event
+    carries the provider used, the time to first token and any fields in done.
+    on_complete(text) is called with the full answer when a provider streamed it to the end.
+    """
+    async def events():
+        stats = {}
+        parts = []
+        failed = False
         try:
-            response = requests.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers={"Authorization": f"Bearer {OPENAI_API_KEY}", "Content-Type": "application/json"},
-                json={
-                    "model": "gpt-4o-mini",
-                    "messages": [{"role": "user", "content": prompt}],
-                    "max_tokens": 16000,
-                    "temperature": 0.2
-                },
-                timeout=60
-            )
-            if response.status_code == 200:
-                result = response.json()["choices"][0]["message"]["content"].strip()
-                print(f"✓ OpenAI success ({len(result)} chars)")
-                return result
+            async for chunk in stream_ai_with_fallback(prompt, stats, max_tokens):
+                parts.append(chunk)
+                yield sse_event({"token": chunk})
         except Exception as e:
-            print(f"⚠ OpenAI failed: {str(e)[:200]}")
-    
-    # Try Gemini
-    if GEMINI_API_KEY:
-        print("→ Trying Gemini...")
-        try:
-            response = requests.post(
-                f"https://generativelanguage.googleapis.com/v1/models/gemini-pro:generateContent?key={GEMINI_API_KEY}",
-                headers={"Content-Type": "application/json"},
-                json={
-                    "contents": [{"parts": [{"text": prompt}]}],
-                    "generationConfig": {"temperature": 0.2, "maxOutputTokens": 16000}
-                },
-                timeout=60
-            )
-            if response.status_code == 200:
-                result = response.json()["candidates"][0]["content"]["parts"][0]["text"].strip()
-                print(f"✓ Gemini success ({len(result)} chars)")
-                return result
-        except Exception as e:
-            print(f"⚠ Gemini failed: {str(e)[:200]}")
-    
-    print("✗ All AI APIs failed")
-    return ""
-
-def extract_topic(title: str, transcript: str) -> str:
+            failed = True
+            log.warning("Stream interrupted", extra={"error": str(e)[:200]})
+            yield sse_event({"error": "Stream interrupted"}, "error")
+        if not parts:
+            yield sse_event({"token": fallback})
+        elif on_complete and not failed:
+            on_complete(''.join(parts))
+        yield sse_event({**stats, **(done or {})}, "done")
+
+    return sse_stream(events())
+
+def sse_cached(text: str, done: Dict = None) -> StreamingResponse:
+    """Send a stored answer in the same event format as sse_response"""
+    async def events():
+        yield sse_event({"token": text})
+        yield sse_event({"cached": True, **(done or {})}, "done")
+
+    return sse_stream(events())
+
+def topic_from_title(title: str):
+    """Known topic named in the title, without asking the AI"""
     title_lower = title.lower()
     patterns = {
         'lenz': "Lenz's Law", 'fleming': "Fleming's Left Hand Rule",
@@ -211,450 +302,293 @@ def extract_topic(title: str, transcript: str) -> str:
     for pattern, topic in patterns.items():
         if pattern in title_lower:
             return topic
+    return None
+
+async def extract_topic(title: str, transcript: str) -> str:
+    topic = topic_from_title(title)
+    if topic:
+        return topic
     
     if transcript:
-        content = f"Title: {title}\n\nTranscript: {transcript[:2000]}"
+        content = f"Title: {title}\n\nTranscript: {truncate_to_tokens(transcript, CONTEXT_TOKENS['topic'])}"
     else:
         content = f"Title: {title}"
     
     prompt = f'Extract the educational topic from this video. Return ONLY the topic name.\n\n{content}\n\nTopic:'
-    topic = call_ai_with_fallback(prompt)
+    topic = await call_ai_with_fallback(prompt, max_tokens=max_output_tokens("topic"))
     if topic and 3 < len(topic) < 100:
         return topic.strip('"').strip("'").strip()
     return title[:50]
 
-def generate_content_with_ai(topic: str, title: str, transcript: str) -> Dict:
-    if transcript and len(transcript) > 100:
-        context = f"Video: {title}\n\nTranscript:\n{transcript[:8000]}"
-        instruction = "Based on the video transcript, create comprehensive study materials."
-    else:
-        # No transcript or very short - use AI knowledge about the topic
-        context = f"Video: {title}\nTopic: {topic}"
-        instruction = f"Based on your knowledge of {topic}, create comprehensive educational study materials. Use the video title '{title}' for context. Generate complete, accurate educational content including specific examples, formulas, principles, and applications related to {topic}."
-    
-    prompt = f"""{instruction}
-
-{context}
-
-Create EXCEPTIONAL, NotebookLM-quality comprehensive study materials about {topic}.
-
-Generate EXACTLY this JSON structure with OUTSTANDING quality:
-
-{{
-  "video_summary": "Write 300-400 words. Structure: 
-    - Opening (2 sentences): Hook + What is {topic}
-    - Core Explanation (3-4 sentences): Main concepts, principles, mechanisms
-    - Significance (2-3 sentences): Why it matters, real-world impact
-    - Key Applications (2-3 sentences): Where it's used, practical examples
-    - Conclusion (1-2 sentences): Takeaway message
-    Make it engaging, informative, and comprehensive like NotebookLM.",
-    
-  "detailed_explanation": "Write 2500-3000 words in 8-10 detailed sections. Use ONLY plain text without any markdown formatting. No asterisks, no hashtags, no special symbols. Write section titles followed by colons, then paragraphs of plain text:
-    
-    ## Introduction (200 words)
-    - What is {topic}? Define clearly
-    - Historical context and discovery
-    - Why it's important to understand
-    
-    ## Fundamental Concepts (300 words)
-    - Core principles and theories
-    - Key terminologies and definitions
-    - Foundational formulas/equations with explanations
-    - Visual descriptions (if applicable)
-    
-    ## Detailed Mechanism (400 words)
-    - Step-by-step process breakdown  
-    - How it works in detail
-    - Underlying physics/chemistry/biology
-    - Cause and effect relationships
-    
-    ## Mathematical Framework (300 words - if applicable)
-    - All relevant equations
-    - Variable explanations
-    - Derivations and proofs
-    - Example calculations
-    
-    ## Real-World Examples (400 words)
-    - Example 1: Detailed scenario with numbers/data
-    - Example 2: Different domain/application
-    - Example 3: Modern technology use case
-    
-    ## Practical Applications (300 words)
-    - Industrial applications
-    - Technology implementations  
-    - Day-to-day occurrences
-    - Future potential
-    
-    ## Common Misconceptions (200 words)
-    - What people often get wrong
-    - Why these misconceptions exist
-    - Correct understanding
-    
-    ## Advanced Insights (300 words)
-    - Deeper understanding
-    - Recent research/developments
-    - Connections to other concepts
-    - Expert-level knowledge
-    
-    ## Problem-Solving Approaches (300 words)
-    - How to solve problems involving {topic}
-    - Step-by-step methodologies
-    - Tips and tricks
-    
-    ## Conclusion and Key Takeaways (200 words)
-    - Summary of most important points
-    - What you absolutely must remember
-    - Next steps for learning
-    
-    Use clear headings (##), bullet points, numbered lists, and **bold** for emphasis.",
-    
-  "key_points": [
-    "🎯 **Core Concept:** Provide comprehensive definition of {topic} with fundamental principle, formula/equation if applicable, and why it's foundational. Include 2-3 specific examples demonstrating the concept. (100-120 words)",
-    
-    "⚙️ **How It Works:** Detailed step-by-step mechanism breakdown with technical precision. Explain each phase/stage with what happens, why it happens, and the result. Include cause-effect relationships and process flow. (100-120 words)",
-    
-    "🌍 **Real-World Example 1:** Specific, detailed real-life scenario with actual numbers, measurements, or data. Explain the context, what's happening, and why {topic} is relevant here. Make it relatable and memorable. (100-120 words)",
-    
-    "🌍 **Real-World Example 2:** Another detailed example from a completely different domain/field. Include specific details, context, and explanation of how {topic} applies. Use different scale/perspective than example 1. (100-120 words)",
-    
-    "💡 **Practical Applications:** Describe 3-4 major technology/industry applications with specifics. Include modern innovations, commercial products, or systems that rely on {topic}. Explain how it's implemented. (100-120 words)",
-    
-    "📐 **Mathematical/Technical Details:** If applicable, explain the key formula/equation/principle with all variables defined, typical values, and what each term represents. Include example calculation or technical specifications. (100-120 words)",
-    
-    "⚠️ **Common Misconceptions:** Explain 2-3 things people commonly misunderstand about {topic}. For each: what the misconception is, why people believe it, what the truth is, and why the distinction matters. (100-120 words)",
-    
-    "🔬 **Advanced Insight:** Share deeper understanding that goes beyond basics. Include recent research, cutting-edge developments, expert-level knowledge, or connections to other advanced concepts. What do professionals/researchers know that beginners don't? (100-120 words)"
-  ],
-  
-  "flashcards": [
-    {{"term": "What is {topic}?", "definition": "Comprehensive yet concise definition covering the essence, key principle, and primary significance. Include context. (50-60 words)", "difficulty": "beginner"}},
-    {{"term": "Key Principle of {topic}", "definition": "Main governing principle or law with explanation of how it works and why it's important. (50-60 words)", "difficulty": "beginner"}},
-    {{"term": "How does {topic} work?", "definition": "Step-by-step mechanism explanation covering the process from start to finish with key stages identified. (50-60 words)", "difficulty": "intermediate"}},
-    {{"term": "Primary Formula/Equation", "definition": "Main mathematical relationship with all variables defined and physical meaning explained. (50-60 words)", "difficulty": "intermediate"}},
-    {{"term": "Real-World Application 1", "definition": "Specific technology or natural occurrence where {topic} is demonstrated with context and explanation. (50-60 words)", "difficulty": "intermediate"}},
-    {{"term": "Real-World Application 2", "definition": "Another distinct example from different domain showing practical use with details. (50-60 words)", "difficulty": "intermediate"}},
-    {{"term": "Common Misconception", "definition": "What people often get wrong about {topic}, why the misconception exists, and what the correct understanding is. (50-60 words)", "difficulty": "intermediate"}},
-    {{"term": "Advanced Concept", "definition": "Deeper insight or advanced aspect of {topic} that requires understanding of basics. Expert-level knowledge. (50-60 words)", "difficulty": "advanced"}},
-    {{"term": "Related Concept 1", "definition": "How {topic} connects to or differs from related concept with specific distinctions explained. (50-60 words)", "difficulty": "advanced"}},
-    {{"term": "Historical Context", "definition": "Discovery, development, or evolution of understanding {topic} with key contributors or breakthroughs mentioned. (50-60 words)", "difficulty": "beginner"}},
-    {{"term": "Problem-Solving Strategy", "definition": "Approach to solving problems involving {topic} with step-by-step methodology or key considerations. (50-60 words)", "difficulty": "advanced"}},
-    {{"term": "Future/Modern Development", "definition": "Recent research, new applications, or cutting-edge developments related to {topic} with implications explained. (50-60 words)", "difficulty": "advanced"}}
-  ],
-  
-  "quiz_questions": [
-    {{"id": 1, "question": "Conceptual Understanding: {topic} question testing fundamental grasp", "type": "multiple_choice", "options": ["Correct comprehensive answer", "Plausible but incomplete", "Common misconception", "Clearly wrong"], "correct": 0, "explanation": "Detailed explanation why correct answer is right and others are wrong (40-50 words)", "difficulty": "easy"}},
-    
-    {{"id": 2, "question": "True or False: Statement testing common misconception about {topic}", "type": "true_false", "correct": false, "explanation": "Why this is true/false with context and clarification (40-50 words)", "difficulty": "easy"}},
-    
-    {{"id": 3, "question": "Application Scenario: Real-world situation requiring understanding of how {topic} works", "type": "multiple_choice", "options": ["Correct application", "Misapplication 1", "Misapplication 2", "Wrong context"], "correct": 0, "explanation": "Why this approach works and others don't (40-50 words)", "difficulty": "medium"}},
-    
-    {{"id": 4, "question": "Formula/Calculation: Problem requiring use of key equation with given values", "type": "multiple_choice", "options": ["Correct answer with units", "Wrong formula used", "Calculation error", "Unit error"], "correct": 0, "explanation": "Step-by-step solution showing correct approach (40-50 words)", "difficulty": "medium"}},
-    
-    {{"id": 5, "question": "Compare/Contrast: How does {topic} differ from related concept?", "type": "multiple_choice", "options": ["Accurate distinction", "Partial similarity", "Confused with other concept", "Opposite relationship"], "correct": 0, "explanation": "Clear explanation of actual relationship and differences (40-50 words)", "difficulty": "medium"}},
-    
-    {{"id": 6, "question": "True or False: Advanced statement testing deep understanding of {topic}", "type": "true_false", "correct": true, "explanation": "Detailed reasoning and context for this truth (40-50 words)", "difficulty": "hard"}},
-    
-    {{"id": 7, "question": "Multi-Step Analysis: Complex scenario requiring multiple aspects of {topic} knowledge", "type": "multiple_choice", "options": ["Complete correct analysis", "Missed key factor", "Wrong principle applied", "Incomplete reasoning"], "correct": 0, "explanation": "Comprehensive breakdown of what makes this correct (40-50 words)", "difficulty": "hard"}},
-    
-    {{"id": 8, "question": "Advanced Application: Cutting-edge or expert-level question about {topic}", "type": "multiple_choice", "options": ["Sophisticated correct answer", "Oversimplified approach", "Beginner understanding", "Misconception-based"], "correct": 0, "explanation": "Expert-level explanation with advanced insights (40-50 words)", "difficulty": "hard"}},
-    
-    {{"id": 9, "question": "Problem-Solving: Given situation, what's the best approach using {topic}?", "type": "multiple_choice", "options": ["Optimal strategy", "Suboptimal but workable", "Inefficient approach", "Wrong method"], "correct": 0, "explanation": "Why this strategy is best with reasoning (40-50 words)", "difficulty": "hard"}},
-    
-    {{"id": 10, "question": "True or False: Nuanced statement requiring careful consideration of {topic} details", "type": "true_false", "correct": true, "explanation": "Careful analysis of why this is true/false with nuance explained (40-50 words)", "difficulty": "medium"}}
-  ]
-}}
-
-CRITICAL REQUIREMENTS:
-1. key_points MUST be array of 8 STRINGS (not objects), each starting with emoji
-2. flashcards: Generate 12 cards with progressive difficulty (beginner → advanced)
-3. quiz_questions: Generate 10 diverse questions mixing easy/medium/hard
-4. Make ALL content DETAILED, COMPREHENSIVE, and PROFESSIONAL
-5. Use specific examples with real numbers/data
-6. Include formulas, equations, technical specs where applicable
-7. Write at NotebookLM quality level - exceptional depth and clarity
-8. Return ONLY valid JSON, no markdown, no explanations"""
-
-    response = call_ai_with_fallback(prompt)
-    
-    if response:
+def remember_video(video_id: str, material: Dict):
+    video_contexts.put(video_id, {
+        "title": material["title"],
+        "topic": material["topic"],
+        "transcript": material["transcript"],
+        "content": material["detailed_explanation"]
+    })
+
+def cached_study_material(video_id: str):
+    cached = generation_cache.get_json(f"{video_id}:{STUDY_PROMPT_VERSION}")
+    return StudyMaterial(**cached) if cached else None
+
+async def coalesced_study_material(video_id: str, report=None) -> StudyMaterial:
+    """Concurrent requests for the same video, in any worker, share one generation"""
+    material = await single_flight(
+        "process-video", video_id,
+        lambda: build_study_material(video_id, report),
+        lookup=lambda: cached_study_material(video_id)
+    )
+    # Followers never ran build_study_material, so make sure this worker can serve chat for it
+    if not video_contexts.get(video_id):
+        remember_video(video_id, material.dict())
+    return material
+
+async def build_study_material(video_id: str, report=None) -> StudyMaterial:
+    """Fetch the video, generate every section concurrently and cache the result
+
+    Each section is published to section_progress as soon as it is ready, so the
+    /sections and /events endpoints can show it before the rest has finished.
+    report(progress) is awaited at each stage when the build runs as a job.
+    """
+    cache_key = f"{video_id}:{STUDY_PROMPT_VERSION}"
+    cached = generation_cache.get_json(cache_key)
+    if cached:
+        log.info("Study material cache hit", extra={"video_id": video_id})
+        remember_video(video_id, cached)
+        return StudyMaterial(**cached)
+
+    started = time.time()
+    section_progress.delete_prefix(f"{video_id}:")
+    section_progress.set_json(f"{video_id}:meta", {"status": "fetching", "started": started})
+    if report:
+        await report({"stage": "fetching"})
+
+    # Metadata and transcript are fetched together; a title naming a known topic
+    # skips the topic call, so generation waits only on the transcript
+    async def fetch_metadata(need):
+        return await get_video_metadata(video_id)
+
+    async def fetch_transcript(need):
+        transcript = await load_transcript(video_id)
+        log.info("Transcript loaded", extra={"video_id": video_id, "chars": len(transcript)})
+        return transcript
+
+    async def find_topic(need):
+        title = (await need("metadata"))["title"]
+        topic = topic_from_title(title)
+        if topic:
+            return topic
+        transcript = await need("transcript")
         try:
-            print(f"Raw response preview: {response[:200]}...")
-            cleaned = response.strip()
-            
-            # Extract JSON from markdown code blocks
-            if '```json' in cleaned:
-                cleaned = cleaned.split('```json')[1].split('```')[0]
-            elif '```' in cleaned:
-                parts = cleaned.split('```')
-                for part in parts:
-                    if '{' in part and '}' in part:
-                        cleaned = part
-                        break
-            
-            # Find JSON object boundaries
-            start = cleaned.find('{')
-            end = cleaned.rfind('}') + 1
-            if start != -1 and end > start:
-                cleaned = cleaned[start:end]
-            
-            # Clean the JSON string
-            cleaned = cleaned.strip()
-            print(f"Cleaned JSON preview: {cleaned[:200]}...")
-            
-            content = json.loads(cleaned)
-            
-            required_keys = ['video_summary', 'detailed_explanation', 'key_points', 'flashcards', 'quiz_questions']
-            if not all(key in content for key in required_keys):
-                print(f"✗ Missing keys: {list(content.keys())}")
-                return None
-            
-            summary_len = len(content.get('video_summary', ''))
-            explanation_len = len(content.get('detailed_explanation', ''))
-            flashcards_count = len(content.get('flashcards', []))
-            quiz_count = len(content.get('quiz_questions', []))
-            key_points_count = len(content.get('key_points', []))
-            
-            print(f"Validation: summary={summary_len}, explanation={explanation_len}, flashcards={flashcards_count}, quiz={quiz_count}, points={key_points_count}")
-            
-            if (flashcards_count >= 10 and quiz_count >= 8 and key_points_count >= 5 and summary_len > 200 and explanation_len > 1500):
-                print("✓ Content validated")
-                return content
-            else:
-                print(f"✗ Content too short: flashcards={flashcards_count}/10, quiz={quiz_count}/8, points={key_points_count}/5")
-        except Exception as e:
-            print(f"✗ Parse error: {str(e)[:100]}")
-    
-    return None
+            return await asyncio.wait_for(extract_topic(title, transcript), STAGE_TIMEOUTS["topic"])
+        except asyncio.TimeoutError:
+            log.warning("Topic extraction timed out, using the title", extra={"video_id": video_id})
+            return title[:50]
+
+    async def generate(need):
+        title = (await need("metadata"))["title"]
+        topic = await need("topic")
+        transcript = await need("transcript")
+        log.info("Generating study material", extra={"video_id": video_id, "title": title, "topic": topic})
+        section_progress.set_json(f"{video_id}:meta", {"status": "generating", "title": title, "topic": topic, "started": started})
+        if report:
+            await report({"stage": "generating", "title": title, "topic": topic, "sections_done": []})
+        sections_done = []
+
+        async def publish(name: str, value, status: str):
+            section_progress.set_json(f"{video_id}:{name}", {"status": status, "data": value})
+            sections_done.append(name)
+            if report:
+                await report({"stage": "generating", "title": title, "topic": topic, "sections_done": list(sections_done)})
+
+        return await generate_sections(topic, title, transcript, publish)
+
+    stages = (
+        Pipeline("process-video")
+        .stage("metadata", fetch_metadata, STAGE_TIMEOUTS["metadata"], default={"title": "Educational Content"})
+        .stage("transcript", fetch_transcript, STAGE_TIMEOUTS["transcript"], default="")
+        .stage("topic", find_topic)
+        .stage("sections", generate, STAGE_TIMEOUTS["sections"])
+    )
+    results = await stages.run()
+    title, topic, transcript = results["metadata"]["title"], results["topic"], results["transcript"]
+    content, validated = results["sections"]
+    timings = {**stages.timings, "total": round(time.time() - started, 3)}
+    log.info("Study material built", extra={"video_id": video_id, "timings": timings})
+    
+    material = StudyMaterial(
+        video_id=video_id,
+        title=title,
+        topic=topic,
+        transcript=transcript,
+        video_summary=content["video_summary"],
+        detailed_explanation=content["detailed_explanation"],
+        key_points=content["key_points"],
+        flashcards=content["flashcards"],
+        quiz_questions=content["quiz_questions"]
+    )
+    remember_video(video_id, material.dict())
+    # Only cache content where every section was generated, never the basic fallback
+    if validated:
+        generation_cache.set_json(cache_key, material.dict())
+        prefill_question_bank(video_id)
+    section_progress.set_json(
+        f"{video_id}:meta",
+        {"status": "complete", "title": title, "topic": topic, "started": started, "timings": timings}
+    )
+    return material
+
+@jobs.register("process-video")
+async def process_video_job(payload: Dict, report) -> Dict:
+    video_id = payload["video_id"]
+    try:
+        material = await coalesced_study_material(video_id, report)
+    except Exception as e:
+        section_progress.set_json(f"{video_id}:meta", {"status": "failed", "error": str(e)[:200], "started": time.time()})
+        raise
+    # Only validated material is cached; a fallback build must not stand in for the video for days
+    if not generation_cache.get_json(f"{video_id}:{STUDY_PROMPT_VERSION}"):
+        return jobs.Partial(material.dict())
+    return material.dict()
+
+def study_progress(video_id: str) -> Dict:
+    cached = generation_cache.get_json(f"{video_id}:{STUDY_PROMPT_VERSION}")
+    if cached:
+        return {
+            "video_id": video_id,
+            "status": "complete",
+            "title": cached["title"],
+            "topic": cached["topic"],
+            "transcript": cached["transcript"],
+            "sections": {name: {"status": "ready", "data": cached[name]} for name in SECTIONS}
+        }
+    meta = section_progress.get_json(f"{video_id}:meta")
+    if not meta:
+        raise HTTPException(status_code=404, detail="No generation found for this video")
+    sections = {name: section_progress.get_json(f"{video_id}:{name}") or {"status": "pending"} for name in SECTIONS}
+    progress = {"video_id": video_id, **meta, "sections": sections}
+    if meta["status"] == "complete":
+        progress["transcript"] = video_contexts.get(video_id).get("transcript", "")
+    return progress
 
 @app.post("/api/process-video")
-async def process_video(request: VideoRequest):
+async def process_video(request: VideoRequest, response: Response):
     try:
         video_id = extract_video_id(request.url)
-        metadata = get_video_metadata(video_id)
-        title = metadata["title"]
-        
-        print(f"\n{'='*60}\nProcessing: {title}\n{'='*60}")
-        
-        transcript = get_transcript(video_id)
-        print(f"Transcript: {len(transcript)} chars")
-        
-        topic = extract_topic(title, transcript)
-        print(f"Topic: {topic}")
-        
-        content = generate_content_with_ai(topic, title, transcript)
-        
-        if not content:
-            print("✗ AI failed - trying one more time with OpenAI...")
-            # Force OpenAI for retry
-            if OPENAI_API_KEY:
-                simple_prompt = f"""Create comprehensive JSON about {topic}:
-{{
-  "video_summary": "200 words detailed summary",
-  "detailed_explanation": "1500+ words with 6-8 paragraphs covering: intro, core concepts, mechanism, examples, applications, misconceptions, insights, conclusion",
-  "key_points": ["🎯 Core: 80 words", "⚙️ How: 80 words", "🌍 Example 1: 80 words", "🌍 Example 2: 80 words", "💡 Application: 80 words", "⚠️ Misconception: 80 words", "🔬 Insight: 80 words", "🔑 Takeaway: 80 words"],
-  "flashcards": [{{"term": "x", "definition": "40-50 words"}}],
-  "quiz_questions": [{{"id": 1, "question": "x", "type": "multiple_choice", "options": ["A","B","C","D"], "correct": 0, "explanation": "y"}}]
-}}
-key_points must be array of 8 strings. Make content DETAILED. Return JSON only."""
-                retry_response = call_ai_with_fallback(simple_prompt)
-                if retry_response:
-                    try:
-                        print(f"Retry response preview: {retry_response[:200]}...")
-                        retry_cleaned = retry_response.strip()
-                        
-                        if '```json' in retry_cleaned:
-                            retry_cleaned = retry_cleaned.split('```json')[1].split('```')[0]
-                        elif '```' in retry_cleaned:
-                            parts = retry_cleaned.split('```')
-                            for part in parts:
-                                if '{' in part and '}' in part:
-                                    retry_cleaned = part
-                                    break
-                        
-                        start = retry_cleaned.find('{')
-                        end = retry_cleaned.rfind('}') + 1
-                        if start != -1 and end > start:
-                            retry_cleaned = retry_cleaned[start:end]
-                        
-                        content = json.loads(retry_cleaned.strip())
-                        print("✓ Retry successful!")
-                    except Exception as e:
-                        print(f"✗ Retry failed: {str(e)[:100]}")
-        
-        if not content:
-            print("✗ Generating fallback educational content")
-            # Generate actual educational content about the topic
-            fallback_prompt = f"""Create comprehensive educational content about {topic} in JSON format:
-
-{{
-  "video_summary": "Write 250-300 words explaining what {topic} is, why it's important, how it works, and where it's used. Make it educational and informative.",
-  "detailed_explanation": "Write 2000+ words covering: Introduction to {topic}, Core Concepts, How It Works, Mathematical Framework (if applicable), Real-World Applications, Examples, Common Misconceptions, Advanced Insights, Problem-Solving Approaches, and Key Takeaways. Use plain text without markdown symbols.",
-  "key_points": ["8 detailed points about {topic}, each 80-100 words covering different aspects"],
-  "flashcards": [{{"term": "concept", "definition": "40-50 words", "difficulty": "beginner/intermediate/advanced"}}],
-  "quiz_questions": [{{"id": 1, "question": "text", "type": "multiple_choice", "options": ["A","B","C","D"], "correct": 0, "explanation": "text", "difficulty": "easy/medium/hard"}}]
-}}
-
-Generate 12 flashcards and 10 quiz questions. Make all content educational and comprehensive. Return only JSON."""
-            
-            fallback_response = call_ai_with_fallback(fallback_prompt)
-            if fallback_response:
-                try:
-                    cleaned = fallback_response.strip()
-                    if '```json' in cleaned:
-                        cleaned = cleaned.split('```json')[1].split('```')[0]
-                    elif '```' in cleaned:
-                        parts = cleaned.split('```')
-                        for part in parts:
-                            if '{' in part:
-                                cleaned = part
-                                break
-                    start = cleaned.find('{')
-                    end = cleaned.rfind('}') + 1
-                    if start != -1 and end > start:
-                        cleaned = cleaned[start:end]
-                    content = json.loads(cleaned.strip())
-                    print("✓ Fallback content generated successfully")
-                except Exception as e:
-                    print(f"✗ Fallback parse error: {str(e)[:100]}")
-                    content = None
-        
-        if not content:
-            print("✗ Using basic fallback content")
-            content = {
-                "video_summary": f"""{topic} is a fundamental concept in its field of study. Understanding {topic} is essential for grasping more advanced concepts and applications. This topic covers the basic principles, mechanisms, and practical applications that make it relevant in both theoretical and real-world contexts. Students studying {topic} will learn how it works, why it matters, and where it is applied in various domains. The concept has significant implications for problem-solving and critical thinking in related areas.""",
-                
-                "detailed_explanation": f"""Introduction to {topic}
-
-{topic} is an important concept that plays a significant role in its field. Understanding this topic requires grasping both the theoretical foundations and practical applications. This comprehensive guide will explore the key aspects of {topic}, including its fundamental principles, mechanisms, applications, and significance.
-
-Core Concepts
-
-The fundamental principles underlying {topic} are essential for building a strong foundation. These concepts form the basis for more advanced understanding and practical application. Students should focus on understanding the basic definitions, key terminologies, and foundational theories that make up {topic}.
-
-How It Works
-
-The mechanism behind {topic} involves several interconnected processes and principles. Understanding how these elements work together provides insight into both the theoretical and practical aspects of the concept. The step-by-step process demonstrates the cause-and-effect relationships that are central to {topic}.
-
-Real-World Applications
-
-{topic} has numerous practical applications across various domains. From technology and industry to everyday life, this concept plays a crucial role in solving real-world problems. Understanding these applications helps students see the relevance and importance of mastering {topic}.
-
-Mathematical Framework
-
-Where applicable, {topic} involves mathematical relationships and equations that describe its behavior and properties. These mathematical tools allow for precise analysis and prediction, making them essential for advanced study and practical problem-solving.
-
-Examples and Case Studies
-
-Concrete examples help illustrate how {topic} works in practice. By examining specific scenarios and case studies, students can better understand the application of theoretical concepts to real situations. These examples bridge the gap between abstract theory and practical implementation.
-
-Common Misconceptions
-
-Many students encounter common misunderstandings when learning about {topic}. Identifying and addressing these misconceptions is crucial for developing accurate understanding. Recognizing what is often misunderstood helps students avoid common pitfalls in their learning journey.
+        started = time.time()
+        material = await coalesced_study_material(video_id)
+        # Stage timings when this request started the build, otherwise just the time it waited
+        meta = section_progress.get_json(f"{video_id}:meta") or {}
+        timings = meta.get("timings") if meta.get("started", 0) >= started else None
+        response.headers["Server-Timing"] = server_timing(timings or {"total": time.time() - started})
+        return material.copy(update={"session_id": new_session_id()})
+    except Exception as e:
+        log.warning("Process video failed", extra={"error": str(e)[:200]})
+        raise HTTPException(status_code=400, detail=str(e))
 
-Advanced Insights
+@app.post("/api/process-video/start")
+async def start_process_video(request: VideoRequest):
+    """Start generating in the background; poll /sections or listen on /events for results"""
+    try:
+        video_id = extract_video_id(request.url)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-Beyond the basics, {topic} offers deeper insights and connections to other concepts. Advanced understanding involves recognizing subtle relationships, exceptions, and applications that go beyond introductory material. This level of knowledge is essential for expertise in the field.
+    if generation_cache.get_json(f"{video_id}:{STUDY_PROMPT_VERSION}"):
+        return {"video_id": video_id, "status": "complete", "session_id": new_session_id()}
+    # Queued as a job, so duplicate starts for the same video share one generation
+    job = jobs.submit("process-video", {"video_id": video_id}, video_id)
+    if job["status"] == "queued" and not section_progress.get_json(f"{video_id}:meta"):
+        section_progress.set_json(f"{video_id}:meta", {"status": "queued", "started": time.time()})
+    return {"video_id": video_id, "status": job["status"], "job_id": job["job_id"], "session_id": new_session_id()}
+
+@app.get("/api/process-video/{video_id}/sections")
+async def get_study_sections(video_id: str):
+    """Sections generated so far; pending ones have no data yet"""
+    return study_progress(video_id)
+
+@app.get("/api/process-video/{video_id}/events")
+async def study_section_events(video_id: str):
+    """Server-Sent Events: a "section" event as each section finishes, then a "done" event"""
+    async def events():
+        sent = set()
+        deadline = time.time() + jobs.JOB_TIMEOUT
+        while time.time() < deadline:
+            try:
+                progress = study_progress(video_id)
+            except HTTPException as e:
+                yield sse_event({"error": e.detail}, "error")
+                return
+            for name, section in progress["sections"].items():
+                if name not in sent and section["status"] != "pending":
+                    sent.add(name)
+                    yield sse_event({"name": name, **section}, "section")
+            if progress["status"] in ("complete", "failed"):
+                yield sse_event({key: value for key, value in progress.items() if key != "sections"}, "done")
+                return
+            await asyncio.sleep(0.5)
+        yield sse_event({"error": "Timed out waiting for generation"}, "error")
+
+    return sse_stream(events())
+
+@app.post("/api/process-video/{video_id}/sections/{name}/retry")
+async def retry_study_section(video_id: str, name: str):
+    """Regenerate a single section (e.g. one that fell back to basic content)"""
+    if name not in SECTIONS:
+        raise HTTPException(status_code=404, detail="Unknown section")
+    context = video_contexts.get(video_id)
+    if not context:
+        raise HTTPException(status_code=404, detail="Video not found")
 
-Problem-Solving Approaches
+    value = await generate_section(name, context["topic"], context["title"], context.get("transcript", ""))
+    if value is None:
+        raise HTTPException(status_code=502, detail="Section generation failed")
+    section_progress.set_json(f"{video_id}:{name}", {"status": "ready", "data": value})
+    if name == "detailed_explanation":
+        video_contexts.put(video_id, {**context, "transcript": context.get("transcript", ""), "content": value})
+
+    # Once every section is real generated content the whole payload becomes cacheable
+    cache_key = f"{video_id}:{STUDY_PROMPT_VERSION}"
+    material = generation_cache.get_json(cache_key)
+    if material:
+        material[name] = value
+        generation_cache.set_json(cache_key, material)
+    else:
+        sections = {section: section_progress.get_json(f"{video_id}:{section}") for section in SECTIONS}
+        if all(section and section["status"] == "ready" for section in sections.values()):
+            material = StudyMaterial(
+                video_id=video_id,
+                title=context["title"],
+                topic=context["topic"],
+                transcript=context.get("transcript", ""),
+                **{section: progress["data"] for section, progress in sections.items()}
+            )
+            generation_cache.set_json(cache_key, material.dict())
+    return {"name": name, "status": "ready", "data": value}
 
-Applying {topic} to solve problems requires systematic approaches and strategies. Understanding effective problem-solving methodologies helps students tackle challenges confidently. These approaches combine theoretical knowledge with practical skills.
+async def video_context_text(video_id: str, context: Dict, query: str, budget: int):
+    """Transcript passages relevant to query with their timestamps, or the start of the material
 
-Key Takeaways
+    Returns (context_text, sources); sources is empty when nothing was retrieved.
+    """
+    passages = await retrieve(video_id, query, budget)
+    if passages:
+        return format_passages(passages), passage_sources(passages)
+    # No stored transcript or nothing matched the query
+    return truncate_to_tokens(context.get('transcript', '') or context.get('content', ''), budget), []
 
-Mastering {topic} requires understanding its fundamental principles, mechanisms, applications, and problem-solving approaches. Students should focus on building strong foundations while also exploring advanced concepts and real-world applications. Continued practice and exploration will deepen understanding and expertise.""",
-                
-                "key_points": [
-                    f"Core Definition: {topic} represents a fundamental concept in its field. Understanding the basic definition and core principles is essential for building knowledge. This concept forms the foundation for more advanced topics and applications in related areas.",
-                    
-                    f"Key Principles: The main principles governing {topic} explain how and why it works. These principles are based on established theories and have been validated through research and practical application. Mastering these principles is crucial for deep understanding.",
-                    
-                    f"Mechanism: {topic} operates through specific processes and mechanisms. Understanding the step-by-step workings helps clarify how inputs are transformed into outputs. This knowledge is essential for both theoretical understanding and practical application.",
-                    
-                    f"Real-World Example: {topic} can be observed in everyday situations and practical contexts. Recognizing these real-world manifestations helps connect abstract concepts to tangible experiences. This connection enhances understanding and retention.",
-                    
-                    f"Practical Applications: {topic} has numerous applications across various fields including technology, industry, and research. These applications demonstrate the practical value and relevance of understanding this concept. Knowledge of applications motivates deeper study.",
-                    
-                    f"Mathematical Framework: Where applicable, {topic} involves mathematical relationships and equations. These mathematical tools provide precise ways to analyze and predict behavior. Understanding the math deepens comprehension of underlying principles.",
-                    
-                    f"Common Misconceptions: Students often misunderstand certain aspects of {topic}. Recognizing these common errors helps avoid pitfalls in learning. Correct understanding requires addressing and correcting these misconceptions early.",
-                    
-                    f"Advanced Insights: Beyond basics, {topic} connects to other concepts and has deeper implications. Advanced understanding involves recognizing subtle relationships and applications. This expert-level knowledge distinguishes mastery from basic familiarity."
-                ],
-                
-                "flashcards": [
-                    {"term": f"What is {topic}?", "definition": f"{topic} is a fundamental concept that involves specific principles and mechanisms. It plays an important role in its field and has practical applications. Understanding this concept requires grasping both theoretical foundations and real-world implementations.", "difficulty": "beginner"},
-                    {"term": f"Core Principles of {topic}", "definition": f"The main principles governing {topic} explain its behavior and characteristics. These principles are based on established theories and have been validated through research. They form the foundation for understanding more complex aspects.", "difficulty": "beginner"},
-                    {"term": f"How {topic} Works", "definition": f"{topic} operates through specific mechanisms and processes. Understanding the step-by-step workings clarifies how different components interact. This knowledge is essential for both theoretical comprehension and practical application.", "difficulty": "intermediate"},
-                    {"term": f"Applications of {topic}", "definition": f"{topic} has numerous practical applications in technology, industry, and research. These applications demonstrate its real-world value and relevance. Understanding applications helps connect theory to practice.", "difficulty": "intermediate"},
-                    {"term": f"Mathematical Framework of {topic}", "definition": f"Where applicable, {topic} involves mathematical relationships and equations that describe its behavior. These mathematical tools allow for precise analysis and prediction. Understanding the math deepens comprehension.", "difficulty": "intermediate"},
-                    {"term": f"Real-World Examples of {topic}", "definition": f"{topic} can be observed in everyday situations and practical contexts. Recognizing these manifestations helps connect abstract concepts to tangible experiences. Examples enhance understanding and retention.", "difficulty": "intermediate"},
-                    {"term": f"Common Misconceptions about {topic}", "definition": f"Students often misunderstand certain aspects of {topic}. Recognizing these common errors helps avoid learning pitfalls. Correct understanding requires addressing and correcting misconceptions early in the learning process.", "difficulty": "intermediate"},
-                    {"term": f"Advanced Concepts in {topic}", "definition": f"Beyond basics, {topic} involves deeper insights and connections to other concepts. Advanced understanding requires recognizing subtle relationships and applications. This expert-level knowledge distinguishes mastery from basic familiarity.", "difficulty": "advanced"},
-                    {"term": f"Problem-Solving with {topic}", "definition": f"Applying {topic} to solve problems requires systematic approaches and strategies. Understanding effective methodologies helps tackle challenges confidently. These approaches combine theoretical knowledge with practical skills.", "difficulty": "advanced"},
-                    {"term": f"Historical Context of {topic}", "definition": f"The development and evolution of {topic} provides important context for current understanding. Key discoveries and breakthroughs shaped how we understand this concept today. Historical perspective enriches comprehension.", "difficulty": "beginner"},
-                    {"term": f"Related Concepts to {topic}", "definition": f"{topic} connects to other important concepts in its field. Understanding these relationships provides broader context and deeper insight. Recognizing connections helps build comprehensive knowledge networks.", "difficulty": "advanced"},
-                    {"term": f"Future Developments in {topic}", "definition": f"Recent research and emerging developments continue to advance understanding of {topic}. New applications and technologies build on foundational principles. Staying current with developments is important for expertise.", "difficulty": "advanced"}
-                ],
-                
-                "quiz_questions": [
-                    {"id": 1, "question": f"What is the primary focus of {topic}?", "type": "multiple_choice", "options": ["Understanding fundamental principles and applications", "Memorizing random facts", "Avoiding practical use", "Ignoring theoretical foundations"], "correct": 0, "explanation": f"The primary focus of {topic} is understanding its fundamental principles and how they apply in practice. This combination of theory and application is essential for mastery.", "difficulty": "easy"},
-                    
-                    {"id": 2, "question": f"{topic} has practical real-world applications.", "type": "true_false", "correct": True, "explanation": f"True. {topic} has numerous practical applications across various fields including technology, industry, and research. Understanding these applications is key to seeing its relevance.", "difficulty": "easy"},
-                    
-                    {"id": 3, "question": f"Which aspect is most important for understanding {topic}?", "type": "multiple_choice", "options": ["Grasping core principles and mechanisms", "Memorizing definitions only", "Skipping examples", "Avoiding practice"], "correct": 0, "explanation": f"Understanding the core principles and mechanisms of {topic} is most important. This foundational knowledge enables deeper learning and practical application.", "difficulty": "medium"},
-                    
-                    {"id": 4, "question": f"How does understanding {topic} benefit students?", "type": "multiple_choice", "options": ["Enables problem-solving and connects theory to practice", "Has no practical value", "Only useful for tests", "Irrelevant to real world"], "correct": 0, "explanation": f"Understanding {topic} enables effective problem-solving and helps connect theoretical knowledge to practical applications. This makes learning both meaningful and useful.", "difficulty": "medium"},
-                    
-                    {"id": 5, "question": f"Learning {topic} requires understanding both theory and practice.", "type": "true_false", "correct": True, "explanation": f"True. Mastering {topic} requires understanding theoretical foundations as well as practical applications. Both aspects are essential for comprehensive knowledge.", "difficulty": "medium"},
-                    
-                    {"id": 6, "question": f"What is a common misconception about {topic}?", "type": "multiple_choice", "options": ["That it has no practical applications", "That it is well-understood", "That it is important", "That it requires study"], "correct": 0, "explanation": f"A common misconception is that {topic} has no practical applications. In reality, it has numerous real-world uses across various fields and industries.", "difficulty": "hard"},
-                    
-                    {"id": 7, "question": f"Advanced understanding of {topic} involves recognizing connections to other concepts.", "type": "true_false", "correct": True, "explanation": f"True. Advanced mastery of {topic} requires recognizing how it connects to related concepts and broader principles. These connections deepen understanding and enable expert-level knowledge.", "difficulty": "hard"},
-                    
-                    {"id": 8, "question": f"Which approach best supports learning {topic}?", "type": "multiple_choice", "options": ["Combining theory, examples, and practice problems", "Only reading definitions", "Avoiding difficult concepts", "Skipping fundamentals"], "correct": 0, "explanation": f"The best approach combines theoretical understanding with concrete examples and practice problems. This multi-faceted method builds comprehensive knowledge of {topic}.", "difficulty": "hard"},
-                    
-                    {"id": 9, "question": f"What makes {topic} relevant to modern applications?", "type": "multiple_choice", "options": ["Its principles apply to current technology and industry", "It is outdated", "It has no modern use", "It is purely theoretical"], "correct": 0, "explanation": f"{topic} remains relevant because its principles apply to modern technology and industry. Understanding it is essential for working with current applications and innovations.", "difficulty": "hard"},
-                    
-                    {"id": 10, "question": f"Mastering {topic} requires both foundational knowledge and advanced insights.", "type": "true_false", "correct": True, "explanation": f"True. Complete mastery of {topic} requires building strong foundations while also exploring advanced concepts and applications. Both levels of understanding are necessary for expertise.", "difficulty": "medium"}
-                ]
-            }
-        
-        video_contexts[video_id] = {
-            "title": title,
-            "topic": topic,
-            "transcript": transcript,
-            "content": content["detailed_explanation"]
-        }
-        
-        return StudyMaterial(
-            video_id=video_id,
-            title=title,
-            topic=topic,
-            transcript=transcript,
-            video_summary=content["video_summary"],
-            detailed_explanation=content["detailed_explanation"],
-            key_points=content["key_points"],
-            flashcards=content["flashcards"],
-            quiz_questions=content["quiz_questions"]
-        )
-    except Exception as e:
-        print(f"Error: {e}")
-        raise HTTPException(status_code=400, detail=str(e))
+CITE_RULE = "- Each context excerpt starts with its [timestamp]; mention the timestamp when you use it, e.g. (see 12:34)"
 
-@app.post("/api/chat")
-async def chat_tutor(request: ChatRequest):
-    context = video_contexts.get(request.video_id, {})
+async def build_chat_prompt(request: ChatRequest):
+    context = video_contexts.get(request.video_id)
     topic = context.get('topic', 'this topic')
-    transcript = context.get('transcript', '')
-    content = context.get('content', '')
-    
-    # Use transcript or content for context
-    context_text = transcript[:2000] if transcript else content[:2000] if content else f"Teaching {topic}"
+    context_text, sources = await video_context_text(request.video_id, context, request.message, CONTEXT_TOKENS["chat"])
     
     prompt = f"""You are a helpful tutor explaining "{topic}" to a student.
 
 Context about {topic}:
-{context_text}
+{context_text or f"Teaching {topic}"}
 
 Student's question: {request.message}
 
@@ -665,42 +599,78 @@ Provide a helpful answer following these rules:
 - Be encouraging and friendly
 - Focus on the specific question asked
 - Use information from the context above
-
+{CITE_RULE if sources else ""}
 Your answer:"""
-    
-    response = call_ai_with_fallback(prompt)
-    if not response:
-        response = f"Great question about {topic}! Let me explain: {topic} is an important concept. Think of it like [simple example]. The key is understanding the basics first. Would you like me to explain a specific part?"
-    
-    return {"response": response}
+    fallback = f"Great question about {topic}! Let me explain: {topic} is an important concept. Think of it like [simple example]. The key is understanding the basics first. Would you like me to explain a specific part?"
+    return prompt, fallback, sources
 
-@app.post("/api/generate-flashcards")
-async def generate_more_flashcards(request: GenerateFlashcardsRequest):
-    current_time = time.time()
-    last_request = rate_limit_tracker.get(request.video_id, 0)
-    
-    if current_time - last_request < 10:
-        wait_time = int(10 - (current_time - last_request))
-        raise HTTPException(status_code=429, detail=f"Wait {wait_time}s")
-    
-    rate_limit_tracker[request.video_id] = current_time
+@app.post("/api/chat")
+async def chat_tutor(request: ChatRequest):
+    scope = f"video:{request.video_id}"
+    cached = answer_cache.lookup("chat", scope, request.message)
+    if cached:
+        return {**cached, "cached": True}
     
-    context = video_contexts.get(request.video_id, {})
+    prompt, fallback, sources = await build_chat_prompt(request)
+    response = await call_ai_with_fallback(prompt, max_tokens=max_output_tokens("chat"))
+    if response:
+        answer_cache.store("chat", scope, request.message, {"response": response, "sources": sources})
+    else:
+        response = fallback
+    
+    return {"response": response, "sources": sources}
+
+@app.post("/api/chat/stream")
+async def chat_tutor_stream(request: ChatRequest):
+    """Stream the tutor answer as Server-Sent Events"""
+    scope = f"video:{request.video_id}"
+    cached = answer_cache.lookup("chat", scope, request.message)
+    if cached:
+        return sse_cached(cached["response"], {"sources": cached["sources"]})
+    
+    prompt, fallback, sources = await build_chat_prompt(request)
+    return sse_response(
+        prompt, fallback, max_output_tokens("chat"), {"sources": sources},
+        lambda text: answer_cache.store("chat", scope, request.message, {"response": text, "sources": sources})
+    )
+
+def limit_more_items(http_request: Request, kind: str, video_id: str):
+    """One "generate more" per client, video and kind every few seconds"""
+    wait = hit(f"{client_id(http_request)}:{kind}:{video_id}", *MORE_ITEMS_LIMIT)
+    if wait:
+        seconds = retry_after(wait)
+        raise HTTPException(status_code=429, detail=f"Wait {seconds}s", headers={"Retry-After": str(seconds)})
+
+async def generate_pool_items(video_id: str, kind: str, count: int, difficulty: str = "", qtype: str = None) -> int:
+    """Generate count flashcards or quiz questions (of one type when qtype is given) into the video's pool
+
+    Returns how many were new.
+    """
+    context = video_contexts.get(video_id)
     if not context:
-        raise HTTPException(status_code=404, detail="Video not found")
-    
+        return 0
+    # The study material's own cards and questions only count for duplicate checks
+    if item_pool.size(video_id, kind) == 0:
+        material = cached_study_material(video_id)
+        if material:
+            item_pool.add(video_id, kind, getattr(material, POOL_FIELDS[kind]), servable=False)
+
     topic = context.get('topic', 'this topic')
     transcript = context.get('transcript', '')
-    
-    prompt = f"""Generate EXACTLY {request.count} NEW and UNIQUE flashcards about {topic}.
+    transcript = await fit_transcript(transcript, CONTEXT_TOKENS[f"more_{kind}"])
+    avoid = '\n'.join(f"- {text}" for text in item_pool.recent_texts(video_id, kind) if text)
+    avoid = f"\nAlready covered (do NOT repeat or reword these):\n{avoid}\n" if avoid else ""
 
-Context: {transcript[:3000] if transcript else f"Topic: {topic}"}
+    if kind == "flashcards":
+        prompt = f"""Generate EXACTLY {count} NEW and UNIQUE flashcards about {topic}.
 
+Context: {transcript if transcript else f"Topic: {topic}"}
+{avoid}
 JSON format:
 {{"flashcards": [{{"term": "specific term", "definition": "clear 25-word explanation"}}]}}
 
 IMPORTANT RULES:
-1. Generate EXACTLY {request.count} flashcards
+1. Generate EXACTLY {count} flashcards
 2. Each term must be DIFFERENT and UNIQUE (no duplicates)
 3. Each term must be specific to {topic}
 4. Each definition must be 20-30 words
@@ -709,148 +679,163 @@ IMPORTANT RULES:
 7. Use advanced/detailed concepts (not basic ones)
 
 Return ONLY valid JSON."""
-    
-    response = call_ai_with_fallback(prompt)
-    
-    if response:
-        try:
-            cleaned = response.strip()
-            if '```json' in cleaned:
-                cleaned = cleaned.split('```json')[1].split('```')[0]
-            elif '```' in cleaned:
-                parts = cleaned.split('```')
-                for part in parts:
-                    if '{' in part:
-                        cleaned = part
-                        break
-            
-            start = cleaned.find('{')
-            end = cleaned.rfind('}') + 1
-            if start != -1 and end > start:
-                cleaned = cleaned[start:end]
-            
-            data = json.loads(cleaned.strip())
-            if data.get('flashcards') and len(data['flashcards']) > 0:
-                flashcards = data['flashcards']
-                
-                # Remove duplicates based on term (case-insensitive)
-                seen_terms = set()
-                unique_flashcards = []
-                for card in flashcards:
-                    term_lower = card.get('term', '').lower().strip()
-                    if term_lower and term_lower not in seen_terms:
-                        seen_terms.add(term_lower)
-                        unique_flashcards.append(card)
-                
-                # Return up to requested count
-                result = unique_flashcards[:request.count]
-                print(f"Flashcards: generated {len(flashcards)}, unique {len(unique_flashcards)}, returning {len(result)}")
-                return {"flashcards": result, "success": True}
-        except Exception as e:
-            print(f"Flashcard parse error: {str(e)[:100]}")
-    
-    # Fallback: generate unique flashcards
-    import random
-    aspects = ["Definition", "Application", "Example", "Principle", "Theory", "Practice", "Concept", "Method", "Process", "Technique"]
-    return {
-        "flashcards": [{"term": f"{topic} - {aspects[i % len(aspects)]} {i+1}", "definition": f"Important {aspects[i % len(aspects)].lower()} related to {topic} that helps understand the topic better from a different perspective."} for i in range(request.count)],
-        "success": False
-    }
-
-@app.post("/api/generate-quiz")
-async def generate_more_quiz(request: GenerateQuizRequest):
-    current_time = time.time()
-    last_request = rate_limit_tracker.get(f"{request.video_id}_quiz", 0)
-    
-    if current_time - last_request < 10:
-        raise HTTPException(status_code=429, detail=f"Wait {int(10 - (current_time - last_request))}s")
-    
-    rate_limit_tracker[f"{request.video_id}_quiz"] = current_time
-    
-    context = video_contexts.get(request.video_id, {})
-    if not context:
-        raise HTTPException(status_code=404, detail="Video not found")
-    
-    topic = context.get('topic', 'this topic')
-    transcript = context.get('transcript', '')
-    
-    prompt = f"""Generate EXACTLY {request.count} NEW and UNIQUE quiz questions about {topic}.
-
-Context: {transcript[:4000] if transcript else f"Topic: {topic}"}
+        schema = FLASHCARDS
+    else:
+        prompt = f"""Generate EXACTLY {count} NEW and UNIQUE quiz questions about {topic}.
 
-Create {request.count} questions in this EXACT JSON format:
+Context: {transcript if transcript else f"Topic: {topic}"}
+{avoid}
+Create {count} questions in this EXACT JSON format:
 {{
   "quiz_questions": [
-    {{"id": 1, "question": "What is the main concept of {topic}?", "type": "multiple_choice", "options": ["Option A", "Option B", "Option C", "Option D"], "correct": 0, "explanation": "Explanation here", "difficulty": "{request.difficulty}"}},
-    {{"id": 2, "question": "True or false about {topic}?", "type": "true_false", "correct": true, "explanation": "Explanation here", "difficulty": "{request.difficulty}"}}
+    {{"id": 1, "question": "What is the main concept of {topic}?", "type": "multiple_choice", "options": ["Option A", "Option B", "Option C", "Option D"], "correct": 0, "explanation": "Explanation here", "difficulty": "{difficulty}"}},
+    {{"id": 2, "question": "True or false about {topic}?", "type": "true_false", "correct": true, "explanation": "Explanation here", "difficulty": "{difficulty}"}}
   ]
 }}
 
 IMPORTANT RULES:
-1. Generate EXACTLY {request.count} questions - count them: 1, 2, 3, 4, 5...
+1. Generate EXACTLY {count} questions - count them: 1, 2, 3, 4, 5...
 2. Each question must be DIFFERENT and UNIQUE (no duplicates or similar questions)
 3. Use real content from the context about {topic}
-4. Mix types: multiple_choice (4 options) and true_false
+4. {f"Every question must be of type {qtype}" if qtype else "Mix types: multiple_choice (4 options) and true_false"}
 5. Cover DIFFERENT aspects of {topic} (don't repeat concepts)
 6. Make questions educational and specific
 7. Each explanation: 20-30 words
-8. Difficulty level: {request.difficulty}
+8. Difficulty level: {difficulty}
 9. Return ONLY the JSON object, nothing else
 
-Generate all {request.count} UNIQUE questions now:"""
+Generate all {count} UNIQUE questions now:"""
+        schema = QUIZ_QUESTIONS
+
+    response = await call_ai_with_fallback(prompt, schema, max_output_tokens(f"more_{kind}", count))
+    if not response:
+        return 0
+    try:
+        items = extract_json(response, schema).get(POOL_FIELDS[kind]) or []
+    except Exception as e:
+        log.warning("Pool items unparseable", extra={"kind": kind, "error": str(e)[:200]})
+        log_payload(log, "Unparseable pool items response", response, kind=kind)
+        return 0
+    if kind == "quiz":
+        for item in items:
+            item.pop('id', None)
+            item['type'] = item_pool.question_type(kind, item)
+            item['difficulty'] = difficulty
+    added = item_pool.add(video_id, kind, items, difficulty)
+    log.info("Pool items generated", extra={"video_id": video_id, "kind": kind, "generated": len(items), "added": added})
+    return added
+
+@jobs.register("item-pool-refill", background=True)
+async def refill_pool_job(payload: Dict, report) -> Dict:
+    count = payload.get("count", POOL_BATCH)
+    added = await generate_pool_items(payload["video_id"], payload["kind"], count, payload["difficulty"])
+    return {"added": added}
+
+def queue_refill(video_id: str, kind: str, difficulty: str = "", count: int = POOL_BATCH):
+    pooled = item_pool.size(video_id, kind, difficulty)
+    if pooled < item_pool.POOL_MAX_ITEMS:
+        # Keyed by the pool size, so a refill that found nothing new is not queued again
+        jobs.submit(
+            "item-pool-refill", {"video_id": video_id, "kind": kind, "difficulty": difficulty, "count": count},
+            f"{video_id}:{kind}:{difficulty}:{pooled}"
+        )
+
+def prefill_question_bank(video_id: str):
+    """Queue question generation for every difficulty, so quiz requests are served from the bank"""
+    for difficulty in QUIZ_DIFFICULTIES:
+        queue_refill(video_id, "quiz", difficulty, QUESTION_BANK_PREFILL)
+
+def new_session_id() -> str:
+    return uuid.uuid4().hex
+
+def pool_consumer(session_id: str) -> str:
+    """Who must not be served the same item twice: the client's study session
+
+    Never the client address, which every student behind one NAT or proxy shares.
+    """
+    return f"session:{session_id[:64]}"
+
+async def take_pooled(video_id: str, kind: str, consumer: str, count: int, difficulty: str = "", qtype: str = None) -> list:
+    """count items consumer has not seen, generating into the pool first only when it runs short
+
+    Generation asks for several times what is missing, so the surplus serves the
+    next requests; once the consumer is close to the end of the pool a refill is
+    queued in the background. A full pool is not generated into: a consumer who
+    has seen all of it is served the items they saw longest ago.
+    """
+    items = item_pool.take(video_id, kind, consumer, count, difficulty, qtype)
+    if len(items) < count and not item_pool.full(video_id, kind, difficulty):
+        missing = count - len(items)
+        # Concurrent requests in this worker that run short wait on one generation
+        await single_flight(
+            "item-pool", f"{video_id}:{kind}:{difficulty}:{qtype or ''}",
+            lambda: generate_pool_items(
+                video_id, kind, min(max(missing * POOL_OVERSAMPLE, POOL_BATCH), POOL_MAX_BATCH), difficulty, qtype
+            )
+        )
+        items += item_pool.take(video_id, kind, consumer, missing, difficulty, qtype)
+    if len(items) < count and item_pool.full(video_id, kind, difficulty):
+        items += item_pool.take_again(video_id, kind, consumer, count - len(items), difficulty, qtype)
+
+    if item_pool.unused(video_id, kind, consumer, difficulty) < POOL_LOW_WATER:
+        queue_refill(video_id, kind, difficulty)
+    return items
+
+@app.post("/api/generate-flashcards")
+async def generate_more_flashcards(request: GenerateFlashcardsRequest, http_request: Request):
+    limit_more_items(http_request, "flashcards", request.video_id)
     
-    response = call_ai_with_fallback(prompt)
+    context = video_contexts.get(request.video_id)
+    if not context:
+        raise HTTPException(status_code=404, detail="Video not found")
     
-    if response:
-        try:
-            cleaned = response.strip()
-            if '```json' in cleaned:
-                cleaned = cleaned.split('```json')[1].split('```')[0]
-            elif '```' in cleaned:
-                parts = cleaned.split('```')
-                for part in parts:
-                    if '{' in part:
-                        cleaned = part
-                        break
-            
-            start = cleaned.find('{')
-            end = cleaned.rfind('}') + 1
-            if start != -1 and end > start:
-                cleaned = cleaned[start:end]
-            
-            data = json.loads(cleaned.strip())
-            if data.get('quiz_questions'):
-                questions = data['quiz_questions']
-                print(f"Generated {len(questions)} questions, requested {request.count}")
-                
-                # Remove duplicate questions (case-insensitive comparison)
-                if len(questions) > 0:
-                    seen_questions = set()
-                    unique_questions = []
-                    for q in questions:
-                        question_text = q.get('question', '').lower().strip()
-                        if question_text and question_text not in seen_questions:
-                            seen_questions.add(question_text)
-                            unique_questions.append(q)
-                    
-                    # Take up to requested count
-                    questions = unique_questions[:request.count] if len(unique_questions) >= request.count else unique_questions
-                    
-                    # Fix IDs to be sequential
-                    for i, q in enumerate(questions):
-                        q['id'] = i + 1
-                        # Ensure all required fields exist
-                        if 'difficulty' not in q:
-                            q['difficulty'] = request.difficulty
-                    
-                    print(f"Quiz: generated {len(data['quiz_questions'])}, unique {len(unique_questions)}, returning {len(questions)}")
-                    return {"quiz_questions": questions, "success": True}
-        except Exception as e:
-            print(f"Quiz parse error: {str(e)[:100]}")
-            print(f"Raw response: {response[:500]}")
+    topic = context.get('topic', 'this topic')
+    # A client without a session gets one to send back next time
+    session_id = request.session_id or new_session_id()
+    flashcards = await take_pooled(request.video_id, "flashcards", pool_consumer(session_id), request.count)
+    if flashcards:
+        log.info("More flashcards", extra={"requested": request.count, "returned": len(flashcards)})
+        return {"flashcards": flashcards, "success": True, "session_id": session_id}
+    
+    # Fallback: generate unique flashcards
+    aspects = ["Definition", "Application", "Example", "Principle", "Theory", "Practice", "Concept", "Method", "Process", "Technique"]
+    return {
+        "flashcards": [{"term": f"{topic} - {aspects[i % len(aspects)]} {i+1}", "definition": f"Important {aspects[i % len(aspects)].lower()} related to {topic} that helps understand the topic better from a different perspective."} for i in range(request.count)],
+        "success": False,
+        "session_id": session_id
+    }
+
+@app.post("/api/generate-quiz")
+async def generate_more_quiz(request: GenerateQuizRequest, http_request: Request):
+    limit_more_items(http_request, "quiz", request.video_id)
+    
+    context = video_contexts.get(request.video_id)
+    if not context:
+        raise HTTPException(status_code=404, detail="Video not found")
+    
+    topic = context.get('topic', 'this topic')
+    difficulty = request.difficulty.strip().lower()
+    if difficulty not in QUIZ_DIFFICULTIES:
+        difficulty = "medium"
+    qtype = request.question_type.strip().lower().replace("-", "_") if request.question_type else None
+    session_id = request.session_id or new_session_id()
+    consumer = pool_consumer(session_id)
+    questions = await take_pooled(request.video_id, "quiz", consumer, request.count, difficulty, qtype)
+    # Generation failed: unseen questions of the other difficulties beat the generic fallback
+    for other in QUIZ_DIFFICULTIES:
+        if len(questions) >= request.count:
+            break
+        if other != difficulty:
+            questions += item_pool.take(request.video_id, "quiz", consumer, request.count - len(questions), other, qtype)
+    if questions:
+        # Fix IDs to be sequential
+        for i, q in enumerate(questions):
+            q['id'] = i + 1
+        log.info("More quiz questions", extra={"requested": request.count, "returned": len(questions)})
+        return {"quiz_questions": questions, "success": True, "session_id": session_id}
     
     # Fallback: generate topic-specific quiz questions
-    print(f"Using fallback for {request.count} questions")
+    log.warning("Using fallback quiz questions", extra={"count": request.count})
     fallback_questions = []
     for i in range(request.count):
         if i % 2 == 0:
@@ -866,7 +851,7 @@ Generate all {request.count} UNIQUE questions now:"""
                 ],
                 "correct": 0,
                 "explanation": f"{topic} is an important concept with real-world applications and theoretical foundations.",
-                "difficulty": request.difficulty
+                "difficulty": difficulty
             })
         else:
             fallback_questions.append({
@@ -875,78 +860,77 @@ Generate all {request.count} UNIQUE questions now:"""
                 "type": "true_false",
                 "correct": True,
                 "explanation": f"True. {topic} is widely used and has many practical applications.",
-                "difficulty": request.difficulty
+                "difficulty": difficulty
             })
     
     return {
         "quiz_questions": fallback_questions,
-        "success": False
+        "success": False,
+        "session_id": session_id
     }
 
-@app.post("/api/learn/generate-roadmap")
-async def generate_learning_roadmap(request: LearnRequest):
+async def cataloged(kind: str, name: str, build):
+    """Catalog entry for name, generated once across workers and added to the catalog when missing"""
+    value = catalog.get(kind, name)
+    if value is not None:
+        return value
+    key = catalog.catalog_key(name)
+
+    async def generate():
+        value = await build(name)
+        catalog.add(kind, name, value)
+        return value
+
+    return await single_flight(kind, key, generate, lookup=lambda: catalog.lookup(kind, key))
+
+async def build_learning_roadmap(subject: str) -> List[Dict]:
     """Generate learning roadmap with topics and YouTube videos"""
-    try:
-        # Generate topics using Groq
-        prompt = f"""Create a learning roadmap for: {request.topic}
+    # Generate topics using Groq
+    prompt = f"""Create a learning roadmap for: {subject}
 
 Return ONLY a Python list of 8-12 topic strings in order from beginner to advanced.
-Example: ['Introduction to {request.topic}', 'Basic Concepts', 'Intermediate Topics', 'Advanced Applications']
+Example: ['Introduction to {subject}', 'Basic Concepts', 'Intermediate Topics', 'Advanced Applications']
 
 Return only the list, nothing else:"""
+    
+    response_text = await call_ai_with_fallback(prompt, ROADMAP_TOPICS, max_output_tokens("roadmap_topics"))
+    if not response_text:
+        raise ValueError("AI generation failed")
+    
+    topics_list = extract_json(response_text, ROADMAP_TOPICS)
+    
+    # Get YouTube videos for each topic - GUARANTEED TO WORK
+    roadmap = []
+    for idx, topic in enumerate(topics_list):
+        # ALWAYS create working YouTube search URLs - NO EXCEPTIONS
+        links = [
+            f"https://www.youtube.com/results?search_query={subject}+{topic.replace(' ', '+')}+tutorial",
+            f"https://www.youtube.com/results?search_query={topic.replace(' ', '+')}+explained",
+            f"https://www.youtube.com/results?search_query=learn+{topic.replace(' ', '+')}",
+            f"https://www.youtube.com/results?search_query={subject}+{topic.replace(' ', '+')}"
+        ]
         
-        response_text = call_ai_with_fallback(prompt)
-        if not response_text:
-            raise ValueError("AI generation failed")
-        
-        # Extract list from response
-        start = response_text.find("[")
-        end = response_text.rfind("]") + 1
-        if start != -1 and end > start:
-            text_content = response_text[start:end]
-            topics_list = ast.literal_eval(text_content)
-        else:
-            raise ValueError("Could not extract topics list")
-        
-        print(f"\n{'='*60}")
-        print(f"Generating roadmap for: {request.topic}")
-        print(f"Topics: {len(topics_list)}")
-        print(f"{'='*60}\n")
-        
-        # Get YouTube videos for each topic - GUARANTEED TO WORK
-        roadmap = []
-        for idx, topic in enumerate(topics_list):
-            # ALWAYS create working YouTube search URLs - NO EXCEPTIONS
-            links = [
-                f"https://www.youtube.com/results?search_query={request.topic}+{topic.replace(' ', '+')}+tutorial",
-                f"https://www.youtube.com/results?search_query={topic.replace(' ', '+')}+explained",
-                f"https://www.youtube.com/results?search_query=learn+{topic.replace(' ', '+')}",
-                f"https://www.youtube.com/results?search_query={request.topic}+{topic.replace(' ', '+')}"
-            ]
-            
-            print(f"  Topic '{topic}': Generated {len(links)} search URLs")
-            
-            roadmap.append({
-                "index": idx,
-                "topic": topic,
-                "links": links
-            })
-        
-        print(f"{'='*60}")
-        print(f"Roadmap complete: {len(roadmap)} topics, total videos: {sum(len(item['links']) for item in roadmap)}")
-        print(f"{'='*60}\n")
-        
-        return roadmap
+        roadmap.append({
+            "index": idx,
+            "topic": topic,
+            "links": links
+        })
     
+    log.info("Learning roadmap generated", extra={"subject": subject, "topics": len(roadmap)})
+    
+    return roadmap
+
+@app.post("/api/learn/generate-roadmap")
+async def generate_learning_roadmap(request: LearnRequest):
+    """Generate learning roadmap with topics and YouTube videos"""
+    try:
+        topic = request.topic.strip()
+        return await cataloged("learn-roadmap", topic, build_learning_roadmap)
     except Exception as e:
-        print(f"Learn roadmap error: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Learn roadmap failed")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/api/learn/chat")
-async def learn_chat(request: ChatRequest):
-    """Chat about learning topic"""
+def build_learn_chat_prompt(request: ChatRequest):
     prompt = f"""You are a helpful learning assistant.
 
 Student's question: {request.message}
@@ -954,43 +938,67 @@ Student's question: {request.message}
 Provide a clear, concise answer (2-3 paragraphs). Use simple language and examples.
 
 Your answer:"""
+    return prompt, "I'm here to help you learn! Could you rephrase your question?"
+
+@app.post("/api/learn/chat")
+async def learn_chat(request: ChatRequest):
+    """Chat about learning topic"""
+    # The learning assistant prompt does not depend on the video, so answers are shared by all
+    cached = answer_cache.lookup("learn_chat", "learn", request.message)
+    if cached:
+        return {**cached, "cached": True}
     
-    response = call_ai_with_fallback(prompt)
-    if not response:
-        response = "I'm here to help you learn! Could you rephrase your question?"
+    prompt, fallback = build_learn_chat_prompt(request)
+    response = await call_ai_with_fallback(prompt, max_tokens=max_output_tokens("chat"))
+    if response:
+        answer_cache.store("learn_chat", "learn", request.message, {"response": response})
+    else:
+        response = fallback
     
     return {"response": response}
 
+@app.post("/api/learn/chat/stream")
+async def learn_chat_stream(request: ChatRequest):
+    """Stream the learning assistant answer as Server-Sent Events"""
+    cached = answer_cache.lookup("learn_chat", "learn", request.message)
+    if cached:
+        return sse_cached(cached["response"])
+    
+    prompt, fallback = build_learn_chat_prompt(request)
+    return sse_response(
+        prompt, fallback, max_output_tokens("chat"),
+        on_complete=lambda text: answer_cache.store("learn_chat", "learn", request.message, {"response": text})
+    )
+
 @app.get("/api/learn/summary")
 async def get_video_summary(video_id: str):
     """Get summary of a YouTube video"""
     try:
-        transcript = get_transcript(video_id)
+        transcript = await load_transcript(video_id)
         if not transcript:
             raise HTTPException(status_code=404, detail="No transcript available")
         
+        transcript = await fit_transcript(transcript, CONTEXT_TOKENS["summary"])
         prompt = f"""Summarize this educational video transcript in 200-250 words. Make it clear and engaging.
 
 Transcript:
-{transcript[:5000]}
+{transcript}
 
 Summary:"""
         
-        summary = call_ai_with_fallback(prompt)
+        summary = await single_flight("learn-summary", video_id, lambda: call_ai_with_fallback(prompt, max_tokens=max_output_tokens("summary")))
         if not summary:
             summary = "Summary generation failed. Please try again."
         
         return {"summary": summary}
     
     except Exception as e:
-        print(f"Summary error: {e}")
+        log.warning("Summary failed", extra={"video_id": video_id, "error": str(e)[:200]})
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/api/code/generate-tree")
-async def generate_code_tree(request: CodeTreeRequest):
+async def build_code_tree(language: str) -> Dict:
     """Generate learning tree for a programming language"""
-    try:
-        prompt = f"""Create a comprehensive learning tree for {request.language} programming.
+    prompt = f"""Create a comprehensive learning tree for {language} programming.
 
 Generate 15-20 topics organized in a tree structure from Beginner to Advanced level.
 For each topic, provide: id, title, level (beginner/intermediate/advanced), row, col (for positioning).
@@ -998,7 +1006,7 @@ For each topic, provide: id, title, level (beginner/intermediate/advanced), row,
 Return ONLY valid JSON in this format:
 {{
   "topics": [
-    {{"id": "1", "title": "Introduction to {request.language}", "level": "beginner", "row": 0, "col": 0}},
+    {{"id": "1", "title": "Introduction to {language}", "level": "beginner", "row": 0, "col": 0}},
     {{"id": "2", "title": "Variables and Data Types", "level": "beginner", "row": 1, "col": 0}}
   ],
   "connections": [
@@ -1007,81 +1015,51 @@ Return ONLY valid JSON in this format:
 }}
 
 Make it a proper learning path where topics build on each other."""
-        
-        text_content = call_ai_with_fallback(prompt)
-        if not text_content:
-            raise ValueError("AI generation failed")
-        
-        # Extract JSON
-        start = text_content.find('{')
-        end = text_content.rfind('}') + 1
-        if start != -1 and end > start:
-            text_content = text_content[start:end]
-        
-        data = json.loads(text_content)
-        return data
     
+    text_content = await call_ai_with_fallback(prompt, CODE_TREE, max_output_tokens("code_tree"))
+    if not text_content:
+        raise ValueError("AI generation failed")
+    
+    return extract_json(text_content, CODE_TREE)
+
+@app.post("/api/code/generate-tree")
+async def generate_code_tree(request: CodeTreeRequest):
+    """Generate learning tree for a programming language"""
+    try:
+        language = request.language.strip()
+        return await cataloged("code-tree", language, build_code_tree)
     except Exception as e:
-        print(f"Tree generation error: {e}")
+        log.warning("Code tree failed", extra={"language": language, "error": str(e)[:200]})
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/code/get-resources")
 async def get_code_resources(request: CodeResourcesRequest):
     """Get YouTube videos and practice websites for a topic"""
     try:
-        # Search YouTube videos
-        from youtubesearchpython import VideosSearch
-        search_query = f"{request.language} {request.topic} tutorial"
-        videos_search = VideosSearch(search_query, limit=4)
-        results = videos_search.result()
-        
-        videos = []
-        for video in results['result']:
-            videos.append({
-                "title": video['title'],
-                "url": video['link'],
-                "thumbnail": video['thumbnails'][0]['url'] if video.get('thumbnails') else '',
-                "channel": video.get('channel', {}).get('name', 'Unknown')
-            })
-        
-        # Generate practice websites using AI
-        prompt = f"""List 3-4 best practice websites for learning {request.language} - {request.topic}.
-
-Return ONLY valid JSON:
-{{
-  "practice": [
-    {{"name": "Website Name", "url": "https://...", "type": "Interactive Coding", "description": "Brief description"}}
-  ],
-  "description": "Brief overview of the topic"
-}}"""
-        
-        ai_response = call_ai_with_fallback(prompt)
-        
-        # Extract JSON
-        start = ai_response.find('{')
-        end = ai_response.rfind('}') + 1
-        if start != -1 and end > start:
-            ai_response = ai_response[start:end]
-        
-        practice_data = json.loads(ai_response)
-        
-        return {
-            "videos": videos,
-            "practice": practice_data.get('practice', []),
-            "description": practice_data.get('description', '')
-        }
-    
+        return await get_resources(request.language, request.topic)
     except Exception as e:
-        print(f"Resources error: {e}")
+        log.warning("Resources failed", extra={"error": str(e)[:200]})
         return {
             "videos": [],
             "practice": [],
             "description": "Failed to load resources. Please try again."
         }
 
-@app.post("/api/code/chat")
-async def code_chat(request: CodeChatRequest):
-    """AI chat for coding doubts"""
+@app.post("/api/code/get-resources/batch")
+async def get_code_resources_batch(request: CodeResourcesBatchRequest):
+    """Prefetch resources for several topics, by default every node of the language's code tree"""
+    language = request.language.strip()
+    topics = request.topics
+    if not topics:
+        try:
+            tree = await cataloged("code-tree", language, build_code_tree)
+        except Exception as e:
+            log.warning("Code tree failed", extra={"language": language, "error": str(e)[:200]})
+            raise HTTPException(status_code=500, detail=str(e))
+        topics = [topic.get("title", "") for topic in tree.get("topics", [])]
+    return {"language": language, "resources": await get_resources_batch(language, topics)}
+
+def build_code_chat_prompt(request: CodeChatRequest):
     prompt = f"""You are a helpful coding tutor for {request.language}.
 
 Topic: {request.topic}
@@ -1090,27 +1068,52 @@ Student's question: {request.message}
 Provide a clear, concise answer (2-3 paragraphs). Use simple language and examples.
 
 Your answer:"""
+    return prompt, f"I'm here to help with {request.language}! Could you rephrase your question?"
+
+def code_chat_scope(request: CodeChatRequest) -> str:
+    return f"code:{request.language.strip().lower()}:{request.topic.strip().lower()}"
+
+@app.post("/api/code/chat")
+async def code_chat(request: CodeChatRequest):
+    """AI chat for coding doubts"""
+    scope = code_chat_scope(request)
+    cached = answer_cache.lookup("code_chat", scope, request.message)
+    if cached:
+        return {**cached, "cached": True}
     
-    response = call_ai_with_fallback(prompt)
-    if not response:
-        response = f"I'm here to help with {request.language}! Could you rephrase your question?"
+    prompt, fallback = build_code_chat_prompt(request)
+    response = await call_ai_with_fallback(prompt, max_tokens=max_output_tokens("chat"))
+    if response:
+        answer_cache.store("code_chat", scope, request.message, {"response": response})
+    else:
+        response = fallback
     
     return {"response": response}
 
-@app.post("/api/explain-flashcard")
-async def explain_flashcard(request: ExplainFlashcardRequest):
-    """Provide detailed AI explanation for a flashcard concept"""
-    try:
-        context = video_contexts.get(request.video_id, {})
-        topic = context.get('topic', 'this topic')
-        transcript = context.get('transcript', '')
-        
-        context_text = transcript[:3000] if transcript else f"Topic: {topic}"
-        
-        prompt = f"""You are an expert tutor explaining the concept "{request.term}" to a student learning about {topic}.
+@app.post("/api/code/chat/stream")
+async def code_chat_stream(request: CodeChatRequest):
+    """Stream the coding tutor answer as Server-Sent Events"""
+    scope = code_chat_scope(request)
+    cached = answer_cache.lookup("code_chat", scope, request.message)
+    if cached:
+        return sse_cached(cached["response"])
+    
+    prompt, fallback = build_code_chat_prompt(request)
+    return sse_response(
+        prompt, fallback, max_output_tokens("chat"),
+        on_complete=lambda text: answer_cache.store("code_chat", scope, request.message, {"response": text})
+    )
+
+async def build_explain_prompt(request: ExplainFlashcardRequest):
+    context = video_contexts.get(request.video_id)
+    topic = context.get('topic', 'this topic')
+    query = f"{request.term} {request.definition}"
+    context_text, sources = await video_context_text(request.video_id, context, query, CONTEXT_TOKENS["explain"])
+    
+    prompt = f"""You are an expert tutor explaining the concept "{request.term}" to a student learning about {topic}.
 
 Context from video:
-{context_text}
+{context_text or f"Topic: {topic}"}
 
 Flashcard Definition: {request.definition}
 
@@ -1132,33 +1135,165 @@ What's important to remember? Any tricks for understanding or remembering this c
 What should a student explore next to deepen their understanding? Related concepts or applications. (60-80 words)
 
 Make it clear, engaging, and educational. Use markdown formatting with **bold** for emphasis.
-
+{CITE_RULE if sources else ""}
 Your explanation:"""
+    fallback = f"**{request.term}**: {request.definition}\n\nThis concept is fundamental to understanding {topic}. Let me know if you'd like more specific details!"
+    return prompt, fallback, sources
+
+def explanation_key(video_id: str, term: str) -> str:
+    return f"{video_id}:{EXPLAIN_PROMPT_VERSION}:{' '.join(term.lower().split())}"
+
+@app.post("/api/explain-flashcard")
+async def explain_flashcard(request: ExplainFlashcardRequest):
+    """Provide detailed AI explanation for a flashcard concept"""
+    try:
+        key = explanation_key(request.video_id, request.term)
+        cached = explanation_cache.get_json(key)
+        if cached:
+            return {**cached, "cached": True}
         
-        response = call_ai_with_fallback(prompt)
-        if not response:
-            response = f"**{request.term}**: {request.definition}\n\nThis concept is fundamental to understanding {topic}. Let me know if you'd like more specific details!"
+        prompt, fallback, sources = await build_explain_prompt(request)
+        response = await call_ai_with_fallback(prompt, max_tokens=max_output_tokens("explain"))
+        if response:
+            explanation_cache.set_json(key, {"explanation": response, "sources": sources})
+        else:
+            response = fallback
         
-        return {"explanation": response}
+        return {"explanation": response, "sources": sources}
     
     except Exception as e:
-        print(f"Explain flashcard error: {e}")
+        log.warning("Explain flashcard failed", extra={"error": str(e)[:200]})
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/explain-flashcard/stream")
+async def explain_flashcard_stream(request: ExplainFlashcardRequest):
+    """Stream the flashcard explanation as Server-Sent Events"""
+    key = explanation_key(request.video_id, request.term)
+    cached = explanation_cache.get_json(key)
+    if cached:
+        return sse_cached(cached["explanation"], {"sources": cached["sources"]})
+    
+    prompt, fallback, sources = await build_explain_prompt(request)
+    return sse_response(
+        prompt, fallback, max_output_tokens("explain"), {"sources": sources},
+        on_complete=lambda text: explanation_cache.set_json(key, {"explanation": text, "sources": sources})
+    )
+
+async def batch_context_text(video_id: str, context: Dict, queries: List[str], budget: int):
+    """Passages for several queries at once, each query getting an equal share of the budget"""
+    share = max(150, budget // len(queries))
+    passages = {}
+    for query in queries:
+        for passage in await retrieve(video_id, query, share, k=2):
+            passages.setdefault(passage["start"], passage)
+    selected, used = [], 0
+    for passage in sorted(passages.values(), key=lambda passage: -passage["score"]):
+        tokens = count_tokens(passage["text"])
+        if used + tokens <= budget:
+            selected.append(passage)
+            used += tokens
+    selected.sort(key=lambda passage: passage["start"])
+    if selected:
+        return format_passages(selected), passage_sources(selected)
+    return truncate_to_tokens(context.get('transcript', '') or context.get('content', ''), budget), []
+
+def build_explain_batch_prompt(topic: str, context_text: str, cards: List[FlashcardTerm], cite: bool) -> str:
+    card_list = '\n'.join(f"{index}. {card.term}: {card.definition}" for index, card in enumerate(cards, 1))
+    return f"""You are an expert tutor explaining flashcard concepts to a student learning about {topic}.
+
+Context from video:
+{context_text or f"Topic: {topic}"}
+
+Flashcards:
+{card_list}
+
+For EACH flashcard, write an engaging explanation in markdown with these sections:
+## 🎯 Detailed Explanation (80-120 words expanding on the definition)
+## 📚 Real-World Examples (2 specific, relatable examples, 80-120 words)
+## 🔗 Connections (how it relates to other concepts in {topic}, 50-80 words)
+## 💡 Key Insights (what to remember, 40-60 words)
+Use **bold** for emphasis.
+{CITE_RULE if cite else ""}
+Return ONLY valid JSON, one entry per flashcard, using each term exactly as given:
+{{"explanations": [{{"term": "term as given", "explanation": "markdown explanation"}}]}}"""
+
+@app.post("/api/explain-flashcards")
+async def explain_flashcards(request: ExplainFlashcardsRequest):
+    """Explain a deck of flashcards, sharing one context and a few generations between them
+
+    Cached explanations are returned as they are; the rest are generated in groups
+    of EXPLAIN_BATCH_SIZE and cached per card, so a later single-card request is instant.
+    """
+    context = video_contexts.get(request.video_id)
+    if not context:
+        raise HTTPException(status_code=404, detail="Video not found")
+    topic = context.get('topic', 'this topic')
+    cards = {}
+    for card in request.cards[:MAX_EXPLAIN_CARDS]:
+        if card.term.strip():
+            cards.setdefault(explanation_key(request.video_id, card.term), card)
+    
+    results = {}
+    missing = []
+    for key, card in cards.items():
+        cached = explanation_cache.get_json(key)
+        if cached:
+            results[key] = {**cached, "cached": True}
+        else:
+            missing.append(card)
+    
+    if missing:
+        queries = [f"{card.term} {card.definition}" for card in missing]
+        context_text, sources = await batch_context_text(request.video_id, context, queries, CONTEXT_TOKENS["explain_batch"])
+        
+        async def explain_group(group: List[FlashcardTerm]):
+            prompt = build_explain_batch_prompt(topic, context_text, group, bool(sources))
+            response = await call_ai_with_fallback(prompt, EXPLANATIONS, max_output_tokens("explain_batch", len(group)))
+            try:
+                items = extract_json(response, EXPLANATIONS)["explanations"] if response else []
+            except ValueError as e:
+                log.warning("Flashcard explanations unparseable", extra={"cards": len(group), "error": str(e)[:200]})
+                log_payload(log, "Unparseable explanations response", response)
+                items = []
+            for item in items:
+                key = explanation_key(request.video_id, item["term"])
+                if key in cards and item["explanation"].strip():
+                    results[key] = {"explanation": item["explanation"], "sources": sources}
+                    explanation_cache.set_json(key, results[key])
+        
+        groups = [missing[i:i + EXPLAIN_BATCH_SIZE] for i in range(0, len(missing), EXPLAIN_BATCH_SIZE)]
+        await asyncio.gather(*(explain_group(group) for group in groups))
+        log.info("Flashcards explained", extra={
+            "video_id": request.video_id, "cards": len(cards), "cached": len(cards) - len(missing),
+            "generations": len(groups), "missing": sum(1 for key in cards if key not in results)
+        })
+    
+    explanations = []
+    for key, card in cards.items():
+        # Cards the model skipped get the same fallback as a failed single request, uncached
+        result = results.get(key) or {
+            "explanation": f"**{card.term}**: {card.definition}\n\nThis concept is fundamental to understanding {topic}. Let me know if you'd like more specific details!",
+            "sources": [],
+            "fallback": True
+        }
+        explanations.append({"term": card.term, **result})
+    return {"explanations": explanations}
+
 @app.post("/api/generate-mindmap")
 async def generate_mindmap(request: MindMapRequest):
     """Generate mind map data for visual concept hierarchy"""
     try:
-        context = video_contexts.get(request.video_id, {})
+        context = video_contexts.get(request.video_id)
         if not context:
             raise HTTPException(status_code=404, detail="Video not found")
         
         topic = context.get('topic', 'this topic')
         transcript = context.get('transcript', '')
+        transcript = await fit_transcript(transcript, CONTEXT_TOKENS["mindmap"])
         
         prompt = f"""Create a comprehensive mind map structure for {topic}.
 
-Context: {transcript[:4000] if transcript else f"Topic: {topic}"}
+Context: {transcript if transcript else f"Topic: {topic}"}
 
 Generate a hierarchical mind map with the following structure:
 
@@ -1189,29 +1324,15 @@ Use diverse colors: #FF6B6B, #4ECDC4, #45B7D1, #FFA07A, #98D8C8, #F7DC6F, #BB8FC
 
 Return ONLY valid JSON."""
 
-        response = call_ai_with_fallback(prompt)
+        response = await call_ai_with_fallback(prompt, MINDMAP, max_output_tokens("mindmap"))
         
         if response:
             try:
-                cleaned = response.strip()
-                if '```json' in cleaned:
-                    cleaned = cleaned.split('```json')[1].split('```')[0]
-                elif '```' in cleaned:
-                    parts = cleaned.split('```')
-                    for part in parts:
-                        if '{' in part:
-                            cleaned = part
-                            break
-                
-                start = cleaned.find('{')
-                end = cleaned.rfind('}') + 1
-                if start != -1 and end > start:
-                    cleaned = cleaned[start:end]
-                
-                mindmap_data = json.loads(cleaned.strip())
+                mindmap_data = extract_json(response, MINDMAP)
                 return mindmap_data
             except Exception as e:
-                print(f"Mindmap parse error: {e}")
+                log.warning("Mindmap unparseable", extra={"error": str(e)[:200]})
+                log_payload(log, "Unparseable mindmap response", response)
         
         # Fallback mindmap
         return {
@@ -1239,23 +1360,24 @@ Return ONLY valid JSON."""
         }
     
     except Exception as e:
-        print(f"Mindmap generation error: {e}")
+        log.warning("Mindmap failed", extra={"error": str(e)[:200]})
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/generate-infographic")
 async def generate_infographic(request: InfographicRequest):
     """Generate infographic data for visual summary"""
     try:
-        context = video_contexts.get(request.video_id, {})
+        context = video_contexts.get(request.video_id)
         if not context:
             raise HTTPException(status_code=404, detail="Video not found")
         
         topic = context.get('topic', 'this topic')
         transcript = context.get('transcript', '')
+        transcript = await fit_transcript(transcript, CONTEXT_TOKENS["infographic"])
         
         prompt = f"""Create infographic data for {topic}.
 
-Context: {transcript[:4000] if transcript else f"Topic: {topic}"}
+Context: {transcript if transcript else f"Topic: {topic}"}
 
 Generate structured data for a visual infographic:
 
@@ -1293,29 +1415,15 @@ Generate structured data for a visual infographic:
 
 Use real numbers, dates, and facts where possible. Return ONLY valid JSON."""
 
-        response = call_ai_with_fallback(prompt)
+        response = await call_ai_with_fallback(prompt, INFOGRAPHIC, max_output_tokens("infographic"))
         
         if response:
             try:
-                cleaned = response.strip()
-                if '```json' in cleaned:
-                    cleaned = cleaned.split('```json')[1].split('```')[0]
-                elif '```' in cleaned:
-                    parts = cleaned.split('```')
-                    for part in parts:
-                        if '{' in part:
-                            cleaned = part
-                            break
-                
-                start = cleaned.find('{')
-                end = cleaned.rfind('}') + 1
-                if start != -1 and end > start:
-                    cleaned = cleaned[start:end]
-                
-                infographic_data = json.loads(cleaned.strip())
+                infographic_data = extract_json(response, INFOGRAPHIC)
                 return infographic_data
             except Exception as e:
-                print(f"Infographic parse error: {e}")
+                log.warning("Infographic unparseable", extra={"error": str(e)[:200]})
+                log_payload(log, "Unparseable infographic response", response)
         
         # Fallback infographic
         return {
@@ -1351,34 +1459,33 @@ Use real numbers, dates, and facts where possible. Return ONLY valid JSON."""
         }
     
     except Exception as e:
-        print(f"Infographic generation error: {e}")
+        log.warning("Infographic failed", extra={"error": str(e)[:200]})
         raise HTTPException(status_code=500, detail=str(e))
 
 class CustomRoadmapRequest(BaseModel):
     language: str
 
-@app.post("/api/code/generate-custom-roadmap")
-async def generate_custom_roadmap(request: CustomRoadmapRequest):
+async def build_custom_roadmap(language: str) -> Dict:
     """Generate custom programming language roadmap with AI"""
-    try:
-        lang_name = request.language.strip()
-        lang_lower = lang_name.lower()
-        
-        # Generate DevIcon URL
-        icon_url = f"https://cdn.jsdelivr.net/gh/devicons/devicon@latest/icons/{lang_lower}/{lang_lower}-original.svg"
-        
-        # Determine color based on language
-        colors = [
-            "from-purple-500 to-pink-500",
-            "from-blue-500 to-cyan-500",
-            "from-green-500 to-emerald-500",
-            "from-red-500 to-orange-500",
-            "from-indigo-500 to-purple-500"
-        ]
-        color = colors[hash(lang_name) % len(colors)]
-        
-        # Generate roadmap using AI
-        prompt = f"""Create a comprehensive learning roadmap for {lang_name} programming.
+    lang_name = language.strip()
+    lang_lower = lang_name.lower()
+    
+    # Generate DevIcon URL
+    icon_url = f"https://cdn.jsdelivr.net/gh/devicons/devicon@latest/icons/{lang_lower}/{lang_lower}-original.svg"
+    
+    # Determine color based on language
+    colors = [
+        "from-purple-500 to-pink-500",
+        "from-blue-500 to-cyan-500",
+        "from-green-500 to-emerald-500",
+        "from-red-500 to-orange-500",
+        "from-indigo-500 to-purple-500"
+    ]
+    # crc32 rather than hash() so every worker and the catalog build pick the same color
+    color = colors[zlib.crc32(lang_lower.encode("utf-8")) % len(colors)]
+    
+    # Generate roadmap using AI
+    prompt = f"""Create a comprehensive learning roadmap for {lang_name} programming.
 
 Generate 3 main topics, each with 5-7 levels. Return ONLY valid JSON:
 
@@ -1388,55 +1495,228 @@ Generate 3 main topics, each with 5-7 levels. Return ONLY valid JSON:
       "id": "topic-1",
       "name": "Topic Name",
       "levels": [
-        {{
-          "id": "level-1",
-          "title": "Level Title",
-          "videos": ["https://www.youtube.com/results?search_query={lang_name}+topic+tutorial"],
-          "practice": ["https://www.hackerrank.com", "https://leetcode.com"],
-          "learning": ["https://docs.example.com", "https://www.w3schools.com"]
-        }}
+    {{
+      "id": "level-1",
+      "title": "Level Title",
+      "videos": ["https://www.youtube.com/results?search_query={lang_name}+topic+tutorial"],
+      "practice": ["https://www.hackerrank.com", "https://leetcode.com"],
+      "learning": ["https://docs.example.com", "https://www.w3schools.com"]
+    }}
       ]
     }}
   ]
 }}
 
 Make it comprehensive and educational. Return only JSON."""
-        
-        response = call_ai_with_fallback(prompt)
-        if not response:
-            raise ValueError("AI generation failed")
-        
-        # Extract JSON
-        cleaned = response.strip()
-        if '```json' in cleaned:
-            cleaned = cleaned.split('```json')[1].split('```')[0]
-        elif '```' in cleaned:
-            parts = cleaned.split('```')
-            for part in parts:
-                if '{' in part:
-                    cleaned = part
-                    break
-        
-        start = cleaned.find('{')
-        end = cleaned.rfind('}') + 1
-        if start != -1 and end > start:
-            cleaned = cleaned[start:end]
-        
-        data = json.loads(cleaned.strip())
-        
-        return {
-            "iconUrl": icon_url,
-            "color": color,
-            "topics": data.get('topics', [])
-        }
     
+    response = await call_ai_with_fallback(prompt, CUSTOM_ROADMAP, max_output_tokens("custom_roadmap"))
+    if not response:
+        raise ValueError("AI generation failed")
+    
+    data = extract_json(response, CUSTOM_ROADMAP)
+    
+    return {
+        "iconUrl": icon_url,
+        "color": color,
+        "topics": data.get('topics', [])
+    }
+
+@app.post("/api/code/generate-custom-roadmap")
+async def generate_custom_roadmap(request: CustomRoadmapRequest):
+    """Generate custom programming language roadmap with AI"""
+    try:
+        language = request.language.strip()
+        return await cataloged("custom-roadmap", language, build_custom_roadmap)
     except Exception as e:
-        print(f"Custom roadmap error: {e}")
+        log.warning("Custom roadmap failed", extra={"language": language, "error": str(e)[:200]})
         raise HTTPException(status_code=500, detail=str(e))
 
+@jobs.register("learn-roadmap")
+async def learn_roadmap_job(payload: Dict, report) -> List[Dict]:
+    return await cataloged("learn-roadmap", payload["topic"], build_learning_roadmap)
+
+@jobs.register("custom-roadmap")
+async def custom_roadmap_job(payload: Dict, report) -> Dict:
+    return await cataloged("custom-roadmap", payload["language"], build_custom_roadmap)
+
+@app.post("/api/jobs/process-video")
+async def submit_process_video_job(request: VideoRequest):
+    """Queue study-material generation; jobs for the same video are shared"""
+    try:
+        video_id = extract_video_id(request.url)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return jobs.submit("process-video", {"video_id": video_id}, video_id)
+
+@app.post("/api/jobs/learn-roadmap")
+async def submit_learn_roadmap_job(request: LearnRequest):
+    topic = request.topic.strip()
+    return jobs.submit("learn-roadmap", {"topic": topic}, catalog.catalog_key(topic))
+
+@app.post("/api/jobs/custom-roadmap")
+async def submit_custom_roadmap_job(request: CustomRoadmapRequest):
+    language = request.language.strip()
+    return jobs.submit("custom-roadmap", {"language": language}, catalog.catalog_key(language))
+
+@app.get("/api/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    job = jobs.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/api/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    """The job's result once done (or partial); 202 with the status while it is still queued or running"""
+    job = jobs.get_job(job_id, with_result=True)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] == "failed":
+        raise HTTPException(status_code=500, detail=job["error"] or "Job failed")
+    if job["status"] not in ("done", "partial"):
+        return JSONResponse(status_code=202, content={key: value for key, value in job.items() if key != "result"})
+    return job["result"]
+
+def check_admin_token(token: str):
+    """Admin endpoints are closed unless ADMIN_TOKEN is set and sent in X-Admin-Token"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled")
+    if not token or not hmac.compare_digest(token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+def forget_videos(video_id: str = None) -> int:
+    """Drop the study material of one video (or all) and everything generated from it
+
+    Returns how many study-material entries were removed.
+    """
+    if video_id is None:
+        removed = generation_cache.clear()
+        video_contexts.clear()
+        answer_cache.delete_scope_prefix("video:")
+        explanation_cache.clear()
+    else:
+        removed = generation_cache.delete_prefix(f"{video_id}:")
+        video_contexts.delete(video_id)
+        answer_cache.delete_scope(f"video:{video_id}")
+        explanation_cache.delete_prefix(f"{video_id}:")
+    forget_index(video_id)
+    item_pool.forget(video_id)
+    jobs.forget("process-video", video_id)
+    return removed
+
+@app.delete("/api/cache/process-video/{video_id}")
+async def invalidate_video_cache(video_id: str, x_admin_token: str = Header(None)):
+    """Drop cached study materials for one video (all prompt versions)"""
+    check_admin_token(x_admin_token)
+    return {"video_id": video_id, "removed": forget_videos(video_id)}
+
+@app.delete("/api/cache/process-video")
+async def clear_video_cache(x_admin_token: str = Header(None)):
+    check_admin_token(x_admin_token)
+    return {"removed": forget_videos()}
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    return {
+        "process_video": generation_cache.stats(),
+        "flashcard_explanations": explanation_cache.stats(),
+        "video_contexts": video_contexts.stats(),
+        "jobs": jobs.queue_stats(),
+        "single_flight": single_flight_stats(),
+        "transcripts": transcript_store.stats(),
+        "json_extraction": extraction_stats(),
+        "answer_cache": answer_cache.stats(),
+        "catalog": catalog.catalog_stats(),
+        "item_pool": item_pool.pool_stats(),
+        "code_resources": resource_stats(),
+        "pipeline": pipeline_stats(),
+        "http_pools": pool_stats()
+    }
+
+# Counters the modules already keep per worker, exported as increases so they add up across workers
+metrics.track(
+    "svl_json_extraction_total", ("outcome",),
+    lambda: {(outcome,): count for outcome, count in extraction_stats().items()},
+    "JSON parses of model output by outcome (failed when nothing usable was found)"
+)
+metrics.track(
+    "svl_answer_cache_total", ("kind", "result"),
+    lambda: {(kind, result): count for kind, counts in answer_cache.counts.items() for result, count in counts.items()},
+    "Tutor answer cache lookups (hits, misses) and stores per endpoint"
+)
+metrics.track(
+    "svl_cache_requests_total", ("cache", "result"),
+    lambda: {
+        (name, result): getattr(cache, result)
+        for name, cache in {
+            "generation": generation_cache, "transcripts": transcript_store, "condensed": condensed_store,
+            "explanations": explanation_cache,
+            "video_search": video_search_store, "practice": practice_store
+        }.items()
+        for result in ("hits", "misses")
+    },
+    "Shared cache reads by result"
+)
+metrics.track(
+    "svl_catalog_lookups_total", ("result",),
+    lambda: {(result,): count for result, count in catalog.stats.items()},
+    "Catalog lookups (hits, misses) and live additions"
+)
+metrics.track(
+    "svl_single_flight_total", ("flight", "role"),
+    lambda: {
+        (name, role): count
+        for name, counts in single_flight_stats().items()
+        for role, count in counts.items() if role != "in_flight"
+    },
+    "Single-flight callers that led a computation or shared one"
+)
+metrics.track(
+    "svl_upstream_total", ("host", "event"),
+    lambda: {
+        (host, event): counts[event]
+        for host, counts in pool_stats().items()
+        for event in ("requests", "connections", "tls_handshakes", "server_errors")
+    },
+    "Outbound HTTP requests, new connections, TLS handshakes and 5xx responses per host"
+)
+
+metrics.track(
+    "svl_item_pool_total", ("event",),
+    lambda: {(event,): count for event, count in item_pool.stats.items()},
+    "Pooled flashcards and quiz questions added, rejected as near-duplicates and served"
+)
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus text format, aggregated over all workers"""
+    return Response(content=await asyncio.to_thread(metrics.render), media_type="text/plain; version=0.0.4")
+
+@app.on_event("startup")
+async def startup():
+    await asyncio.to_thread(load_encodings)
+    catalog.load()
+    jobs.start_workers()
+    metrics.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await jobs.stop_workers()
+    await close_client()
+    await metrics.stop()
+    logs.shutdown()
+    close_resources()
+
 @app.get("/api/health")
 async def health_check():
-    return {"status": "healthy", "ai": "Multi-AI (Groq/OpenAI/Gemini)"}
+    breakers = provider_health()
+    degraded = all(breaker["state"] == "open" for breaker in breakers.values())
+    return {
+        "status": "degraded" if degraded else "healthy",
+        "ai": "Multi-AI (Groq/OpenAI/Gemini)",
+        "providers": provider_stats(),
+        "breakers": breakers
+    }
 
 @app.get("/")
 async def root():
@@ -0,0 +1,159 @@
+"""Precomputed roadmaps and code trees for popular languages and subjects
+
+catalog.json is built offline and checked in. It is loaded into memory at
+startup and served without calling a provider. Anything not in it is generated
+live once and added to a shared SQLite store, so other workers and later
+requests get it too; `export` folds those additions into the next catalog.json.
+
+    python catalog.py build [--kind code-tree] [--names "Python,Go"] [--force]
+    python catalog.py export
+"""
+import json
+import logging
+import os
+import time
+from collections import Counter
+from store import SqliteCache
+
+log = logging.getLogger(__name__)
+
+CATALOG_PATH = os.getenv("CATALOG_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "catalog.json"))
+KINDS = ("code-tree", "custom-roadmap", "learn-roadmap")
+
+# What `build` generates when no names are given
+POPULAR = {
+    "code-tree": ["Python", "JavaScript", "Java", "C++", "C", "C#", "TypeScript", "Go", "Rust", "Kotlin",
+                  "Swift", "PHP", "Ruby", "SQL", "R", "Dart"],
+    # Python, JavaScript and Java roadmaps ship with the frontend
+    "custom-roadmap": ["C++", "C", "C#", "TypeScript", "Go", "Rust", "Kotlin", "Swift", "PHP", "Ruby",
+                       "SQL", "R", "Dart", "Scala"],
+    "learn-roadmap": ["Machine Learning", "Deep Learning", "Data Structures and Algorithms", "Web Development",
+                      "Python Programming", "Calculus", "Linear Algebra", "Statistics", "Physics", "Chemistry",
+                      "Organic Chemistry", "Biology", "Economics", "Data Science"]
+}
+
+_entries = {kind: {} for kind in KINDS}
+version = None
+# Live-generated entries shared by all workers until they are exported into catalog.json
+live_store = SqliteCache("catalog_live", max_bytes=int(os.getenv("CATALOG_LIVE_MAX_MB", "50")) * 1024 * 1024)
+stats = Counter()
+
+def catalog_key(name: str) -> str:
+    return ' '.join(name.lower().split())
+
+def load(path: str = CATALOG_PATH):
+    global version
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        log.warning("No catalog, everything will be generated live", extra={"path": path})
+        return
+    version = data.get("version")
+    for kind, entries in data.get("entries", {}).items():
+        _entries.setdefault(kind, {}).update(entries)
+    log.info("Catalog loaded", extra={"version": version, **{kind: len(entries) for kind, entries in _entries.items()}})
+
+def lookup(kind: str, key: str):
+    value = _entries[kind].get(key)
+    if value is None:
+        value = live_store.get_json(f"{kind}:{key}")
+        if value is not None:
+            _entries[kind][key] = value
+    return value
+
+def get(kind: str, name: str):
+    value = lookup(kind, catalog_key(name))
+    stats["hits" if value is not None else "misses"] += 1
+    return value
+
+def add(kind: str, name: str, value):
+    key = catalog_key(name)
+    _entries[kind][key] = value
+    live_store.set_json(f"{kind}:{key}", value)
+    stats["added"] += 1
+
+def catalog_stats() -> dict:
+    return {"version": version, **{kind: len(entries) for kind, entries in _entries.items()}, **stats}
+
+def _write(entries: dict, path: str = CATALOG_PATH):
+    global version
+    try:
+        with open(path, encoding="utf-8") as f:
+            current = json.load(f)
+    except FileNotFoundError:
+        current = {"version": 0, "entries": {}}
+    merged = {kind: dict(current.get("entries", {}).get(kind, {})) for kind in KINDS}
+    for kind, values in entries.items():
+        merged[kind].update(values)
+    version = current.get("version", 0) + 1
+    data = {
+        "version": version,
+        "generated": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "entries": {kind: dict(sorted(values.items())) for kind, values in merged.items()}
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=1, ensure_ascii=False)
+        f.write("\n")
+    print(f"✓ Wrote catalog v{version} to {path}")
+
+async def _build(kinds, names, force: bool, concurrency: int):
+    import asyncio
+    # The builders and their prompts live with the endpoints
+    from app import build_code_tree, build_custom_roadmap, build_learning_roadmap
+    from ai_client import close_client
+    builders = {"code-tree": build_code_tree, "custom-roadmap": build_custom_roadmap, "learn-roadmap": build_learning_roadmap}
+    load()
+    semaphore = asyncio.Semaphore(concurrency)
+    results = {kind: {} for kind in kinds}
+
+    async def run(kind: str, name: str):
+        async with semaphore:
+            try:
+                results[kind][catalog_key(name)] = await builders[kind](name)
+                print(f"✓ {kind}: {name}")
+            except Exception as e:
+                print(f"✗ {kind}: {name}: {str(e)[:100]}")
+
+    tasks = [
+        run(kind, name)
+        for kind in kinds
+        for name in (names or POPULAR[kind])
+        if force or catalog_key(name) not in _entries[kind]
+    ]
+    await asyncio.gather(*tasks)
+    await close_client()
+    _write(results)
+
+def _export():
+    """Fold live-generated entries into catalog.json"""
+    entries = {kind: {} for kind in KINDS}
+    for key in live_store.keys():
+        kind, _, name = key.partition(":")
+        if kind in entries:
+            entries[kind][name] = live_store.get_json(key)
+    print(f"→ Exporting {sum(len(values) for values in entries.values())} live entries")
+    _write(entries)
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+    parser = argparse.ArgumentParser(description="Build or export the roadmap/code-tree catalog")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="generate missing entries for popular names")
+    build.add_argument("--kind", choices=KINDS, action="append", help="limit to one kind (repeatable)")
+    build.add_argument("--names", help="comma-separated names instead of the popular list")
+    build.add_argument("--force", action="store_true", help="regenerate entries already in the catalog")
+    build.add_argument("--concurrency", type=int, default=2)
+    commands.add_parser("export", help="add live-generated entries to catalog.json")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        names = [name.strip() for name in args.names.split(",") if name.strip()] if args.names else None
+        asyncio.run(_build(args.kind or list(KINDS), names, args.force, args.concurrency))
+    else:
+        _export()
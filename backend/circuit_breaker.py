@@ -0,0 +1,145 @@
+import logging
+import os
+import threading
+import time
+from store import connect
+
+log = logging.getLogger(__name__)
+
+# A provider trips open when too many recent calls failed or were too slow
+BREAKER_WINDOW = float(os.getenv("BREAKER_WINDOW", "60"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "5"))
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+BREAKER_SLOW_CALL = float(os.getenv("BREAKER_SLOW_CALL", "45"))
+BREAKER_COOLDOWN = float(os.getenv("BREAKER_COOLDOWN", "30"))
+# A half-open probe that neither reported back nor was released (a crashed worker) is handed
+# to another caller after this long
+BREAKER_PROBE_TIMEOUT = float(os.getenv("BREAKER_PROBE_TIMEOUT", "120"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+_lock = threading.Lock()
+_conn = None
+
+def _db():
+    global _conn
+    if _conn is None:
+        _conn = connect("circuit_breakers")
+        _conn.execute("""CREATE TABLE IF NOT EXISTS breakers (
+            name TEXT PRIMARY KEY,
+            state TEXT NOT NULL,
+            opened_at REAL,
+            probe_started REAL
+        )""")
+        _conn.execute("""CREATE TABLE IF NOT EXISTS outcomes (
+            name TEXT NOT NULL,
+            ts REAL NOT NULL,
+            failed INTEGER NOT NULL
+        )""")
+        _conn.execute("CREATE INDEX IF NOT EXISTS outcomes_name_ts ON outcomes(name, ts)")
+    return _conn
+
+def _state(conn, name: str):
+    row = conn.execute("SELECT state, opened_at, probe_started FROM breakers WHERE name = ?", (name,)).fetchone()
+    return row if row else (CLOSED, None, None)
+
+def allow_request(name: str, claim: bool = True):
+    """Whether to call the provider: False means skip it without a call
+
+    While the breaker is closed this returns True. Once the cooldown is over,
+    exactly one caller across all workers gets the half-open probe and receives
+    its claim time instead; it must end the probe with record_result, or with
+    release_probe if the call never happened or was cancelled. claim=False only
+    checks whether a call would be allowed, without taking the probe.
+    """
+    now = time.time()
+    with _lock:
+        conn = _db()
+        state, opened_at, probe_started = _state(conn, name)
+        if state == CLOSED:
+            return True
+        if state == OPEN:
+            if now - opened_at < BREAKER_COOLDOWN:
+                return False
+            if not claim:
+                return True
+            claimed = conn.execute(
+                "UPDATE breakers SET state = ?, probe_started = ? WHERE name = ? AND state = ?",
+                (HALF_OPEN, now, name, OPEN)
+            ).rowcount
+            return now if claimed == 1 else False
+        if probe_started is None or now - probe_started > BREAKER_PROBE_TIMEOUT:
+            if not claim:
+                return True
+            claimed = conn.execute(
+                "UPDATE breakers SET probe_started = ? WHERE name = ? AND state = ? AND probe_started IS ?",
+                (now, name, HALF_OPEN, probe_started)
+            ).rowcount
+            return now if claimed == 1 else False
+        return False
+
+def holds_probe(permit) -> bool:
+    return permit is not True and bool(permit)
+
+def release_probe(name: str, permit):
+    """Give back a half-open probe that ended without a result, so the next caller can probe"""
+    if not holds_probe(permit):
+        return
+    with _lock:
+        _db().execute(
+            "UPDATE breakers SET probe_started = NULL WHERE name = ? AND state = ? AND probe_started = ?",
+            (name, HALF_OPEN, permit)
+        )
+
+def record_result(name: str, success: bool, latency: float):
+    now = time.time()
+    failed = not success or latency > BREAKER_SLOW_CALL
+    with _lock:
+        conn = _db()
+        state = _state(conn, name)[0]
+        if state == HALF_OPEN:
+            if failed:
+                _open(conn, name, now)
+            else:
+                conn.execute("DELETE FROM outcomes WHERE name = ?", (name,))
+                conn.execute("UPDATE breakers SET state = ?, opened_at = NULL, probe_started = NULL WHERE name = ?", (CLOSED, name))
+                log.info("Circuit closed", extra={"provider": name})
+            return
+        if state == OPEN:
+            return
+
+        conn.execute("INSERT INTO outcomes (name, ts, failed) VALUES (?, ?, ?)", (name, now, int(failed)))
+        conn.execute("DELETE FROM outcomes WHERE name = ? AND ts < ?", (name, now - BREAKER_WINDOW))
+        calls, failures = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(failed), 0) FROM outcomes WHERE name = ?", (name,)
+        ).fetchone()
+        if calls >= BREAKER_MIN_CALLS and failures / calls >= BREAKER_ERROR_RATE:
+            _open(conn, name, now)
+
+def _open(conn, name: str, now: float):
+    conn.execute(
+        "INSERT OR REPLACE INTO breakers (name, state, opened_at, probe_started) VALUES (?, ?, ?, NULL)",
+        (name, OPEN, now)
+    )
+    log.warning("Circuit opened", extra={"provider": name, "cooldown": BREAKER_COOLDOWN})
+
+def breaker_states(names) -> dict:
+    now = time.time()
+    states = {}
+    with _lock:
+        conn = _db()
+        for name in names:
+            state, opened_at, _ = _state(conn, name)
+            calls, failures = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(failed), 0) FROM outcomes WHERE name = ? AND ts >= ?",
+                (name, now - BREAKER_WINDOW)
+            ).fetchone()
+            states[name] = {
+                "state": state,
+                "recent_calls": calls,
+                "recent_failures": failures,
+                "retry_in": round(max(0.0, opened_at + BREAKER_COOLDOWN - now), 1) if state == OPEN else None
+            }
+    return states
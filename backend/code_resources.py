@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import os
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+from youtubesearchpython import VideosSearch
+from store import SqliteCache
+from ai_client import call_ai_with_fallback
+from singleflight import single_flight
+from json_extract import extract_json
+from schemas import PRACTICE_RESOURCES
+from token_budget import max_output_tokens
+from logs import log_payload
+
+log = logging.getLogger(__name__)
+
+SEARCH_RESULTS = 4
+# youtubesearchpython scrapes synchronously, so searches run in their own small pool
+# instead of blocking the event loop or filling the default executor
+SEARCH_THREADS = int(os.getenv("YOUTUBE_SEARCH_THREADS", "4"))
+# Topics of one batch request fetched at the same time
+BATCH_CONCURRENCY = int(os.getenv("RESOURCE_BATCH_CONCURRENCY", "4"))
+MAX_BATCH_TOPICS = 30
+
+# "<language>:<topic>" -> videos / practice sites; search results go stale faster than practice sites
+video_search_store = SqliteCache(
+    "video_search",
+    ttl=float(os.getenv("YOUTUBE_SEARCH_TTL", 24 * 3600)),
+    max_bytes=int(os.getenv("YOUTUBE_SEARCH_STORE_MAX_MB", "50")) * 1024 * 1024
+)
+practice_store = SqliteCache(
+    "practice_resources",
+    ttl=float(os.getenv("PRACTICE_RESOURCES_TTL", 7 * 24 * 3600)),
+    max_bytes=int(os.getenv("PRACTICE_STORE_MAX_MB", "20")) * 1024 * 1024
+)
+
+_search_pool = ThreadPoolExecutor(max_workers=SEARCH_THREADS, thread_name_prefix="youtube-search")
+stats = Counter()
+
+PRACTICE_PROMPT = """List 3-4 best practice websites for learning {language} - {topic}.
+
+Return ONLY valid JSON:
+{{
+  "practice": [
+    {{"name": "Website Name", "url": "https://...", "type": "Interactive Coding", "description": "Brief description"}}
+  ],
+  "description": "Brief overview of the topic"
+}}"""
+
+def resource_key(language: str, topic: str) -> str:
+    return f"{' '.join(language.lower().split())}:{' '.join(topic.lower().split())}"
+
+def _search(query: str) -> List[Dict]:
+    results = VideosSearch(query, limit=SEARCH_RESULTS).result()
+    return [
+        {
+            "title": video['title'],
+            "url": video['link'],
+            "thumbnail": video['thumbnails'][0]['url'] if video.get('thumbnails') else '',
+            "channel": (video.get('channel') or {}).get('name', 'Unknown')
+        }
+        for video in results.get('result', [])
+    ]
+
+async def search_videos(language: str, topic: str) -> List[Dict]:
+    key = resource_key(language, topic)
+    cached = video_search_store.get_json(key)
+    if cached is not None:
+        return cached
+
+    async def search():
+        stats["searches"] += 1
+        loop = asyncio.get_running_loop()
+        try:
+            videos = await loop.run_in_executor(_search_pool, _search, f"{language} {topic} tutorial")
+        except Exception as e:
+            stats["search_errors"] += 1
+            log.warning("YouTube search failed", extra={"language": language, "topic": topic, "error": str(e)[:200]})
+            return []
+        # Empty results are not stored, so a transient scrape failure is retried next time
+        if videos:
+            video_search_store.set_json(key, videos)
+        return videos
+
+    return await single_flight("youtube-search", key, search, lookup=lambda: video_search_store.get_json(key))
+
+async def practice_resources(language: str, topic: str) -> Dict:
+    key = resource_key(language, topic)
+    cached = practice_store.get_json(key)
+    if cached is not None:
+        return cached
+
+    async def generate():
+        prompt = PRACTICE_PROMPT.format(language=language, topic=topic)
+        response = await call_ai_with_fallback(prompt, PRACTICE_RESOURCES, max_output_tokens("practice_resources"))
+        try:
+            data = extract_json(response, PRACTICE_RESOURCES) if response else {}
+        except ValueError as e:
+            log.warning("Practice resources unparseable", extra={"language": language, "topic": topic, "error": str(e)[:200]})
+            log_payload(log, "Unparseable practice resources", response, language=language, topic=topic)
+            data = {}
+        practice = {"practice": data.get('practice', []), "description": data.get('description', '')}
+        if practice["practice"]:
+            practice_store.set_json(key, practice)
+        return practice
+
+    return await single_flight("practice-resources", key, generate, lookup=lambda: practice_store.get_json(key))
+
+async def get_resources(language: str, topic: str) -> Dict:
+    """YouTube videos and practice websites for a topic; the search and the AI call run concurrently"""
+    language, topic = language.strip(), topic.strip()
+    videos, practice = await asyncio.gather(search_videos(language, topic), practice_resources(language, topic))
+    return {"videos": videos, **practice}
+
+async def get_resources_batch(language: str, topics: List[str]) -> Dict[str, Dict]:
+    """Resources for many topics of one language, at most BATCH_CONCURRENCY at a time"""
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+    unique = {}
+    for topic in topics:
+        if topic.strip():
+            unique.setdefault(resource_key(language, topic), topic.strip())
+    unique = list(unique.values())[:MAX_BATCH_TOPICS]
+
+    async def fetch(topic: str):
+        async with semaphore:
+            try:
+                return await get_resources(language, topic)
+            except Exception as e:
+                log.warning("Resources failed", extra={"language": language, "topic": topic, "error": str(e)[:200]})
+                return {"videos": [], "practice": [], "description": ""}
+
+    results = await asyncio.gather(*(fetch(topic) for topic in unique))
+    return dict(zip(unique, results))
+
+def resource_stats() -> dict:
+    return {"videos": video_search_store.stats(), "practice": practice_store.stats(), **stats}
+
+def close():
+    _search_pool.shutdown(wait=False)
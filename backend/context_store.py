@@ -0,0 +1,170 @@
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from store import connect
+
+def _context_size(context: dict) -> int:
+    return sum(len(str(value).encode("utf-8")) for value in context.values())
+
+class LazyContext(dict):
+    """Video context whose transcript is only read from the store when accessed"""
+
+    def __init__(self, data: dict, loader):
+        super().__init__(data)
+        self._loader = loader
+
+    def _load(self):
+        if self._loader is not None and "transcript" not in self:
+            dict.__setitem__(self, "transcript", self._loader())
+            self._loader = None
+
+    def __getitem__(self, key):
+        if key == "transcript":
+            self._load()
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        if key == "transcript":
+            self._load()
+        return super().get(key, default)
+
+class MemoryContextStore:
+    """Per-worker LRU of video contexts bounded by total bytes"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def put(self, video_id: str, context: dict):
+        size = _context_size(context)
+        with self.lock:
+            self._remove(video_id)
+            self.entries[video_id] = (dict(context), size)
+            self.bytes += size
+            while self.bytes > self.max_bytes and len(self.entries) > 1:
+                oldest = next(iter(self.entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def get(self, video_id: str) -> dict:
+        with self.lock:
+            entry = self.entries.get(video_id)
+            if entry is None:
+                return {}
+            self.entries.move_to_end(video_id)
+            return dict(entry[0])
+
+    def delete(self, video_id: str):
+        with self.lock:
+            self._remove(video_id)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def _remove(self, video_id: str):
+        entry = self.entries.pop(video_id, None)
+        if entry is not None:
+            self.bytes -= entry[1]
+
+    def stats(self) -> dict:
+        return {
+            "backend": "memory",
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions
+        }
+
+class SqliteContextStore:
+    """Video contexts shared by all workers through a local SQLite file"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self.lock = threading.Lock()
+        self.conn = connect("video_contexts")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS contexts (
+            video_id TEXT PRIMARY KEY,
+            title TEXT,
+            topic TEXT,
+            content TEXT,
+            transcript BLOB,
+            size INTEGER NOT NULL,
+            accessed REAL NOT NULL
+        )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS contexts_accessed ON contexts(accessed)")
+
+    def put(self, video_id: str, context: dict):
+        transcript = zlib.compress(context.get("transcript", "").encode("utf-8"))
+        size = _context_size({k: v for k, v in context.items() if k != "transcript"}) + len(transcript)
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO contexts (video_id, title, topic, content, transcript, size, accessed) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (video_id, context.get("title", ""), context.get("topic", ""), context.get("content", ""), transcript, size, time.time())
+            )
+            self._evict(video_id)
+
+    def get(self, video_id: str) -> dict:
+        # The transcript column is left on disk until a caller actually reads it
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT title, topic, content FROM contexts WHERE video_id = ?", (video_id,)
+            ).fetchone()
+            if row is None:
+                return {}
+            self.conn.execute("UPDATE contexts SET accessed = ? WHERE video_id = ?", (time.time(), video_id))
+        title, topic, content = row
+        return LazyContext({"title": title, "topic": topic, "content": content}, lambda: self.get_transcript(video_id))
+
+    def get_transcript(self, video_id: str) -> str:
+        with self.lock:
+            row = self.conn.execute("SELECT transcript FROM contexts WHERE video_id = ?", (video_id,)).fetchone()
+        return zlib.decompress(row[0]).decode("utf-8") if row and row[0] else ""
+
+    def delete(self, video_id: str):
+        with self.lock:
+            self.conn.execute("DELETE FROM contexts WHERE video_id = ?", (video_id,))
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM contexts")
+
+    def _evict(self, keep: str):
+        """Drop least recently used contexts until under max_bytes, always keeping keep (the one just written)"""
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM contexts").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for video_id, size in self.conn.execute(
+            "SELECT video_id, size FROM contexts WHERE video_id != ? ORDER BY accessed", (keep,)
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self.conn.execute("DELETE FROM contexts WHERE video_id = ?", (video_id,))
+            total -= size
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        with self.lock:
+            count, size = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM contexts").fetchone()
+        return {
+            "backend": "sqlite",
+            "entries": count,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions
+        }
+
+def create_context_store():
+    """CONTEXT_STORE=sqlite (default, shared across workers) or memory (single worker)"""
+    backend = os.getenv("CONTEXT_STORE", "sqlite").lower()
+    max_bytes = int(os.getenv("CONTEXT_STORE_MAX_MB", "256")) * 1024 * 1024
+    if backend == "memory":
+        return MemoryContextStore(max_bytes)
+    return SqliteContextStore(max_bytes)
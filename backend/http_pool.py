@@ -0,0 +1,72 @@
+import os
+from collections import defaultdict
+from urllib.parse import urlsplit
+import httpx
+
+# Connections per upstream host, kept alive between calls in each worker. Provider hosts
+# speak HTTP/2, so a few connections multiplex many concurrent completions.
+HOST_LIMITS = {
+    "api.groq.com": httpx.Limits(max_connections=50, max_keepalive_connections=10),
+    "api.openai.com": httpx.Limits(max_connections=50, max_keepalive_connections=10),
+    "generativelanguage.googleapis.com": httpx.Limits(max_connections=50, max_keepalive_connections=10),
+    "www.youtube.com": httpx.Limits(max_connections=20, max_keepalive_connections=5),
+}
+DEFAULT_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=5)
+KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+HTTP_TIMEOUT = httpx.Timeout(float(os.getenv("HTTP_TIMEOUT", "60")), connect=10)
+
+_clients = {}
+# Per host: requests, new TCP connections and TLS handshakes, so reuse = 1 - connections / requests
+stats = defaultdict(lambda: {"requests": 0, "connections": 0, "tls_handshakes": 0, "server_errors": 0})
+
+def _host(url: str) -> str:
+    return urlsplit(url).hostname or url
+
+def _hooks(host: str) -> dict:
+    counts = stats[host]
+
+    async def trace(event: str, info: dict):
+        if event == "connection.connect_tcp.complete":
+            counts["connections"] += 1
+        elif event == "connection.start_tls.complete":
+            counts["tls_handshakes"] += 1
+
+    async def on_request(request: httpx.Request):
+        counts["requests"] += 1
+        request.extensions["trace"] = trace
+
+    async def on_response(response: httpx.Response):
+        if response.status_code >= 500:
+            counts["server_errors"] += 1
+
+    return {"request": [on_request], "response": [on_response]}
+
+def client_for(url: str) -> httpx.AsyncClient:
+    """This worker's pooled client for url's host, created on first use"""
+    host = _host(url)
+    client = _clients.get(host)
+    if client is None:
+        limits = HOST_LIMITS.get(host, DEFAULT_LIMITS)
+        client = httpx.AsyncClient(
+            http2=True,
+            timeout=HTTP_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=limits.max_connections,
+                max_keepalive_connections=limits.max_keepalive_connections,
+                keepalive_expiry=KEEPALIVE_EXPIRY
+            ),
+            event_hooks=_hooks(host)
+        )
+        _clients[host] = client
+    return client
+
+async def close_clients():
+    for client in list(_clients.values()):
+        await client.aclose()
+    _clients.clear()
+
+def pool_stats() -> dict:
+    return {
+        host: {**counts, "reuse_rate": round(1 - counts["connections"] / counts["requests"], 3) if counts["requests"] else None}
+        for host, counts in stats.items()
+    }
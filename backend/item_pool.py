@@ -0,0 +1,292 @@
+"""Per-video pools of generated flashcards and quiz questions
+
+"More" requests take items the client has not been served yet, so one generation
+feeds many requests. Quiz questions are bucketed by difficulty and question type,
+which makes the quiz pool the video's question bank. New items are checked
+against the whole pool with MinHash over character shingles, which catches
+reworded copies of an existing card that an exact string comparison lets through.
+"""
+import json
+import logging
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from array import array
+from collections import Counter, defaultdict
+from store import connect
+
+log = logging.getLogger(__name__)
+
+# Estimated Jaccard similarity of shingle sets at which a new item counts as a copy
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("POOL_NEAR_DUPLICATE_THRESHOLD", "0.5"))
+# Items kept per video and kind; background refills stop here
+POOL_MAX_ITEMS = int(os.getenv("POOL_MAX_ITEMS", "200"))
+# How long a consumer is remembered to have been served an item
+POOL_SERVED_TTL = float(os.getenv("POOL_SERVED_TTL", 7 * 24 * 3600))
+SHINGLE_CHARS = 4
+NUM_PERM = 64
+
+_MERSENNE = (1 << 61) - 1
+_rng = random.Random(7)
+# Fixed so signatures stored by one worker compare with those computed by another
+_PERMUTATIONS = [(_rng.randrange(1, _MERSENNE), _rng.randrange(0, _MERSENNE)) for _ in range(NUM_PERM)]
+
+STOPWORDS = {
+    "a", "an", "the", "of", "to", "in", "on", "for", "and", "or", "is", "are", "was", "were", "be",
+    "by", "with", "as", "at", "it", "its", "that", "this", "which", "what", "how", "why", "does", "do"
+}
+
+_lock = threading.Lock()
+_conn = None
+_calls = 0
+stats = Counter()
+
+def _db():
+    global _conn
+    if _conn is None:
+        _conn = connect("item_pool")
+        _conn.execute("""CREATE TABLE IF NOT EXISTS items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            video_id TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            difficulty TEXT NOT NULL,
+            qtype TEXT NOT NULL DEFAULT '',
+            item TEXT NOT NULL,
+            signature BLOB NOT NULL,
+            servable INTEGER NOT NULL,
+            created REAL NOT NULL
+        )""")
+        # Pools created before questions were bucketed by type
+        if "qtype" not in {row[1] for row in _conn.execute("PRAGMA table_info(items)")}:
+            try:
+                _conn.execute("ALTER TABLE items ADD COLUMN qtype TEXT NOT NULL DEFAULT ''")
+            except sqlite3.OperationalError:  # another worker added it first
+                pass
+        _conn.execute("CREATE INDEX IF NOT EXISTS items_video ON items(video_id, kind, difficulty, qtype)")
+        # Which client was given which item, so nobody is served the same item twice
+        _conn.execute("""CREATE TABLE IF NOT EXISTS served (
+            consumer TEXT NOT NULL,
+            item_id INTEGER NOT NULL,
+            served REAL NOT NULL,
+            PRIMARY KEY (consumer, item_id)
+        )""")
+        _conn.execute("CREATE INDEX IF NOT EXISTS served_item ON served(item_id)")
+    return _conn
+
+def item_text(kind: str, item: dict) -> str:
+    """The part of an item that makes it a copy of another one"""
+    if kind == "flashcards":
+        return f"{item.get('term', '')} {item.get('definition', '')}"
+    return item.get("question", "")
+
+def shingles(text: str) -> set:
+    words = [word for word in re.findall(r"[a-z0-9]+", text.lower()) if word not in STOPWORDS]
+    joined = ' '.join(words)
+    if len(joined) <= SHINGLE_CHARS:
+        return {joined} if joined else set()
+    return {joined[i:i + SHINGLE_CHARS] for i in range(len(joined) - SHINGLE_CHARS + 1)}
+
+def signature(text: str) -> array:
+    hashes = [zlib.crc32(shingle.encode("utf-8")) for shingle in shingles(text)] or [0]
+    return array("I", (min((a * h + b) % _MERSENNE for h in hashes) & 0xFFFFFFFF for a, b in _PERMUTATIONS))
+
+def similarity(first: array, second: array) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two signatures"""
+    return sum(x == y for x, y in zip(first, second)) / NUM_PERM
+
+def _signature_from(blob: bytes) -> array:
+    values = array("I")
+    values.frombytes(blob)
+    return values
+
+def question_type(kind: str, item: dict) -> str:
+    return str(item.get("type", "")).strip().lower().replace("-", "_").replace(" ", "_") if kind == "quiz" else ""
+
+def _term(kind: str, item: dict) -> str:
+    return ' '.join(item.get("term", "").lower().split()) if kind == "flashcards" else ""
+
+def add(video_id: str, kind: str, items: list, difficulty: str = "", servable: bool = True) -> int:
+    """Add the items that are not near-duplicates of the pool or of each other; returns how many were added
+
+    Items added with servable=False only take part in duplicate checks (the cards a
+    video's study material already shows, for instance).
+    """
+    candidates = []
+    for item in items:
+        text = item_text(kind, item)
+        if text.strip():
+            candidates.append((item, signature(text)))
+    if not candidates:
+        return 0
+
+    now = time.time()
+    added = 0
+    with _lock:
+        conn = _db()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            existing = [
+                (_signature_from(blob), _term(kind, json.loads(item)))
+                for item, blob in conn.execute(
+                    "SELECT item, signature FROM items WHERE video_id = ? AND kind = ?", (video_id, kind)
+                )
+            ]
+            for item, sig in candidates:
+                term = _term(kind, item)
+                if any((term and term == other_term) or similarity(sig, other) >= NEAR_DUPLICATE_THRESHOLD
+                       for other, other_term in existing):
+                    stats["duplicates"] += 1
+                    continue
+                conn.execute(
+                    "INSERT INTO items (video_id, kind, difficulty, qtype, item, signature, servable, created) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (video_id, kind, difficulty, question_type(kind, item), json.dumps(item), sig.tobytes(), int(servable), now)
+                )
+                existing.append((sig, term))
+                added += 1
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    stats["added"] += added
+    return added
+
+_UNUSED = """FROM items
+    WHERE video_id = ? AND kind = ? AND difficulty = ? AND servable = 1 AND (? IS NULL OR qtype = ?)
+    AND id NOT IN (SELECT item_id FROM served WHERE consumer = ?)"""
+
+def _interleave(rows: list, count: int) -> list:
+    """Random rows, taking from each question type in turn so a sample mixes types"""
+    buckets = defaultdict(list)
+    for row in rows:
+        buckets[row[1]].append(row)
+    for bucket in buckets.values():
+        random.shuffle(bucket)
+    picked = []
+    while len(picked) < count and any(buckets.values()):
+        for bucket in buckets.values():
+            if bucket and len(picked) < count:
+                picked.append(bucket.pop())
+    return picked
+
+def take(video_id: str, kind: str, consumer: str, count: int, difficulty: str = "", qtype: str = None) -> list:
+    """A random sample of up to count pooled items consumer has not been served, marked as served
+
+    qtype limits the sample to one question type; otherwise types are mixed evenly.
+    """
+    global _calls
+    now = time.time()
+    with _lock:
+        conn = _db()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            _calls += 1
+            if _calls % 500 == 0:
+                conn.execute("DELETE FROM served WHERE served < ?", (now - POOL_SERVED_TTL,))
+            rows = conn.execute(
+                f"SELECT id, qtype, item {_UNUSED}", (video_id, kind, difficulty, qtype, qtype, consumer)
+            ).fetchall()
+            rows = _interleave(rows, count)
+            conn.executemany(
+                "INSERT OR IGNORE INTO served (consumer, item_id, served) VALUES (?, ?, ?)",
+                [(consumer, item_id, now) for item_id, _, _ in rows]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    stats["served"] += len(rows)
+    return [json.loads(item) for _, _, item in rows]
+
+def take_again(video_id: str, kind: str, consumer: str, count: int, difficulty: str = "", qtype: str = None) -> list:
+    """Up to count items consumer was already served, the ones served longest ago first
+
+    For a pool that is full and will not grow, so a consumer who has seen all of
+    it cycles through it again.
+    """
+    now = time.time()
+    with _lock:
+        conn = _db()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                """SELECT items.id, items.item FROM items JOIN served ON served.item_id = items.id
+                WHERE served.consumer = ? AND video_id = ? AND kind = ? AND difficulty = ? AND servable = 1
+                AND (? IS NULL OR qtype = ?)
+                ORDER BY served.served LIMIT ?""",
+                (consumer, video_id, kind, difficulty, qtype, qtype, count)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE served SET served = ? WHERE consumer = ? AND item_id = ?",
+                [(now, consumer, item_id) for item_id, _ in rows]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    stats["repeated"] += len(rows)
+    return [json.loads(item) for _, item in rows]
+
+def unused(video_id: str, kind: str, consumer: str, difficulty: str = "", qtype: str = None) -> int:
+    with _lock:
+        return _db().execute(
+            f"SELECT COUNT(*) {_UNUSED}", (video_id, kind, difficulty, qtype, qtype, consumer)
+        ).fetchone()[0]
+
+def size(video_id: str, kind: str, difficulty: str = None) -> int:
+    """Items pooled for a video and kind, of one difficulty when given (including non-servable ones)"""
+    with _lock:
+        if difficulty is None:
+            return _db().execute(
+                "SELECT COUNT(*) FROM items WHERE video_id = ? AND kind = ?", (video_id, kind)
+            ).fetchone()[0]
+        return _db().execute(
+            "SELECT COUNT(*) FROM items WHERE video_id = ? AND kind = ? AND difficulty = ?", (video_id, kind, difficulty)
+        ).fetchone()[0]
+
+def full(video_id: str, kind: str, difficulty: str = "") -> bool:
+    """Whether the pool has reached POOL_MAX_ITEMS and no more items should be generated into it"""
+    return size(video_id, kind, difficulty) >= POOL_MAX_ITEMS
+
+def recent_texts(video_id: str, kind: str, limit: int = 40) -> list:
+    """Texts of the newest pooled items, for telling the model what not to repeat"""
+    with _lock:
+        rows = _db().execute(
+            "SELECT item FROM items WHERE video_id = ? AND kind = ? ORDER BY id DESC LIMIT ?", (video_id, kind, limit)
+        ).fetchall()
+    if kind == "flashcards":
+        return [json.loads(item).get("term", "") for item, in rows]
+    return [json.loads(item).get("question", "") for item, in rows]
+
+def forget(video_id: str = None) -> int:
+    """Drop one video's pools, or every pool when video_id is None"""
+    with _lock:
+        conn = _db()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if video_id is None:
+                conn.execute("DELETE FROM served")
+                removed = conn.execute("DELETE FROM items").rowcount
+            else:
+                conn.execute("DELETE FROM served WHERE item_id IN (SELECT id FROM items WHERE video_id = ?)", (video_id,))
+                removed = conn.execute("DELETE FROM items WHERE video_id = ?", (video_id,)).rowcount
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    return removed
+
+def pool_stats() -> dict:
+    with _lock:
+        rows = _db().execute("SELECT kind, COUNT(*), COUNT(DISTINCT video_id) FROM items GROUP BY kind").fetchall()
+        buckets = _db().execute(
+            "SELECT difficulty, qtype, COUNT(*) FROM items WHERE kind = 'quiz' AND servable = 1 GROUP BY difficulty, qtype"
+        ).fetchall()
+    return {
+        "items": {kind: {"items": count, "videos": videos} for kind, count, videos in rows},
+        "question_bank": {f"{difficulty}:{qtype}": count for difficulty, qtype, count in buckets},
+        **stats
+    }
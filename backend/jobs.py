@@ -0,0 +1,285 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from store import connect
+import logs
+
+log = logging.getLogger(__name__)
+
+# Jobs running at once across all workers on this host
+JOB_MAX_RUNNING = int(os.getenv("JOB_MAX_RUNNING", "4"))
+# Of those, how many may be background kinds (pool refills); they also wait behind queued user jobs
+JOB_MAX_BACKGROUND = int(os.getenv("JOB_MAX_BACKGROUND", "1"))
+# Polling tasks started in each worker process
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# The longest a job is expected to run, which bounds how long a client follows its progress
+JOB_TIMEOUT = float(os.getenv("JOB_TIMEOUT", "900"))
+# A worker marks its running job alive this often; a job not marked for JOB_LOST_AFTER is
+# assumed lost with its worker and requeued, however long it has been running
+JOB_HEARTBEAT_INTERVAL = float(os.getenv("JOB_HEARTBEAT_INTERVAL", "10"))
+JOB_LOST_AFTER = float(os.getenv("JOB_LOST_AFTER", "60"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "2"))
+# Finished jobs are kept this long so a reload can pick up the result
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", 7 * 24 * 3600))
+JOB_POLL_INTERVAL = 0.5
+
+handlers = {}
+background_kinds = set()
+_lock = threading.Lock()
+_conn = None
+_worker_tasks = []
+
+def _db():
+    global _conn
+    if _conn is None:
+        _conn = connect("jobs")
+        _conn.execute("""CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            dedupe_key TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL,
+            progress TEXT,
+            result BLOB,
+            error TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            worker INTEGER,
+            created REAL NOT NULL,
+            started REAL,
+            heartbeat REAL,
+            finished REAL
+        )""")
+        # Queues created before running jobs heartbeated
+        if "heartbeat" not in {row[1] for row in _conn.execute("PRAGMA table_info(jobs)")}:
+            try:
+                _conn.execute("ALTER TABLE jobs ADD COLUMN heartbeat REAL")
+            except sqlite3.OperationalError:  # another worker added it first
+                pass
+        _conn.execute("CREATE INDEX IF NOT EXISTS jobs_dedupe ON jobs(kind, dedupe_key, status)")
+        _conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs(status, created)")
+    return _conn
+
+class Partial:
+    """Handler result for a degraded run (a fallback build, say)
+
+    The job's own callers get it, but it finishes as "partial", which later
+    submits with the same key do not reuse, so they run the job again.
+    """
+    def __init__(self, result):
+        self.result = result
+
+def register(kind: str, background: bool = False):
+    """Decorator: handler(payload, report) -> JSON-serializable result
+
+    background jobs are work nobody is waiting on; see JOB_MAX_BACKGROUND.
+    """
+    def wrap(func):
+        handlers[kind] = func
+        if background:
+            background_kinds.add(kind)
+        return func
+    return wrap
+
+def _row_to_job(row, with_result: bool = False) -> dict:
+    (job_id, kind, dedupe_key, status, progress, result, error, attempts, created, started, finished) = row
+    job = {
+        "job_id": job_id,
+        "kind": kind,
+        "key": dedupe_key,
+        "status": status,
+        "progress": json.loads(progress) if progress else None,
+        "error": error,
+        "attempts": attempts,
+        "created": created,
+        "started": started,
+        "finished": finished
+    }
+    if with_result:
+        job["result"] = json.loads(zlib.decompress(result)) if result else None
+    return job
+
+JOB_COLUMNS = "id, kind, dedupe_key, status, progress, result, error, attempts, created, started, finished"
+
+def submit(kind: str, payload: dict, dedupe_key: str) -> dict:
+    """Queue a job, or return the active or recently done (not partial) job with the same key"""
+    now = time.time()
+    with _lock:
+        conn = _db()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                f"""SELECT {JOB_COLUMNS} FROM jobs
+                WHERE kind = ? AND dedupe_key = ? AND (status IN ('queued', 'running') OR (status = 'done' AND finished > ?))
+                ORDER BY created DESC LIMIT 1""",
+                (kind, dedupe_key, now - JOB_RESULT_TTL)
+            ).fetchone()
+            if row is None:
+                job_id = uuid.uuid4().hex
+                conn.execute(
+                    "INSERT INTO jobs (id, kind, dedupe_key, payload, status, created) VALUES (?, ?, ?, ?, 'queued', ?)",
+                    (job_id, kind, dedupe_key, json.dumps(payload), now)
+                )
+                row = conn.execute(f"SELECT {JOB_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    return _row_to_job(row)
+
+def get_job(job_id: str, with_result: bool = False):
+    with _lock:
+        row = _db().execute(f"SELECT {JOB_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return _row_to_job(row, with_result) if row else None
+
+def set_progress(job_id: str, progress: dict):
+    with _lock:
+        _db().execute("UPDATE jobs SET progress = ? WHERE id = ?", (json.dumps(progress), job_id))
+
+def _claim():
+    """Atomically move the next queued job to running, respecting JOB_MAX_RUNNING and JOB_MAX_BACKGROUND
+
+    User jobs are taken oldest first, background jobs only when no user job is queued.
+    """
+    now = time.time()
+    with _lock:
+        conn = _db()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Requeue jobs whose worker stopped heartbeating, failing them once they used up their attempts
+            lost = "status = 'running' AND COALESCE(heartbeat, started) < ?"
+            conn.execute(
+                f"UPDATE jobs SET status = 'failed', error = 'Worker lost', finished = ? WHERE {lost} AND attempts >= ?",
+                (now, now - JOB_LOST_AFTER, JOB_MAX_ATTEMPTS)
+            )
+            conn.execute(f"UPDATE jobs SET status = 'queued' WHERE {lost}", (now - JOB_LOST_AFTER,))
+            background = sorted(background_kinds)
+            marks = ", ".join("?" * len(background))
+            running, running_background = conn.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(kind IN ({marks})), 0) FROM jobs WHERE status = 'running'", background
+            ).fetchone()
+            row = None
+            if running < JOB_MAX_RUNNING:
+                skip_background = f"AND kind NOT IN ({marks})" if running_background >= JOB_MAX_BACKGROUND else ""
+                row = conn.execute(
+                    f"""SELECT id, kind, payload FROM jobs WHERE status = 'queued' {skip_background}
+                    ORDER BY kind IN ({marks}), created LIMIT 1""",
+                    (background if skip_background else []) + background
+                ).fetchone()
+                if row:
+                    conn.execute(
+                        "UPDATE jobs SET status = 'running', started = ?, heartbeat = ?, worker = ?, attempts = attempts + 1 WHERE id = ?",
+                        (now, now, os.getpid(), row[0])
+                    )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    return row
+
+def _finish(job_id: str, result=None, error: str = None):
+    status = "failed" if error else "partial" if isinstance(result, Partial) else "done"
+    if isinstance(result, Partial):
+        result = result.result
+    blob = zlib.compress(json.dumps(result).encode("utf-8")) if result is not None else None
+    with _lock:
+        _db().execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, finished = ? WHERE id = ?",
+            (status, blob, error, time.time(), job_id)
+        )
+
+async def _heartbeat(job_id: str):
+    while True:
+        await asyncio.sleep(JOB_HEARTBEAT_INTERVAL)
+        with _lock:
+            _db().execute("UPDATE jobs SET heartbeat = ? WHERE id = ? AND status = 'running'", (time.time(), job_id))
+
+def _requeue(job_id: str):
+    """Put a job interrupted by shutdown back in the queue, without counting the attempt"""
+    with _lock:
+        _db().execute(
+            "UPDATE jobs SET status = 'queued', attempts = MAX(attempts - 1, 0) WHERE id = ? AND status = 'running'",
+            (job_id,)
+        )
+
+def forget(kind: str, dedupe_key: str = None) -> int:
+    """Drop finished jobs so the next submit for the key runs again"""
+    with _lock:
+        if dedupe_key is None:
+            return _db().execute("DELETE FROM jobs WHERE kind = ? AND status IN ('done', 'partial', 'failed')", (kind,)).rowcount
+        return _db().execute(
+            "DELETE FROM jobs WHERE kind = ? AND dedupe_key = ? AND status IN ('done', 'partial', 'failed')",
+            (kind, dedupe_key)
+        ).rowcount
+
+def purge_expired() -> int:
+    with _lock:
+        return _db().execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'partial', 'failed') AND finished < ?",
+            (time.time() - JOB_RESULT_TTL,)
+        ).rowcount
+
+async def _worker_loop():
+    last_purge = 0
+    while True:
+        try:
+            if time.time() - last_purge > 3600:
+                purge_expired()
+                last_purge = time.time()
+            claimed = _claim()
+        except Exception:
+            log.exception("Job queue error")
+            claimed = None
+        if not claimed:
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+            continue
+
+        job_id, kind, payload = claimed
+        # Everything logged while the job runs carries its id
+        token = logs.request_id.set(f"job-{job_id[:8]}")
+        log.info("Job started", extra={"job_kind": kind})
+        handler = handlers.get(kind)
+        if handler is None:
+            _finish(job_id, error=f"Unknown job kind: {kind}")
+            logs.request_id.reset(token)
+            continue
+
+        async def report(progress: dict, job_id=job_id):
+            set_progress(job_id, progress)
+
+        heartbeat = asyncio.ensure_future(_heartbeat(job_id))
+        try:
+            result = await handler(json.loads(payload), report)
+            _finish(job_id, result=result)
+            log.info("Job done", extra={"job_kind": kind})
+        except asyncio.CancelledError:
+            # Shutting down: another worker picks the job up straight away
+            _requeue(job_id)
+            log.info("Job requeued on shutdown", extra={"job_kind": kind})
+            raise
+        except Exception as e:
+            _finish(job_id, error=str(e)[:500])
+            log.warning("Job failed", extra={"job_kind": kind, "error": str(e)[:200]})
+        finally:
+            heartbeat.cancel()
+            logs.request_id.reset(token)
+
+def start_workers():
+    for _ in range(JOB_WORKERS):
+        _worker_tasks.append(asyncio.create_task(_worker_loop()))
+
+async def stop_workers():
+    for task in _worker_tasks:
+        task.cancel()
+    await asyncio.gather(*_worker_tasks, return_exceptions=True)
+    _worker_tasks.clear()
+
+def queue_stats() -> dict:
+    with _lock:
+        rows = _db().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+    return {"max_running": JOB_MAX_RUNNING, "max_background": JOB_MAX_BACKGROUND, "workers_per_process": JOB_WORKERS, **dict(rows)}
@@ -0,0 +1,370 @@
+"""Pull JSON out of LLM completions
+
+Completions arrive wrapped in prose or code fences, with trailing commas, smart
+or single quotes, Python literals, raw newlines inside strings, and sometimes cut
+off mid-object when the model runs out of tokens. extract_json() parses the clean
+case directly and otherwise repairs the text in one pass: a truncated response is
+cut back to its last complete element and closed, and array items that do not
+match the schema are dropped, so 9 good flashcards are kept rather than the whole
+response being thrown away.
+
+    python json_extract.py [corpus.json]   # recovery rate and timing against a corpus of bad outputs
+"""
+import json
+from collections import Counter
+
+SMART_DOUBLE = "“”„‟"
+SMART_SINGLE = "‘’‚‛"
+LITERALS = {"True": "true", "False": "false", "None": "null", "true": "true", "false": "false", "null": "null"}
+# Outcome of every extraction in this process: clean, repaired, salvaged (truncated or items dropped), failed
+stats = Counter()
+
+class JSONExtractionError(ValueError):
+    pass
+
+class SchemaError(ValueError):
+    pass
+
+def _fenced_blocks(text: str):
+    """Contents of ``` fences, the last one running to the end if the completion was cut off"""
+    parts = text.split("```")
+    blocks = []
+    for i in range(1, len(parts), 2):
+        block = parts[i]
+        # Drop the language tag on the fence line
+        first, _, rest = block.partition("\n")
+        if first.strip().isalpha():
+            block = rest
+        blocks.append(block)
+    return blocks
+
+def _starts(text: str, roots: str, limit: int = 3):
+    positions = []
+    i = 0
+    while len(positions) < limit:
+        found = [p for p in (text.find(c, i) for c in roots) if p != -1]
+        if not found:
+            break
+        positions.append(min(found))
+        i = positions[-1] + 1
+    return positions
+
+def _strip_trailing_comma(out: list):
+    while out and out[-1].isspace():
+        out.pop()
+    if out and out[-1] == ",":
+        out.pop()
+
+def repair(text: str, start: int = 0):
+    """Rewrite the value starting at text[start] as valid JSON
+
+    Returns (json_text, truncated). Everything after the value's closing bracket is
+    ignored. If the text ends first, it is cut back to the last complete element
+    and the open brackets are closed.
+    """
+    out = []
+    stack = []
+    # (len(out), open brackets) at the last point where everything emitted was complete
+    safe = None
+    quote = None
+    i, n = start, len(text)
+    while i < n:
+        c = text[i]
+        if quote:
+            if c == "\\" and i + 1 < n:
+                nxt = text[i + 1]
+                if nxt == "'":
+                    out.append("'")
+                elif nxt in '"\\/bfnrtu':
+                    out.append(c + nxt)
+                else:
+                    out.append("\\\\" + nxt)
+                i += 2
+                continue
+            if c in quote:
+                out.append('"')
+                quote = None
+            elif c == '"':
+                out.append('\\"')
+            elif c == "\n":
+                out.append("\\n")
+            elif c == "\r":
+                out.append("\\r")
+            elif c == "\t":
+                out.append("\\t")
+            elif c >= " ":
+                out.append(c)
+            i += 1
+            continue
+
+        if c == '"':
+            quote = '"'
+            out.append('"')
+        elif c in SMART_DOUBLE:
+            quote = SMART_DOUBLE + '"'
+            out.append('"')
+        elif c == "'" or c in SMART_SINGLE:
+            quote = SMART_SINGLE + "'"
+            out.append('"')
+        elif c in "{[":
+            stack.append("}" if c == "{" else "]")
+            out.append(c)
+            safe = (len(out), tuple(stack))
+        elif c in "}]":
+            if not stack:
+                break
+            _strip_trailing_comma(out)
+            # A mismatched closer still closes the innermost open bracket
+            out.append(stack.pop())
+            if not stack:
+                return "".join(out), False
+            safe = (len(out), tuple(stack))
+        elif c == ",":
+            _strip_trailing_comma(out)
+            if out and out[-1] not in "{[":
+                safe = (len(out), tuple(stack))
+                out.append(",")
+        elif text.startswith("//", i):
+            end = text.find("\n", i)
+            i = n if end == -1 else end
+            continue
+        elif text.startswith("/*", i):
+            end = text.find("*/", i)
+            i = n if end == -1 else end + 2
+            continue
+        elif text.startswith("...", i) or c == "…":
+            # Placeholder copied from the example in the prompt
+            i += 3 if c == "." else 1
+            continue
+        elif c.isalpha() or c == "_":
+            j = i
+            while j < n and (text[j].isalnum() or text[j] == "_"):
+                j += 1
+            word = text[i:j]
+            rest = text[j:j + 20].lstrip()
+            if out and out[-1][-1:].isdigit():
+                # Exponent of a number, e.g. 1e6
+                out.append(word)
+            elif word in LITERALS and not rest.startswith(":"):
+                out.append(LITERALS[word])
+            else:
+                # Unquoted key
+                out.append(json.dumps(word))
+            i = j
+            continue
+        else:
+            out.append(c)
+        i += 1
+
+    if safe is None:
+        raise JSONExtractionError("No JSON value found")
+    length, open_brackets = safe
+    return "".join(out[:length]) + "".join(reversed(open_brackets)), True
+
+def conform(value, schema: dict):
+    """Check value against schema, coercing scalars and dropping bad array items
+
+    Returns (value, dropped_items); raises SchemaError when value cannot be used.
+    """
+    kind = schema.get("type")
+    if kind == "object":
+        if not isinstance(value, dict):
+            raise SchemaError(f"expected object, got {type(value).__name__}")
+        missing = [key for key in schema.get("required", []) if key not in value]
+        if missing:
+            raise SchemaError(f"missing {', '.join(missing)}")
+        dropped = 0
+        for key, sub in schema.get("properties", {}).items():
+            if key in value:
+                value[key], count = conform(value[key], sub)
+                dropped += count
+        return value, dropped
+    if kind == "array":
+        if not isinstance(value, list):
+            raise SchemaError(f"expected array, got {type(value).__name__}")
+        items = schema.get("items")
+        kept, dropped = value, 0
+        if items:
+            kept = []
+            for item in value:
+                try:
+                    item, count = conform(item, items)
+                except SchemaError:
+                    dropped += 1
+                    continue
+                kept.append(item)
+                dropped += count
+        if len(kept) < schema.get("minItems", 0):
+            raise SchemaError(f"only {len(kept)} valid items")
+        return kept, dropped
+    if kind == "string":
+        if isinstance(value, str):
+            return value, 0
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return str(value), 0
+        raise SchemaError("expected string")
+    if kind in ("integer", "number"):
+        if isinstance(value, bool):
+            raise SchemaError(f"expected {kind}")
+        if isinstance(value, (int, float)):
+            return (int(value) if kind == "integer" else value), 0
+        if isinstance(value, str):
+            try:
+                return (int(value) if kind == "integer" else float(value)), 0
+            except ValueError:
+                pass
+        raise SchemaError(f"expected {kind}")
+    if kind == "boolean":
+        if isinstance(value, bool):
+            return value, 0
+        if isinstance(value, str) and value.lower() in ("true", "false"):
+            return value.lower() == "true", 0
+        raise SchemaError("expected boolean")
+    return value, 0
+
+def _roots(schema) -> str:
+    if schema and schema.get("type") == "object":
+        return "{"
+    if schema and schema.get("type") == "array":
+        return "["
+    return "{["
+
+def _attempt(text: str, start: int, schema):
+    """(value, outcome) for the value at text[start], or raises"""
+    try:
+        value, _ = json.JSONDecoder().raw_decode(text, start)
+        outcome = "clean"
+    except ValueError:
+        repaired, truncated = repair(text, start)
+        value = json.loads(repaired)
+        outcome = "salvaged" if truncated else "repaired"
+    if schema:
+        value, dropped = conform(value, schema)
+        if dropped and outcome != "salvaged":
+            outcome = "salvaged"
+    return value, outcome
+
+def extract_json(text: str, schema: dict = None):
+    """Parse the JSON value in an LLM completion, repairing it if needed
+
+    Raises JSONExtractionError when nothing usable (and matching schema) is found.
+    """
+    if not text:
+        stats["failed"] += 1
+        raise JSONExtractionError("Empty response")
+    roots = _roots(schema)
+    error = None
+    for region in _fenced_blocks(text) + [text]:
+        for start in _starts(region, roots):
+            try:
+                value, outcome = _attempt(region, start, schema)
+            except ValueError as e:
+                error = e
+                continue
+            stats[outcome] += 1
+            return value
+    stats["failed"] += 1
+    raise JSONExtractionError(str(error) if error else "No JSON value found")
+
+def extraction_stats() -> dict:
+    return dict(stats)
+
+if __name__ == "__main__":
+    import os
+    import random
+    import sys
+    import time
+    import schemas
+
+    def legacy_parse(response: str):
+        """The fence/brace cleanup the endpoints used before this module"""
+        cleaned = response.strip()
+        if '```json' in cleaned:
+            cleaned = cleaned.split('```json')[1].split('```')[0]
+        elif '```' in cleaned:
+            for part in cleaned.split('```'):
+                if '{' in part:
+                    cleaned = part
+                    break
+        start = cleaned.find('{')
+        end = cleaned.rfind('}') + 1
+        if start != -1 and end > start:
+            cleaned = cleaned[start:end]
+        return json.loads(cleaned.strip())
+
+    def damage(text: str, rng: random.Random) -> str:
+        """One random kind of damage seen in real completions"""
+        kind = rng.choice(["truncate", "trailing_comma", "smart_quotes", "fence"])
+        if kind == "truncate":
+            return text[:rng.randint(len(text) // 3, len(text) - 1)]
+        if kind == "trailing_comma":
+            closers = [i for i, c in enumerate(text) if c in "]}"]
+            i = rng.choice(closers)
+            return text[:i] + "," + text[i:]
+        if kind == "smart_quotes":
+            return text.replace('"', "“", 1).replace('": "', '”: “')
+        return f"Sure! Here is the JSON:\n```json\n{text}\n```\nLet me know if you need more."
+
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), "json_corpus.json")
+    with open(path, encoding="utf-8") as f:
+        corpus = json.load(f)
+
+    legacy_ok = new_ok = 0
+    started = time.perf_counter()
+    for case in corpus:
+        schema = getattr(schemas, case["schema"]) if case.get("schema") else None
+        try:
+            legacy_parse(case["text"])
+            legacy_ok += 1
+        except Exception:
+            pass
+        try:
+            value = extract_json(case["text"], schema)
+            new_ok += 1
+            detail = ""
+            if case.get("count"):
+                items = value
+                for key in case["count"].split("."):
+                    items = items[key] if key else items
+                detail = f" ({len(items)} items)"
+            print(f"  ✓ {case['name']}{detail}")
+        except JSONExtractionError as e:
+            print(f"  ✗ {case['name']}: {e}")
+    elapsed = time.perf_counter() - started
+    print(f"\nCorpus: {len(corpus)} cases, legacy parsed {legacy_ok}, extract_json parsed {new_ok}")
+    print(f"Outcomes: {dict(stats)}")
+
+    # Fuzz: damage the corpus cases that parse cleanly and see how many still yield usable data
+    rng = random.Random(0)
+    clean = [case for case in corpus if case.get("clean")]
+    trials = legacy_fuzz = new_fuzz = 0
+    for case in clean:
+        schema = getattr(schemas, case["schema"]) if case.get("schema") else None
+        for _ in range(50):
+            text = damage(case["text"], rng)
+            trials += 1
+            try:
+                legacy_parse(text)
+                legacy_fuzz += 1
+            except Exception:
+                pass
+            try:
+                extract_json(text, schema)
+                new_fuzz += 1
+            except JSONExtractionError:
+                pass
+    if trials:
+        print(f"Fuzz: {trials} damaged completions, legacy recovered {legacy_fuzz}, extract_json recovered {new_fuzz}")
+
+    # Timing on the largest case
+    largest = max(corpus, key=lambda case: len(case["text"]))
+    schema = getattr(schemas, largest["schema"]) if largest.get("schema") else None
+    runs = 200
+    started = time.perf_counter()
+    for _ in range(runs):
+        try:
+            extract_json(largest["text"], schema)
+        except JSONExtractionError:
+            pass
+    per_call = (time.perf_counter() - started) / runs
+    print(f"Timing: {per_call * 1000:.2f} ms per extraction of {len(largest['text'])} chars ({largest['name']}), corpus pass {elapsed * 1000:.1f} ms")
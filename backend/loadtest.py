@@ -0,0 +1,104 @@
+"""Load test for the SVL backend
+
+Start a fake provider that answers like the Groq/OpenAI/Gemini APIs after a delay:
+    python loadtest.py fake-provider --port 9100 --delay 2
+
+Point the backend at it and start it:
+    GROQ_API_KEY=fake GROQ_BASE_URL=http://localhost:9100/openai/v1 uvicorn app:app --port 8000
+    (OPENAI_BASE_URL takes the same value, GEMINI_BASE_URL=http://localhost:9100/gemini/v1)
+
+Hedged mode: run a slow and a fast fake provider and let the backend race them:
+    python loadtest.py fake-provider --port 9100 --delay 20
+    python loadtest.py fake-provider --port 9101 --delay 1
+    AI_HEDGE=1 AI_HEDGE_DELAY=2 GROQ_API_KEY=fake GROQ_BASE_URL=http://localhost:9100/openai/v1 \\
+        OPENAI_API_KEY=fake OPENAI_BASE_URL=http://localhost:9101/openai/v1 uvicorn app:app --port 8000
+
+Fire concurrent requests and compare wall time against the serial cost:
+    python loadtest.py run --url http://localhost:8000/api/code/chat --requests 40 --concurrency 20
+
+Each request's message is numbered so the answer cache cannot serve it; add
+--same-message to measure cache hits instead.
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+import httpx
+
+def make_fake_provider(delay: float, text: str):
+    from fastapi import FastAPI, Request
+
+    fake = FastAPI(title="SVL fake provider")
+
+    @fake.post("/openai/v1/chat/completions")
+    async def chat_completions(request: Request):
+        await asyncio.sleep(delay)
+        return {"choices": [{"message": {"role": "assistant", "content": text}}]}
+
+    @fake.post("/gemini/v1/models/{model}:generateContent")
+    async def generate_content(model: str, request: Request):
+        await asyncio.sleep(delay)
+        return {"candidates": [{"content": {"parts": [{"text": text}]}}]}
+
+    return fake
+
+async def run_load(url: str, total: int, concurrency: int, payload: dict, same_message: bool = False):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async with httpx.AsyncClient(timeout=300) as client:
+        async def one(index: int):
+            nonlocal errors
+            body = payload
+            if "message" in payload and not same_message:
+                body = {**payload, "message": f"{payload['message']} (request {index} {uuid.uuid4().hex[:8]})"}
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    response = await client.post(url, json=body)
+                    if response.status_code >= 400:
+                        errors += 1
+                except Exception:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        wall_start = time.perf_counter()
+        await asyncio.gather(*(one(index) for index in range(total)))
+        wall = time.perf_counter() - wall_start
+
+    latencies.sort()
+    serial = sum(latencies)
+    p50 = latencies[len(latencies) // 2]
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"requests={total} concurrency={concurrency} errors={errors}")
+    print(f"wall={wall:.2f}s serial_sum={serial:.2f}s p50={p50:.2f}s p95={p95:.2f}s")
+    # ~1x means requests were serialized on the worker, ~concurrency means they overlapped
+    print(f"effective parallelism={serial / wall:.1f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description="SVL backend load test")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    fake = sub.add_parser("fake-provider", help="serve fake Groq/OpenAI/Gemini responses")
+    fake.add_argument("--port", type=int, default=9100)
+    fake.add_argument("--delay", type=float, default=2.0)
+    fake.add_argument("--text", default="Fake answer from the load test provider.")
+
+    run = sub.add_parser("run", help="fire concurrent requests at the backend")
+    run.add_argument("--url", default="http://localhost:8000/api/code/chat")
+    run.add_argument("--requests", type=int, default=40)
+    run.add_argument("--concurrency", type=int, default=20)
+    run.add_argument("--payload", default='{"language": "Python", "topic": "Loops", "message": "What is a for loop?"}')
+    run.add_argument("--same-message", action="store_true", help="send the payload's message unchanged (answer cache hits)")
+
+    args = parser.parse_args()
+    if args.command == "fake-provider":
+        import uvicorn
+        uvicorn.run(make_fake_provider(args.delay, args.text), host="0.0.0.0", port=args.port)
+    else:
+        asyncio.run(run_load(args.url, args.requests, args.concurrency, json.loads(args.payload), args.same_message))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""JSON logging through a background thread, with request ids
+
+Handlers only put records on a queue, so logging from the event loop never waits
+on stdout. Records carry the id of the request (or job) they were logged under.
+
+    LOG_LEVEL=INFO                          default level
+    LOG_LEVELS=ai_client=DEBUG,jobs=WARNING per-module overrides
+    LOG_FORMAT=json|text                    text is easier to read in a terminal
+    LOG_PAYLOAD_SAMPLE_RATE=0.05            share of debug payload dumps that are kept
+"""
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import time
+import uuid
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "0.05"))
+LOG_PAYLOAD_CHARS = int(os.getenv("LOG_PAYLOAD_CHARS", "500"))
+
+request_id = contextvars.ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has; anything else was passed in extra= and becomes a field
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+_listener = None
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id.get()
+        return True
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Merge args into the message and render the traceback now, keeping extra fields"""
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage()
+        }
+        if record.request_id:
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        fields = ' '.join(f"{key}={value}" for key, value in vars(record).items() if key not in _RECORD_ATTRS)
+        line = f"{time.strftime('%H:%M:%S', time.localtime(record.created))} {record.levelname[0]} {record.name}: {record.getMessage()}"
+        if record.request_id:
+            line += f" [{record.request_id}]"
+        if fields:
+            line += f" {fields}"
+        if record.exc_text:
+            line += '\n' + record.exc_text
+        return line
+
+def setup():
+    """Route all logging through a queue to one stdout writer thread (idempotent)"""
+    global _listener
+    if _listener is not None:
+        return
+    output = logging.StreamHandler()
+    output.setFormatter(TextFormatter() if LOG_FORMAT == "text" else JsonFormatter())
+    records = queue.SimpleQueue()
+    handler = _QueueHandler(records)
+    # Filters run in the caller's thread, where the request's context is still current
+    handler.addFilter(RequestIdFilter())
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(LOG_LEVEL)
+    for item in LOG_LEVELS.split(","):
+        module, _, level = item.partition("=")
+        if module.strip() and level.strip():
+            logging.getLogger(module.strip()).setLevel(level.strip().upper())
+    _listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+
+def shutdown():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def log_payload(logger: logging.Logger, message: str, payload: str, **fields):
+    """Debug-log a sample of large payloads (raw model output and the like)
+
+    Free when debug is off for the logger: the payload is only cut and attached
+    for the sampled share of calls.
+    """
+    if not logger.isEnabledFor(logging.DEBUG) or random.random() >= LOG_PAYLOAD_SAMPLE_RATE:
+        return
+    logger.debug(message, extra={**fields, "payload": (payload or "")[:LOG_PAYLOAD_CHARS], "payload_chars": len(payload or "")})
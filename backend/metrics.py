@@ -0,0 +1,169 @@
+"""Prometheus metrics shared by all gunicorn workers
+
+Each worker adds to in-memory deltas and flushes them into a shared SQLite table
+every METRICS_FLUSH_INTERVAL seconds, so /metrics shows totals for the whole host
+whichever worker serves the scrape. Histograms are stored as their cumulative
+bucket, sum and count counters, which add up across workers.
+"""
+import asyncio
+import logging
+import os
+import threading
+from collections import defaultdict
+from store import connect
+
+log = logging.getLogger(__name__)
+
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))
+# Seconds, from a cache hit to a full study-material generation
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+_lock = threading.Lock()
+# Flushes from the background loop and from a scrape share one connection
+_flush_lock = threading.Lock()
+_conn = None
+# (sample name, rendered labels) -> amount not yet flushed
+_pending = defaultdict(float)
+# metric name -> (type, help)
+_families = {}
+# Per-worker counters kept elsewhere (name, label names, source, last flushed values)
+_tracked = []
+_flush_task = None
+
+def _db():
+    global _conn
+    if _conn is None:
+        _conn = connect("metrics")
+        _conn.execute("""CREATE TABLE IF NOT EXISTS samples (
+            name TEXT NOT NULL,
+            labels TEXT NOT NULL,
+            value REAL NOT NULL,
+            PRIMARY KEY (name, labels)
+        )""")
+    return _conn
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(labels: dict) -> str:
+    return ','.join(f'{key}="{_escape(value)}"' for key, value in sorted(labels.items()))
+
+def counter(name: str, help: str):
+    _families[name] = ("counter", help)
+
+def histogram(name: str, help: str):
+    _families[name] = ("histogram", help)
+
+# The metric name is positional-only so a label may be called name too
+def inc(name: str, amount: float = 1, /, **labels):
+    with _lock:
+        _pending[(name, _labels(labels))] += amount
+
+def observe(name: str, value: float, /, buckets=LATENCY_BUCKETS, **labels):
+    with _lock:
+        # Every bucket is written, even with 0, so a series has all of its buckets from the start
+        for bound in buckets:
+            _pending[(f"{name}_bucket", _labels({**labels, "le": bound}))] += value <= bound
+        _pending[(f"{name}_bucket", _labels({**labels, "le": "+Inf"}))] += 1
+        _pending[(f"{name}_sum", _labels(labels))] += value
+        _pending[(f"{name}_count", _labels(labels))] += 1
+
+def track(name: str, label_names: tuple, source, help: str):
+    """Export a counter this worker already keeps elsewhere
+
+    source() returns {tuple of label values: running total}; the increase since
+    the previous flush is added to the shared total.
+    """
+    counter(name, help)
+    _tracked.append((name, label_names, source, {}))
+
+def _collect_tracked():
+    # One broken source must not stop the others (or the pending samples) from being flushed
+    for name, label_names, source, last in _tracked:
+        try:
+            for values, total in source().items():
+                delta = total - last.get(values, 0)
+                if delta > 0:
+                    inc(name, delta, **dict(zip(label_names, values)))
+                last[values] = total
+        except Exception as e:
+            log.warning("Metrics source failed", extra={"metric": name, "error": str(e)[:200]})
+
+def flush():
+    with _flush_lock:
+        _collect_tracked()
+        with _lock:
+            if not _pending:
+                return
+            rows = [(name, labels, value) for (name, labels), value in _pending.items()]
+            _pending.clear()
+        conn = _db()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT INTO samples (name, labels, value) VALUES (?, ?, ?) "
+                "ON CONFLICT(name, labels) DO UPDATE SET value = value + excluded.value",
+                rows
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+def _family(name: str) -> str:
+    for suffix in ("_bucket", "_sum", "_count"):
+        if name.endswith(suffix) and _families.get(name[:-len(suffix)], ("",))[0] == "histogram":
+            return name[:-len(suffix)]
+    return name
+
+def _order(row):
+    """Group samples by family and label set, with histogram buckets in increasing le"""
+    name, labels, _ = row
+    family = _family(name)
+    le = float("inf")
+    if name.endswith("_bucket"):
+        parts = labels.split(',')
+        le = next((float(part[4:-1]) for part in parts if part.startswith('le="')), le)
+        labels = ','.join(part for part in parts if not part.startswith('le="'))
+    return family, labels, name != f"{family}_bucket", le, name
+
+def render() -> str:
+    """Prometheus text exposition of every worker's flushed metrics"""
+    flush()
+    with _flush_lock:
+        rows = _db().execute("SELECT name, labels, value FROM samples").fetchall()
+    rows.sort(key=_order)
+    lines = []
+    current = None
+    for name, labels, value in rows:
+        family = _family(name)
+        if family != current:
+            current = family
+            kind, help = _families.get(family, ("untyped", ""))
+            if help:
+                lines.append(f"# HELP {family} {help}")
+            lines.append(f"# TYPE {family} {kind}")
+        sample = f"{name}{{{labels}}}" if labels else name
+        lines.append(f"{sample} {value!r}")
+    return '\n'.join(lines) + '\n'
+
+async def _flush_loop():
+    while True:
+        await asyncio.sleep(METRICS_FLUSH_INTERVAL)
+        try:
+            await asyncio.to_thread(flush)
+        except Exception as e:
+            log.warning("Metrics flush failed", extra={"error": str(e)[:200]})
+
+def start():
+    global _flush_task
+    if _flush_task is None:
+        _flush_task = asyncio.create_task(_flush_loop())
+
+async def stop():
+    global _flush_task
+    if _flush_task is not None:
+        _flush_task.cancel()
+        await asyncio.gather(_flush_task, return_exceptions=True)
+        _flush_task = None
+    flush()
@@ -0,0 +1,104 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+import metrics
+
+log = logging.getLogger(__name__)
+
+_NO_DEFAULT = object()
+
+metrics.histogram("svl_stage_duration_seconds", "Seconds from the start of a pipeline run until the stage finished")
+metrics.counter("svl_stage_outcomes_total", "Pipeline stage results by outcome (ok, timeout, error)")
+
+# "<pipeline>.<stage>" -> runs, total and max seconds, timeouts and errors across all runs in this worker
+stage_stats = defaultdict(lambda: {"runs": 0, "seconds": 0.0, "max_seconds": 0.0, "timeouts": 0, "errors": 0})
+
+class StageError(Exception):
+    def __init__(self, stage: str, cause: Exception):
+        super().__init__(f"{stage} stage failed: {cause!r}")
+        self.stage = stage
+        self.cause = cause
+
+class Pipeline:
+    """Stages that start together and wait only on the results they need
+
+    A stage is an async function taking a `need` callable; `await need("name")`
+    returns another stage's result, so dependencies are whatever each stage awaits
+    and independent stages overlap. Each stage has its own timeout. A stage with a
+    default returns it on timeout or error instead of failing the whole run.
+    timings holds each stage's seconds from the start of the run until it finished.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.stages = {}
+        self.tasks = {}
+        self.timings = {}
+
+    def stage(self, name: str, func, timeout: float = None, default=_NO_DEFAULT):
+        self.stages[name] = (func, timeout, default)
+        return self
+
+    def _start(self, name: str):
+        if name not in self.tasks:
+            self.tasks[name] = asyncio.ensure_future(self._run_stage(name))
+        return self.tasks[name]
+
+    def need(self, name: str):
+        # Shielded so a stage timing out does not cancel a stage it was waiting on
+        return asyncio.shield(self._start(name))
+
+    async def _run_stage(self, name: str):
+        func, timeout, default = self.stages[name]
+        stats = stage_stats[f"{self.name}.{name}"]
+        started = time.perf_counter()
+        outcome = "ok"
+        try:
+            return await asyncio.wait_for(func(self.need), timeout)
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        except Exception as e:
+            if isinstance(e, asyncio.TimeoutError):
+                outcome = "timeout"
+                stats["timeouts"] += 1
+                log.warning("Stage timed out", extra={"pipeline": self.name, "stage": name, "timeout": timeout})
+            else:
+                outcome = "error"
+                stats["errors"] += 1
+                log.warning("Stage failed", extra={"pipeline": self.name, "stage": name, "error": str(e)[:200]})
+            if default is _NO_DEFAULT:
+                raise StageError(name, e) from e
+            return default
+        finally:
+            elapsed = time.perf_counter() - started
+            self.timings[name] = round(elapsed, 3)
+            stats["runs"] += 1
+            stats["seconds"] += elapsed
+            stats["max_seconds"] = max(stats["max_seconds"], elapsed)
+            metrics.observe("svl_stage_duration_seconds", elapsed, pipeline=self.name, stage=name)
+            metrics.inc("svl_stage_outcomes_total", pipeline=self.name, stage=name, outcome=outcome)
+
+    async def run(self, *outputs: str) -> dict:
+        """Start every stage and return the results of outputs (all stages by default)"""
+        for name in self.stages:
+            self._start(name)
+        outputs = outputs or tuple(self.stages)
+        try:
+            results = await asyncio.gather(*(self.tasks[name] for name in outputs))
+        finally:
+            for task in self.tasks.values():
+                task.cancel()
+        return dict(zip(outputs, results))
+
+def server_timing(timings: dict) -> str:
+    """Server-Timing header value for stage timings in seconds"""
+    return ', '.join(f"{name};dur={seconds * 1000:.0f}" for name, seconds in timings.items())
+
+def pipeline_stats() -> dict:
+    return {
+        name: {**counts, "seconds": round(counts["seconds"], 3), "max_seconds": round(counts["max_seconds"], 3),
+               "avg_seconds": round(counts["seconds"] / counts["runs"], 3) if counts["runs"] else None}
+        for name, counts in stage_stats.items()
+    }
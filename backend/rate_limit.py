@@ -0,0 +1,124 @@
+import asyncio
+import math
+import os
+import threading
+import time
+from store import connect
+
+# POST requests per client per window (seconds), matched by longest path prefix
+CLIENT_LIMITS = {
+    "/api/process-video": (int(os.getenv("RATE_LIMIT_PROCESS_VIDEO", "10")), 60),
+    "/api/jobs": (int(os.getenv("RATE_LIMIT_JOBS", "10")), 60),
+    "/api": (int(os.getenv("RATE_LIMIT_DEFAULT", "60")), 60),
+}
+# "More flashcards/questions" for one video, per client
+MORE_ITEMS_LIMIT = (1, 10)
+# Reverse proxies in front of the app that append to X-Forwarded-For (Render has one); the
+# client is the address the outermost of them added. 0 ignores the header (no proxy).
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "1"))
+# Longest window any bucket uses; older rows are garbage collected
+MAX_WINDOW = 3600
+
+_lock = threading.Lock()
+_conn = None
+_calls = 0
+
+def _db():
+    global _conn
+    if _conn is None:
+        _conn = connect("rate_limits")
+        _conn.execute("""CREATE TABLE IF NOT EXISTS events (
+            bucket TEXT NOT NULL,
+            ts REAL NOT NULL,
+            amount INTEGER NOT NULL
+        )""")
+        _conn.execute("CREATE INDEX IF NOT EXISTS events_bucket_ts ON events(bucket, ts)")
+    return _conn
+
+def reserve(bucket: str, amount: int, limit: int, window: float, now: float = None) -> float:
+    """Sliding-window reservation shared by all workers
+
+    Records amount at now and returns 0 when it fits in the last window, otherwise
+    returns how many seconds until enough of the window has expired.
+    """
+    global _calls
+    now = now or time.time()
+    with _lock:
+        conn = _db()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            _calls += 1
+            if _calls % 500 == 0:
+                conn.execute("DELETE FROM events WHERE ts < ?", (now - MAX_WINDOW,))
+            conn.execute("DELETE FROM events WHERE bucket = ? AND ts < ?", (bucket, now - window))
+            rows = conn.execute("SELECT ts, amount FROM events WHERE bucket = ? ORDER BY ts", (bucket,)).fetchall()
+            used = sum(row[1] for row in rows)
+            # An oversized request is allowed through on its own rather than blocked forever
+            if used + amount <= limit or used == 0:
+                conn.execute("INSERT INTO events (bucket, ts, amount) VALUES (?, ?, ?)", (bucket, now, amount))
+                conn.execute("COMMIT")
+                return 0
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    needed = used + amount - limit
+    freed = 0
+    for ts, size in rows:
+        freed += size
+        if freed >= needed:
+            return max(0.001, ts + window - now)
+    return window
+
+def hit(bucket: str, limit: int, window: float) -> float:
+    return reserve(bucket, 1, limit, window)
+
+async def acquire(bucket: str, amount: int, limit: int, window: float, max_wait: float) -> float:
+    """Wait up to max_wait for room in the window
+
+    Returns the time the reservation was recorded at (for settle), or 0 to shed the request.
+    """
+    deadline = time.time() + max_wait
+    while True:
+        now = time.time()
+        wait = reserve(bucket, amount, limit, window, now)
+        if wait == 0:
+            return now
+        if now + wait > deadline:
+            return 0
+        await asyncio.sleep(wait)
+
+def settle(bucket: str, reserved_at: float, reserved: int, used: int):
+    """Correct a reservation made at reserved_at to the amount actually used
+
+    The correction is recorded at the reservation's time, so both leave the window together.
+    """
+    if used == reserved:
+        return
+    with _lock:
+        _db().execute("INSERT INTO events (bucket, ts, amount) VALUES (?, ?, ?)", (bucket, reserved_at, used - reserved))
+
+def client_id(request) -> str:
+    """The caller's address as seen by the trusted proxies
+
+    Entries left of the ones they appended come from the client and can be
+    anything, so they are never used.
+    """
+    forwarded = request.headers.get("x-forwarded-for")
+    if forwarded and TRUSTED_PROXY_HOPS:
+        hops = [hop.strip() for hop in forwarded.split(",") if hop.strip()]
+        if len(hops) >= TRUSTED_PROXY_HOPS:
+            return hops[-TRUSTED_PROXY_HOPS]
+    return request.client.host if request.client else "unknown"
+
+def client_limit(method: str, path: str):
+    if method != "POST":
+        return None
+    for prefix in sorted(CLIENT_LIMITS, key=len, reverse=True):
+        if path.startswith(prefix):
+            return prefix, CLIENT_LIMITS[prefix]
+    return None
+
+def retry_after(wait: float) -> int:
+    return max(1, math.ceil(wait))
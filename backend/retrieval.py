@@ -0,0 +1,130 @@
+import heapq
+import math
+import os
+import re
+from collections import Counter, OrderedDict, defaultdict
+from typing import Dict, List
+from token_budget import count_tokens
+from transcripts import load_segments
+
+# Transcript segments are grouped into passages of about this many tokens, each
+# sharing its first segment with the end of the previous one
+PASSAGE_TOKENS = int(os.getenv("RETRIEVAL_PASSAGE_TOKENS", "120"))
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "4"))
+# Videos whose index is kept in memory per worker (rebuilding one from stored segments takes milliseconds)
+INDEX_CACHE_SIZE = 64
+BM25_K1 = 1.5
+BM25_B = 0.75
+# Passages scoring below this fraction of the best match are left out rather than padding the prompt
+MIN_RELATIVE_SCORE = 0.3
+
+STOPWORDS = frozenset("""a about an and are as at be been but by can do does did for from had has have how i if in into
+is it its just know like me my no not of on or our so some that the their them then there these they this to um uh
+us was we were what when where which who why will with would you your okay yeah gonna say says said
+explain tell mean means""".split())
+
+def _stem(word: str) -> str:
+    """Strip common English suffixes so "forces" matches "force" and "spinning" matches "spin" """
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 5 and word.endswith("ing"):
+        word = word[:-3]
+        return word[:-1] if len(word) > 3 and word[-1] == word[-2] else word
+    if len(word) > 4 and word.endswith("ed"):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+def tokenize(text: str, stopwords: frozenset = STOPWORDS) -> List[str]:
+    # Single letters are mostly left over from possessives ("lenz's")
+    return [_stem(word) for word in re.findall(r"[a-z0-9]+", text.lower())
+            if word not in stopwords and (len(word) > 1 or word.isdigit())]
+
+def build_passages(segments: List[Dict], max_tokens: int = PASSAGE_TOKENS) -> List[Dict]:
+    passages = []
+    texts, start, tokens = [], None, 0
+    for segment in segments:
+        if start is None:
+            start = segment["start"]
+        texts.append(segment["text"])
+        tokens += count_tokens(segment["text"])
+        if tokens >= max_tokens:
+            passages.append({"start": start, "text": ' '.join(texts)})
+            # Overlap by one segment so a sentence split across the boundary is found from either side
+            texts, start, tokens = [segment["text"]], segment["start"], count_tokens(segment["text"])
+    if texts and (not passages or len(texts) > 1):
+        passages.append({"start": start, "text": ' '.join(texts)})
+    return passages
+
+class BM25Index:
+    def __init__(self, passages: List[Dict]):
+        self.passages = passages
+        self.postings = defaultdict(list)
+        self.lengths = []
+        for index, passage in enumerate(passages):
+            terms = Counter(tokenize(passage["text"]))
+            self.lengths.append(sum(terms.values()))
+            for term, frequency in terms.items():
+                self.postings[term].append((index, frequency))
+        self.average_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0
+        total = len(passages)
+        self.idf = {term: math.log(1 + (total - len(p) + 0.5) / (len(p) + 0.5)) for term, p in self.postings.items()}
+
+    def search(self, query: str, k: int = RETRIEVAL_TOP_K) -> List[Dict]:
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            for index, frequency in self.postings.get(term, ()):
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[index] / self.average_length)
+                scores[index] += self.idf[term] * frequency * (BM25_K1 + 1) / (frequency + norm)
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [dict(self.passages[index], score=round(score, 3)) for index, score in best]
+
+_indexes = OrderedDict()
+
+async def get_index(video_id: str) -> BM25Index:
+    index = _indexes.get(video_id)
+    if index is not None:
+        _indexes.move_to_end(video_id)
+        return index
+    index = BM25Index(build_passages(await load_segments(video_id)))
+    # Only cache indexes that have content, so a transcript fetched later is picked up
+    if index.passages:
+        _indexes[video_id] = index
+        while len(_indexes) > INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+    return index
+
+def forget_index(video_id: str = None):
+    """Drop one video's index, or every index when video_id is None"""
+    if video_id is None:
+        _indexes.clear()
+    else:
+        _indexes.pop(video_id, None)
+
+async def retrieve(video_id: str, query: str, max_tokens: int, k: int = RETRIEVAL_TOP_K) -> List[Dict]:
+    """Best-matching passages for query that fit in max_tokens, in video order"""
+    index = await get_index(video_id)
+    selected, used = [], 0
+    matches = index.search(query, k)
+    for passage in matches:
+        if passage["score"] < matches[0]["score"] * MIN_RELATIVE_SCORE:
+            break
+        tokens = count_tokens(passage["text"])
+        if used + tokens > max_tokens:
+            continue
+        selected.append(passage)
+        used += tokens
+    return sorted(selected, key=lambda passage: passage["start"])
+
+def format_timestamp(seconds: float) -> str:
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+def format_passages(passages: List[Dict]) -> str:
+    return '\n\n'.join(f"[{format_timestamp(passage['start'])}] {passage['text']}" for passage in passages)
+
+def passage_sources(passages: List[Dict]) -> List[Dict]:
+    return [{"start": passage["start"], "timestamp": format_timestamp(passage["start"])} for passage in passages]
@@ -0,0 +1,223 @@
+# Expected shape of each JSON response, as a small JSON Schema subset
+# (type, properties, required, items, minItems). json_extract validates against
+# these and drops array items that do not conform instead of failing the whole response.
+
+STRING = {"type": "string"}
+STRING_LIST = {"type": "array", "items": STRING}
+
+FLASHCARD = {
+    "type": "object",
+    "properties": {
+        "term": STRING,
+        "definition": STRING,
+        "difficulty": STRING
+    },
+    "required": ["term", "definition"]
+}
+
+# "correct" is an option index for multiple_choice and a boolean for true_false
+QUIZ_QUESTION = {
+    "type": "object",
+    "properties": {
+        "id": {"type": "integer"},
+        "question": STRING,
+        "type": STRING,
+        "options": STRING_LIST,
+        "correct": {},
+        "explanation": STRING,
+        "difficulty": STRING
+    },
+    "required": ["question", "correct"]
+}
+
+FLASHCARDS = {
+    "type": "object",
+    "properties": {"flashcards": {"type": "array", "items": FLASHCARD, "minItems": 1}},
+    "required": ["flashcards"]
+}
+
+QUIZ_QUESTIONS = {
+    "type": "object",
+    "properties": {"quiz_questions": {"type": "array", "items": QUIZ_QUESTION, "minItems": 1}},
+    "required": ["quiz_questions"]
+}
+
+# One schema per study-material section, each wrapped in {"<section>": ...} like the prompts ask
+STUDY_SECTIONS = {
+    name: {"type": "object", "properties": {name: schema}, "required": [name]}
+    for name, schema in {
+        "video_summary": STRING,
+        "detailed_explanation": STRING,
+        "key_points": STRING_LIST,
+        "flashcards": {"type": "array", "items": FLASHCARD},
+        "quiz_questions": {"type": "array", "items": QUIZ_QUESTION}
+    }.items()
+}
+
+MINDMAP = {
+    "type": "object",
+    "properties": {
+        "central_topic": STRING,
+        "main_branches": {
+            "type": "array",
+            "minItems": 1,
+            "items": {
+                "type": "object",
+                "properties": {
+                    "id": STRING,
+                    "label": STRING,
+                    "color": STRING,
+                    "sub_nodes": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {"id": STRING, "label": STRING, "description": STRING},
+                            "required": ["label"]
+                        }
+                    }
+                },
+                "required": ["label"]
+            }
+        }
+    },
+    "required": ["main_branches"]
+}
+
+INFOGRAPHIC = {
+    "type": "object",
+    "properties": {
+        "title": STRING,
+        "key_statistics": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"label": STRING, "value": STRING, "description": STRING, "icon": STRING},
+                "required": ["label", "value"]
+            }
+        },
+        "process_flow": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"step": {"type": "integer"}, "title": STRING, "description": STRING, "icon": STRING},
+                "required": ["title"]
+            }
+        },
+        "key_facts": STRING_LIST,
+        "timeline": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"year": STRING, "event": STRING},
+                "required": ["event"]
+            }
+        },
+        "applications": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"area": STRING, "usage": STRING, "impact": STRING, "icon": STRING},
+                "required": ["area"]
+            }
+        }
+    },
+    "required": ["title"]
+}
+
+# Learning roadmap topics: a bare list of strings (older prompts ask for a Python list)
+ROADMAP_TOPICS = {"type": "array", "items": STRING, "minItems": 1}
+
+CODE_TREE = {
+    "type": "object",
+    "properties": {
+        "topics": {
+            "type": "array",
+            "minItems": 1,
+            "items": {
+                "type": "object",
+                "properties": {
+                    "id": STRING,
+                    "title": STRING,
+                    "level": STRING,
+                    "row": {"type": "integer"},
+                    "col": {"type": "integer"}
+                },
+                "required": ["id", "title"]
+            }
+        },
+        "connections": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"from": STRING, "to": STRING},
+                "required": ["from", "to"]
+            }
+        }
+    },
+    "required": ["topics"]
+}
+
+CUSTOM_ROADMAP = {
+    "type": "object",
+    "properties": {
+        "topics": {
+            "type": "array",
+            "minItems": 1,
+            "items": {
+                "type": "object",
+                "properties": {
+                    "id": STRING,
+                    "name": STRING,
+                    "levels": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "id": STRING,
+                                "title": STRING,
+                                "videos": STRING_LIST,
+                                "practice": STRING_LIST,
+                                "learning": STRING_LIST
+                            },
+                            "required": ["title"]
+                        }
+                    }
+                },
+                "required": ["name", "levels"]
+            }
+        }
+    },
+    "required": ["topics"]
+}
+
+EXPLANATIONS = {
+    "type": "object",
+    "properties": {
+        "explanations": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"term": STRING, "explanation": STRING},
+                "required": ["term", "explanation"]
+            },
+            "minItems": 1
+        }
+    },
+    "required": ["explanations"]
+}
+
+PRACTICE_RESOURCES = {
+    "type": "object",
+    "properties": {
+        "practice": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"name": STRING, "url": STRING, "type": STRING, "description": STRING},
+                "required": ["name", "url"]
+            }
+        },
+        "description": STRING
+    },
+    "required": ["practice"]
+}
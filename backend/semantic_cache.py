@@ -0,0 +1,173 @@
+import json
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from store import connect
+from retrieval import tokenize, STOPWORDS
+
+# Words that change what is being asked ("why" vs "what", "not") must match exactly;
+# other filler is ignored
+INTENT_WORDS = frozenset({"not", "no", "why", "how", "when", "where", "who", "which"})
+QUESTION_STOPWORDS = (STOPWORDS - INTENT_WORDS) | frozenset(
+    "whats simply simple please pls plz briefly brief quick quickly again short shortly thanks between vs versus".split()
+)
+# Most recent answers compared against per lookup in one scope
+MAX_CANDIDATES = 500
+# Shorter words must match exactly; longer ones may differ by a typo
+TYPO_MIN_LENGTH = 5
+
+def normalize_question(question: str) -> str:
+    """Stemmed content words of a question, in order
+
+    Order is kept because it carries meaning: "convert celsius to fahrenheit" is
+    not "convert fahrenheit to celsius".
+    """
+    return ' '.join(tokenize(question, QUESTION_STOPWORDS))
+
+def _edit_distance(a: str, b: str, limit: int) -> int:
+    """Levenshtein distance, or limit + 1 as soon as it is known to exceed limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+def word_similarity(a: str, b: str) -> float:
+    """1 for the same (stemmed) word, a little less for a typo of it, 0 for a different word
+
+    A typo keeps the first letter and is at most one edit (two in long words)
+    away, so "increase" and "decrease" stay different words.
+    """
+    if a == b:
+        return 1.0
+    if min(len(a), len(b)) < TYPO_MIN_LENGTH or a[0] != b[0]:
+        return 0.0
+    limit = 1 if max(len(a), len(b)) < 9 else 2
+    distance = _edit_distance(a, b, limit)
+    return 1 - distance / max(len(a), len(b)) if distance <= limit else 0.0
+
+def similarity(a: str, b: str) -> float:
+    """Average word similarity of two normalized questions, 0 unless every word lines up
+
+    Questions match only when they have the same content words in the same
+    order, up to word forms (stemmed away) and typos.
+    """
+    if a == b:
+        return 1.0
+    words_a, words_b = a.split(), b.split()
+    if len(words_a) != len(words_b):
+        return 0.0
+    total = 0.0
+    for word_a, word_b in zip(words_a, words_b):
+        score = word_similarity(word_a, word_b)
+        if not score:
+            return 0.0
+        total += score
+    return total / len(words_a)
+
+class AnswerCache:
+    """Answers to tutor questions, matched by similar wording within a scope
+
+    A scope is whatever the prompt depends on besides the question (a video, a
+    language and topic). Entries are shared by all workers and evicted LRU.
+    """
+
+    def __init__(self, name: str, threshold: float, max_entries: int, ttl: float):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.conn = connect(name)
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS answers (
+            scope TEXT NOT NULL,
+            question TEXT NOT NULL,
+            answer TEXT NOT NULL,
+            created REAL NOT NULL,
+            accessed REAL NOT NULL,
+            PRIMARY KEY (scope, question)
+        )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS answers_accessed ON answers(accessed)")
+        # Per kind of endpoint: hits, misses, stores
+        self.counts = defaultdict(Counter)
+        self.evictions = 0
+
+    def lookup(self, kind: str, scope: str, question: str):
+        """Stored answer payload for the closest question at or above the threshold"""
+        normalized = normalize_question(question)
+        if not normalized:
+            return None
+        now = time.time()
+        best = None
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT question, answer FROM answers WHERE scope = ? AND created > ? ORDER BY accessed DESC LIMIT ?",
+                (scope, now - self.ttl, MAX_CANDIDATES)
+            ).fetchall()
+            for stored, answer in rows:
+                score = similarity(normalized, stored)
+                if score >= self.threshold and (best is None or score > best[0]):
+                    best = (score, stored, answer)
+            if best:
+                self.conn.execute("UPDATE answers SET accessed = ? WHERE scope = ? AND question = ?", (now, scope, best[1]))
+        if best is None:
+            self.counts[kind]["misses"] += 1
+            return None
+        self.counts[kind]["hits"] += 1
+        return json.loads(best[2])
+
+    def store(self, kind: str, scope: str, question: str, payload: dict):
+        normalized = normalize_question(question)
+        if not normalized:
+            return
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO answers (scope, question, answer, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (scope, normalized, json.dumps(payload), now, now)
+            )
+            self._evict(now)
+        self.counts[kind]["stores"] += 1
+
+    def _evict(self, now: float):
+        removed = self.conn.execute("DELETE FROM answers WHERE created < ?", (now - self.ttl,)).rowcount
+        count = self.conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        if count > self.max_entries:
+            removed += self.conn.execute(
+                "DELETE FROM answers WHERE rowid IN (SELECT rowid FROM answers ORDER BY accessed LIMIT ?)",
+                (count - self.max_entries,)
+            ).rowcount
+        self.evictions += removed
+
+    def delete_scope(self, scope: str) -> int:
+        with self.lock:
+            return self.conn.execute("DELETE FROM answers WHERE scope = ?", (scope,)).rowcount
+
+    def delete_scope_prefix(self, prefix: str) -> int:
+        escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        with self.lock:
+            return self.conn.execute("DELETE FROM answers WHERE scope LIKE ? ESCAPE '\\'", (escaped + "%",)).rowcount
+
+    def stats(self) -> dict:
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        kinds = {}
+        for kind, counts in self.counts.items():
+            lookups = counts["hits"] + counts["misses"]
+            kinds[kind] = {**counts, "hit_rate": round(counts["hits"] / lookups, 3) if lookups else None}
+        return {"entries": entries, "threshold": self.threshold, "evictions": self.evictions, **kinds}
+
+def create_answer_cache() -> AnswerCache:
+    # v2: questions are stored in word order (the first version sorted their words)
+    return AnswerCache(
+        "answer_cache_v2",
+        threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.85")),
+        max_entries=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "20000")),
+        ttl=float(os.getenv("ANSWER_CACHE_TTL", 7 * 24 * 3600))
+    )
@@ -0,0 +1,110 @@
+import asyncio
+import os
+import threading
+import time
+from collections import defaultdict
+from store import connect
+
+# The leading worker renews its cross-worker lease every third of this while it computes, so
+# this only bounds how long others wait on a worker that died holding one
+LEASE_TTL = float(os.getenv("SINGLE_FLIGHT_LEASE_TTL", "60"))
+LEASE_POLL_INTERVAL = 0.5
+
+_inflight = {}
+_lock = threading.Lock()
+_conn = None
+
+# Per name: leaders that ran the computation, callers that joined one in this
+# worker, and callers that picked up another worker's result
+stats = defaultdict(lambda: {"leaders": 0, "coalesced": 0, "coalesced_shared": 0})
+
+def _db():
+    global _conn
+    if _conn is None:
+        _conn = connect("single_flight")
+        _conn.execute("""CREATE TABLE IF NOT EXISTS leases (
+            name TEXT NOT NULL,
+            key TEXT NOT NULL,
+            owner INTEGER NOT NULL,
+            expires REAL NOT NULL,
+            PRIMARY KEY (name, key)
+        )""")
+    return _conn
+
+def _acquire_lease(name: str, key: str) -> bool:
+    now = time.time()
+    with _lock:
+        conn = _db()
+        conn.execute("DELETE FROM leases WHERE name = ? AND key = ? AND expires < ?", (name, key, now))
+        return conn.execute(
+            "INSERT OR IGNORE INTO leases (name, key, owner, expires) VALUES (?, ?, ?, ?)",
+            (name, key, os.getpid(), now + LEASE_TTL)
+        ).rowcount == 1
+
+def _lease_held(name: str, key: str) -> bool:
+    with _lock:
+        row = _db().execute("SELECT expires FROM leases WHERE name = ? AND key = ?", (name, key)).fetchone()
+    return row is not None and row[0] >= time.time()
+
+def _renew_lease(name: str, key: str):
+    with _lock:
+        _db().execute(
+            "UPDATE leases SET expires = ? WHERE name = ? AND key = ? AND owner = ?",
+            (time.time() + LEASE_TTL, name, key, os.getpid())
+        )
+
+async def _heartbeat(name: str, key: str):
+    while True:
+        await asyncio.sleep(LEASE_TTL / 3)
+        _renew_lease(name, key)
+
+def _release_lease(name: str, key: str):
+    with _lock:
+        _db().execute("DELETE FROM leases WHERE name = ? AND key = ? AND owner = ?", (name, key, os.getpid()))
+
+async def _lead(name: str, key: str, func, lookup):
+    if lookup is None:
+        stats[name]["leaders"] += 1
+        return await func()
+
+    # Another worker is already computing this key: wait for its result to land in the shared cache
+    while not _acquire_lease(name, key):
+        while _lease_held(name, key):
+            await asyncio.sleep(LEASE_POLL_INTERVAL)
+            result = lookup()
+            if result is not None:
+                stats[name]["coalesced_shared"] += 1
+                return result
+    heartbeat = asyncio.ensure_future(_heartbeat(name, key))
+    try:
+        # The previous leader may have finished between our check and acquiring the lease
+        result = lookup()
+        if result is not None:
+            stats[name]["coalesced_shared"] += 1
+            return result
+        stats[name]["leaders"] += 1
+        return await func()
+    finally:
+        heartbeat.cancel()
+        _release_lease(name, key)
+
+async def single_flight(name: str, key: str, func, lookup=None):
+    """Run func() once for concurrent callers with the same (name, key)
+
+    Callers in the same worker share one task. When lookup is given, callers in
+    other workers wait on a shared lease and return lookup()'s result (usually a
+    cache read) once the leading worker has stored it.
+    """
+    flight = (name, key)
+    task = _inflight.get(flight)
+    if task is not None:
+        stats[name]["coalesced"] += 1
+    else:
+        task = asyncio.ensure_future(_lead(name, key, func, lookup))
+        _inflight[flight] = task
+        task.add_done_callback(lambda _: _inflight.pop(flight, None))
+    # Shielded so one caller disconnecting does not cancel the shared computation
+    return await asyncio.shield(task)
+
+def single_flight_stats() -> dict:
+    return {name: {**counts, "in_flight": sum(1 for flight in _inflight if flight[0] == name)} for name, counts in stats.items()}
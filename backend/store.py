@@ -0,0 +1,124 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+# Shared by all gunicorn workers on the same host
+DATA_DIR = os.getenv("SVL_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+
+def db_path(name: str) -> str:
+    os.makedirs(DATA_DIR, exist_ok=True)
+    return os.path.join(DATA_DIR, f"{name}.sqlite3")
+
+def connect(name: str) -> sqlite3.Connection:
+    """Open a SQLite file in WAL mode so several worker processes can share it"""
+    conn = sqlite3.connect(db_path(name), timeout=10, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=10000")
+    return conn
+
+class SqliteCache:
+    """Key/value cache in a shared SQLite file with TTL, LRU eviction and a byte budget"""
+
+    def __init__(self, name: str, ttl: float = None, max_bytes: int = 100 * 1024 * 1024, compress: bool = True):
+        self.name = name
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.lock = threading.Lock()
+        self.conn = connect(name)
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS entries (
+            key TEXT PRIMARY KEY,
+            value BLOB NOT NULL,
+            size INTEGER NOT NULL,
+            created REAL NOT NULL,
+            accessed REAL NOT NULL,
+            expires REAL
+        )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed)")
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str):
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute("SELECT value, expires FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            value, expires = row
+            if expires is not None and expires < now:
+                self.conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return zlib.decompress(value) if self.compress else value
+
+    def set(self, key: str, value: bytes, ttl: float = None):
+        now = time.time()
+        ttl = ttl if ttl is not None else self.ttl
+        expires = now + ttl if ttl else None
+        blob = zlib.compress(value) if self.compress else value
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, created, accessed, expires) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, blob, len(blob), now, now, expires)
+            )
+            self._evict(now)
+
+    def get_json(self, key: str):
+        value = self.get(key)
+        return json.loads(value) if value is not None else None
+
+    def set_json(self, key: str, value, ttl: float = None):
+        self.set(key, json.dumps(value).encode("utf-8"), ttl)
+
+    def delete(self, key: str) -> int:
+        with self.lock:
+            return self.conn.execute("DELETE FROM entries WHERE key = ?", (key,)).rowcount
+
+    def delete_prefix(self, prefix: str) -> int:
+        escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        with self.lock:
+            return self.conn.execute("DELETE FROM entries WHERE key LIKE ? ESCAPE '\\'", (escaped + "%",)).rowcount
+
+    def keys(self) -> list:
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT key FROM entries WHERE expires IS NULL OR expires >= ? ORDER BY key", (time.time(),)
+            ).fetchall()
+        return [key for key, in rows]
+
+    def clear(self) -> int:
+        with self.lock:
+            return self.conn.execute("DELETE FROM entries").rowcount
+
+    def _evict(self, now: float):
+        """Drop expired entries, then least recently used ones until under the byte budget"""
+        self.conn.execute("DELETE FROM entries WHERE expires IS NOT NULL AND expires < ?", (now,))
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self.conn.execute("SELECT key, size FROM entries ORDER BY accessed").fetchall():
+            if total <= self.max_bytes:
+                break
+            self.conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        with self.lock:
+            count, size = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {
+            "entries": count,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
@@ -0,0 +1,335 @@
+import asyncio
+import logging
+from typing import Dict
+from ai_client import call_ai_with_fallback
+from json_extract import extract_json
+from schemas import STUDY_SECTIONS
+from token_budget import CONTEXT_TOKENS, max_output_tokens
+from transcripts import fit_transcript
+from logs import log_payload
+
+log = logging.getLogger(__name__)
+
+# Study materials are generated as independent sections so one bad completion
+# only costs that section, and each one can be shown as soon as it is ready.
+SECTIONS = ["video_summary", "detailed_explanation", "key_points", "flashcards", "quiz_questions"]
+SECTION_ATTEMPTS = 2
+
+# JSON shape and writing instructions for each section ({topic} is filled in per video)
+SECTION_SPECS = {
+    "video_summary": '''  "video_summary": "Write 300-400 words. Structure: 
+    - Opening (2 sentences): Hook + What is {topic}
+    - Core Explanation (3-4 sentences): Main concepts, principles, mechanisms
+    - Significance (2-3 sentences): Why it matters, real-world impact
+    - Key Applications (2-3 sentences): Where it's used, practical examples
+    - Conclusion (1-2 sentences): Takeaway message
+    Make it engaging, informative, and comprehensive like NotebookLM."''',
+    "detailed_explanation": '''  "detailed_explanation": "Write 2500-3000 words in 8-10 detailed sections. Use ONLY plain text without any markdown formatting. No asterisks, no hashtags, no special symbols. Write section titles followed by colons, then paragraphs of plain text:
+    
+    ## Introduction (200 words)
+    - What is {topic}? Define clearly
+    - Historical context and discovery
+    - Why it's important to understand
+    
+    ## Fundamental Concepts (300 words)
+    - Core principles and theories
+    - Key terminologies and definitions
+    - Foundational formulas/equations with explanations
+    - Visual descriptions (if applicable)
+    
+    ## Detailed Mechanism (400 words)
+    - Step-by-step process breakdown  
+    - How it works in detail
+    - Underlying physics/chemistry/biology
+    - Cause and effect relationships
+    
+    ## Mathematical Framework (300 words - if applicable)
+    - All relevant equations
+    - Variable explanations
+    - Derivations and proofs
+    - Example calculations
+    
+    ## Real-World Examples (400 words)
+    - Example 1: Detailed scenario with numbers/data
+    - Example 2: Different domain/application
+    - Example 3: Modern technology use case
+    
+    ## Practical Applications (300 words)
+    - Industrial applications
+    - Technology implementations  
+    - Day-to-day occurrences
+    - Future potential
+    
+    ## Common Misconceptions (200 words)
+    - What people often get wrong
+    - Why these misconceptions exist
+    - Correct understanding
+    
+    ## Advanced Insights (300 words)
+    - Deeper understanding
+    - Recent research/developments
+    - Connections to other concepts
+    - Expert-level knowledge
+    
+    ## Problem-Solving Approaches (300 words)
+    - How to solve problems involving {topic}
+    - Step-by-step methodologies
+    - Tips and tricks
+    
+    ## Conclusion and Key Takeaways (200 words)
+    - Summary of most important points
+    - What you absolutely must remember
+    - Next steps for learning
+    
+    Use clear headings (##), bullet points, numbered lists, and **bold** for emphasis."''',
+    "key_points": '''  "key_points": [
+    "🎯 **Core Concept:** Provide comprehensive definition of {topic} with fundamental principle, formula/equation if applicable, and why it's foundational. Include 2-3 specific examples demonstrating the concept. (100-120 words)",
+    
+    "⚙️ **How It Works:** Detailed step-by-step mechanism breakdown with technical precision. Explain each phase/stage with what happens, why it happens, and the result. Include cause-effect relationships and process flow. (100-120 words)",
+    
+    "🌍 **Real-World Example 1:** Specific, detailed real-life scenario with actual numbers, measurements, or data. Explain the context, what's happening, and why {topic} is relevant here. Make it relatable and memorable. (100-120 words)",
+    
+    "🌍 **Real-World Example 2:** Another detailed example from a completely different domain/field. Include specific details, context, and explanation of how {topic} applies. Use different scale/perspective than example 1. (100-120 words)",
+    
+    "💡 **Practical Applications:** Describe 3-4 major technology/industry applications with specifics. Include modern innovations, commercial products, or systems that rely on {topic}. Explain how it's implemented. (100-120 words)",
+    
+    "📐 **Mathematical/Technical Details:** If applicable, explain the key formula/equation/principle with all variables defined, typical values, and what each term represents. Include example calculation or technical specifications. (100-120 words)",
+    
+    "⚠️ **Common Misconceptions:** Explain 2-3 things people commonly misunderstand about {topic}. For each: what the misconception is, why people believe it, what the truth is, and why the distinction matters. (100-120 words)",
+    
+    "🔬 **Advanced Insight:** Share deeper understanding that goes beyond basics. Include recent research, cutting-edge developments, expert-level knowledge, or connections to other advanced concepts. What do professionals/researchers know that beginners don't? (100-120 words)"
+  ]''',
+    "flashcards": '''  "flashcards": [
+    {{"term": "What is {topic}?", "definition": "Comprehensive yet concise definition covering the essence, key principle, and primary significance. Include context. (50-60 words)", "difficulty": "beginner"}},
+    {{"term": "Key Principle of {topic}", "definition": "Main governing principle or law with explanation of how it works and why it's important. (50-60 words)", "difficulty": "beginner"}},
+    {{"term": "How does {topic} work?", "definition": "Step-by-step mechanism explanation covering the process from start to finish with key stages identified. (50-60 words)", "difficulty": "intermediate"}},
+    {{"term": "Primary Formula/Equation", "definition": "Main mathematical relationship with all variables defined and physical meaning explained. (50-60 words)", "difficulty": "intermediate"}},
+    {{"term": "Real-World Application 1", "definition": "Specific technology or natural occurrence where {topic} is demonstrated with context and explanation. (50-60 words)", "difficulty": "intermediate"}},
+    {{"term": "Real-World Application 2", "definition": "Another distinct example from different domain showing practical use with details. (50-60 words)", "difficulty": "intermediate"}},
+    {{"term": "Common Misconception", "definition": "What people often get wrong about {topic}, why the misconception exists, and what the correct understanding is. (50-60 words)", "difficulty": "intermediate"}},
+    {{"term": "Advanced Concept", "definition": "Deeper insight or advanced aspect of {topic} that requires understanding of basics. Expert-level knowledge. (50-60 words)", "difficulty": "advanced"}},
+    {{"term": "Related Concept 1", "definition": "How {topic} connects to or differs from related concept with specific distinctions explained. (50-60 words)", "difficulty": "advanced"}},
+    {{"term": "Historical Context", "definition": "Discovery, development, or evolution of understanding {topic} with key contributors or breakthroughs mentioned. (50-60 words)", "difficulty": "beginner"}},
+    {{"term": "Problem-Solving Strategy", "definition": "Approach to solving problems involving {topic} with step-by-step methodology or key considerations. (50-60 words)", "difficulty": "advanced"}},
+    {{"term": "Future/Modern Development", "definition": "Recent research, new applications, or cutting-edge developments related to {topic} with implications explained. (50-60 words)", "difficulty": "advanced"}}
+  ]''',
+    "quiz_questions": '''  "quiz_questions": [
+    {{"id": 1, "question": "Conceptual Understanding: {topic} question testing fundamental grasp", "type": "multiple_choice", "options": ["Correct comprehensive answer", "Plausible but incomplete", "Common misconception", "Clearly wrong"], "correct": 0, "explanation": "Detailed explanation why correct answer is right and others are wrong (40-50 words)", "difficulty": "easy"}},
+    
+    {{"id": 2, "question": "True or False: Statement testing common misconception about {topic}", "type": "true_false", "correct": false, "explanation": "Why this is true/false with context and clarification (40-50 words)", "difficulty": "easy"}},
+    
+    {{"id": 3, "question": "Application Scenario: Real-world situation requiring understanding of how {topic} works", "type": "multiple_choice", "options": ["Correct application", "Misapplication 1", "Misapplication 2", "Wrong context"], "correct": 0, "explanation": "Why this approach works and others don't (40-50 words)", "difficulty": "medium"}},
+    
+    {{"id": 4, "question": "Formula/Calculation: Problem requiring use of key equation with given values", "type": "multiple_choice", "options": ["Correct answer with units", "Wrong formula used", "Calculation error", "Unit error"], "correct": 0, "explanation": "Step-by-step solution showing correct approach (40-50 words)", "difficulty": "medium"}},
+    
+    {{"id": 5, "question": "Compare/Contrast: How does {topic} differ from related concept?", "type": "multiple_choice", "options": ["Accurate distinction", "Partial similarity", "Confused with other concept", "Opposite relationship"], "correct": 0, "explanation": "Clear explanation of actual relationship and differences (40-50 words)", "difficulty": "medium"}},
+    
+    {{"id": 6, "question": "True or False: Advanced statement testing deep understanding of {topic}", "type": "true_false", "correct": true, "explanation": "Detailed reasoning and context for this truth (40-50 words)", "difficulty": "hard"}},
+    
+    {{"id": 7, "question": "Multi-Step Analysis: Complex scenario requiring multiple aspects of {topic} knowledge", "type": "multiple_choice", "options": ["Complete correct analysis", "Missed key factor", "Wrong principle applied", "Incomplete reasoning"], "correct": 0, "explanation": "Comprehensive breakdown of what makes this correct (40-50 words)", "difficulty": "hard"}},
+    
+    {{"id": 8, "question": "Advanced Application: Cutting-edge or expert-level question about {topic}", "type": "multiple_choice", "options": ["Sophisticated correct answer", "Oversimplified approach", "Beginner understanding", "Misconception-based"], "correct": 0, "explanation": "Expert-level explanation with advanced insights (40-50 words)", "difficulty": "hard"}},
+    
+    {{"id": 9, "question": "Problem-Solving: Given situation, what's the best approach using {topic}?", "type": "multiple_choice", "options": ["Optimal strategy", "Suboptimal but workable", "Inefficient approach", "Wrong method"], "correct": 0, "explanation": "Why this strategy is best with reasoning (40-50 words)", "difficulty": "hard"}},
+    
+    {{"id": 10, "question": "True or False: Nuanced statement requiring careful consideration of {topic} details", "type": "true_false", "correct": true, "explanation": "Careful analysis of why this is true/false with nuance explained (40-50 words)", "difficulty": "medium"}}
+  ]'''
+}
+
+SECTION_REQUIREMENTS = {
+    "video_summary": "video_summary must be a single string",
+    "detailed_explanation": "detailed_explanation must be a single string",
+    "key_points": "key_points MUST be array of 8 STRINGS (not objects), each starting with emoji",
+    "flashcards": "flashcards: Generate 12 cards with progressive difficulty (beginner → advanced)",
+    "quiz_questions": "quiz_questions: Generate 10 diverse questions mixing easy/medium/hard"
+}
+
+def section_is_valid(name: str, value) -> bool:
+    """Same length and count thresholds the single-shot generation used"""
+    if name == "video_summary":
+        return isinstance(value, str) and len(value) > 200
+    if name == "detailed_explanation":
+        return isinstance(value, str) and len(value) > 1500
+    if name == "key_points":
+        return isinstance(value, list) and len(value) >= 5
+    if name == "flashcards":
+        return isinstance(value, list) and len(value) >= 10
+    if name == "quiz_questions":
+        return isinstance(value, list) and len(value) >= 8
+    return False
+
+def section_prompt(name: str, topic: str, title: str, transcript: str) -> str:
+    if transcript and len(transcript) > 100:
+        context = f"Video: {title}\n\nTranscript:\n{transcript}"
+        instruction = "Based on the video transcript, create comprehensive study materials."
+    else:
+        # No transcript or very short - use AI knowledge about the topic
+        context = f"Video: {title}\nTopic: {topic}"
+        instruction = f"Based on your knowledge of {topic}, create comprehensive educational study materials. Use the video title '{title}' for context. Generate complete, accurate educational content including specific examples, formulas, principles, and applications related to {topic}."
+
+    spec = SECTION_SPECS[name].format(topic=topic)
+    return f"""{instruction}
+
+{context}
+
+Create EXCEPTIONAL, NotebookLM-quality comprehensive study materials about {topic}.
+
+Generate EXACTLY this JSON structure with OUTSTANDING quality:
+
+{{
+{spec}
+}}
+
+CRITICAL REQUIREMENTS:
+1. {SECTION_REQUIREMENTS[name]}
+2. Make ALL content DETAILED, COMPREHENSIVE, and PROFESSIONAL
+3. Use specific examples with real numbers/data
+4. Include formulas, equations, technical specs where applicable
+5. Write at NotebookLM quality level - exceptional depth and clarity
+6. Return ONLY valid JSON, no markdown, no explanations"""
+
+async def generate_section(name: str, topic: str, title: str, transcript: str):
+    """Generate one section, retrying only that section. Returns None if every attempt fails."""
+    # Concurrent sections share one condensation of a long transcript
+    transcript = await fit_transcript(transcript, CONTEXT_TOKENS["study_sections"])
+    prompt = section_prompt(name, topic, title, transcript)
+    for attempt in range(SECTION_ATTEMPTS):
+        response = await call_ai_with_fallback(prompt, STUDY_SECTIONS[name], max_output_tokens(name))
+        if not response:
+            continue
+        try:
+            value = extract_json(response, STUDY_SECTIONS[name])[name]
+        except Exception as e:
+            log.warning("Section unparseable", extra={"section": name, "attempt": attempt + 1, "error": str(e)[:200]})
+            log_payload(log, "Unparseable section response", response, section=name)
+            continue
+        if section_is_valid(name, value):
+            log.info("Section ready", extra={"section": name})
+            return value
+        log.warning("Section too short", extra={"section": name, "attempt": attempt + 1})
+    return None
+
+async def generate_sections(topic: str, title: str, transcript: str, on_section=None):
+    """Generate all sections concurrently
+
+    on_section(name, value, status) is awaited as each section finishes, with status
+    "ready" for generated content or "fallback" when the basic content had to be used.
+    Returns (content, validated) where validated is False if any section fell back.
+    """
+    fallback = basic_fallback_content(topic)
+    content = {}
+
+    async def run(name: str):
+        value = await generate_section(name, topic, title, transcript)
+        status = "ready"
+        if value is None:
+            log.warning("Using basic fallback", extra={"section": name})
+            value = fallback[name]
+            status = "fallback"
+        content[name] = value
+        if on_section:
+            await on_section(name, value, status)
+        return status
+
+    statuses = await asyncio.gather(*(run(name) for name in SECTIONS))
+    return content, all(status == "ready" for status in statuses)
+
+def basic_fallback_content(topic: str) -> Dict:
+    return {
+        "video_summary": f"""{topic} is a fundamental concept in its field of study. Understanding {topic} is essential for grasping more advanced concepts and applications. This topic covers the basic principles, mechanisms, and practical applications that make it relevant in both theoretical and real-world contexts. Students studying {topic} will learn how it works, why it matters, and where it is applied in various domains. The concept has significant implications for problem-solving and critical thinking in related areas.""",
+        
+        "detailed_explanation": f"""Introduction to {topic}
+
+{topic} is an important concept that plays a significant role in its field. Understanding this topic requires grasping both the theoretical foundations and practical applications. This comprehensive guide will explore the key aspects of {topic}, including its fundamental principles, mechanisms, applications, and significance.
+
+Core Concepts
+
+The fundamental principles underlying {topic} are essential for building a strong foundation. These concepts form the basis for more advanced understanding and practical application. Students should focus on understanding the basic definitions, key terminologies, and foundational theories that make up {topic}.
+
+How It Works
+
+The mechanism behind {topic} involves several interconnected processes and principles. Understanding how these elements work together provides insight into both the theoretical and practical aspects of the concept. The step-by-step process demonstrates the cause-and-effect relationships that are central to {topic}.
+
+Real-World Applications
+
+{topic} has numerous practical applications across various domains. From technology and industry to everyday life, this concept plays a crucial role in solving real-world problems. Understanding these applications helps students see the relevance and importance of mastering {topic}.
+
+Mathematical Framework
+
+Where applicable, {topic} involves mathematical relationships and equations that describe its behavior and properties. These mathematical tools allow for precise analysis and prediction, making them essential for advanced study and practical problem-solving.
+
+Examples and Case Studies
+
+Concrete examples help illustrate how {topic} works in practice. By examining specific scenarios and case studies, students can better understand the application of theoretical concepts to real situations. These examples bridge the gap between abstract theory and practical implementation.
+
+Common Misconceptions
+
+Many students encounter common misunderstandings when learning about {topic}. Identifying and addressing these misconceptions is crucial for developing accurate understanding. Recognizing what is often misunderstood helps students avoid common pitfalls in their learning journey.
+
+Advanced Insights
+
+Beyond the basics, {topic} offers deeper insights and connections to other concepts. Advanced understanding involves recognizing subtle relationships, exceptions, and applications that go beyond introductory material. This level of knowledge is essential for expertise in the field.
+
+Problem-Solving Approaches
+
+Applying {topic} to solve problems requires systematic approaches and strategies. Understanding effective problem-solving methodologies helps students tackle challenges confidently. These approaches combine theoretical knowledge with practical skills.
+
+Key Takeaways
+
+Mastering {topic} requires understanding its fundamental principles, mechanisms, applications, and problem-solving approaches. Students should focus on building strong foundations while also exploring advanced concepts and real-world applications. Continued practice and exploration will deepen understanding and expertise.""",
+        
+        "key_points": [
+            f"Core Definition: {topic} represents a fundamental concept in its field. Understanding the basic definition and core principles is essential for building knowledge. This concept forms the foundation for more advanced topics and applications in related areas.",
+            
+            f"Key Principles: The main principles governing {topic} explain how and why it works. These principles are based on established theories and have been validated through research and practical application. Mastering these principles is crucial for deep understanding.",
+            
+            f"Mechanism: {topic} operates through specific processes and mechanisms. Understanding the step-by-step workings helps clarify how inputs are transformed into outputs. This knowledge is essential for both theoretical understanding and practical application.",
+            
+            f"Real-World Example: {topic} can be observed in everyday situations and practical contexts. Recognizing these real-world manifestations helps connect abstract concepts to tangible experiences. This connection enhances understanding and retention.",
+            
+            f"Practical Applications: {topic} has numerous applications across various fields including technology, industry, and research. These applications demonstrate the practical value and relevance of understanding this concept. Knowledge of applications motivates deeper study.",
+            
+            f"Mathematical Framework: Where applicable, {topic} involves mathematical relationships and equations. These mathematical tools provide precise ways to analyze and predict behavior. Understanding the math deepens comprehension of underlying principles.",
+            
+            f"Common Misconceptions: Students often misunderstand certain aspects of {topic}. Recognizing these common errors helps avoid pitfalls in learning. Correct understanding requires addressing and correcting these misconceptions early.",
+            
+            f"Advanced Insights: Beyond basics, {topic} connects to other concepts and has deeper implications. Advanced understanding involves recognizing subtle relationships and applications. This expert-level knowledge distinguishes mastery from basic familiarity."
+        ],
+        
+        "flashcards": [
+            {"term": f"What is {topic}?", "definition": f"{topic} is a fundamental concept that involves specific principles and mechanisms. It plays an important role in its field and has practical applications. Understanding this concept requires grasping both theoretical foundations and real-world implementations.", "difficulty": "beginner"},
+            {"term": f"Core Principles of {topic}", "definition": f"The main principles governing {topic} explain its behavior and characteristics. These principles are based on established theories and have been validated through research. They form the foundation for understanding more complex aspects.", "difficulty": "beginner"},
+            {"term": f"How {topic} Works", "definition": f"{topic} operates through specific mechanisms and processes. Understanding the step-by-step workings clarifies how different components interact. This knowledge is essential for both theoretical comprehension and practical application.", "difficulty": "intermediate"},
+            {"term": f"Applications of {topic}", "definition": f"{topic} has numerous practical applications in technology, industry, and research. These applications demonstrate its real-world value and relevance. Understanding applications helps connect theory to practice.", "difficulty": "intermediate"},
+            {"term": f"Mathematical Framework of {topic}", "definition": f"Where applicable, {topic} involves mathematical relationships and equations that describe its behavior. These mathematical tools allow for precise analysis and prediction. Understanding the math deepens comprehension.", "difficulty": "intermediate"},
+            {"term": f"Real-World Examples of {topic}", "definition": f"{topic} can be observed in everyday situations and practical contexts. Recognizing these manifestations helps connect abstract concepts to tangible experiences. Examples enhance understanding and retention.", "difficulty": "intermediate"},
+            {"term": f"Common Misconceptions about {topic}", "definition": f"Students often misunderstand certain aspects of {topic}. Recognizing these common errors helps avoid learning pitfalls. Correct understanding requires addressing and correcting misconceptions early in the learning process.", "difficulty": "intermediate"},
+            {"term": f"Advanced Concepts in {topic}", "definition": f"Beyond basics, {topic} involves deeper insights and connections to other concepts. Advanced understanding requires recognizing subtle relationships and applications. This expert-level knowledge distinguishes mastery from basic familiarity.", "difficulty": "advanced"},
+            {"term": f"Problem-Solving with {topic}", "definition": f"Applying {topic} to solve problems requires systematic approaches and strategies. Understanding effective methodologies helps tackle challenges confidently. These approaches combine theoretical knowledge with practical skills.", "difficulty": "advanced"},
+            {"term": f"Historical Context of {topic}", "definition": f"The development and evolution of {topic} provides important context for current understanding. Key discoveries and breakthroughs shaped how we understand this concept today. Historical perspective enriches comprehension.", "difficulty": "beginner"},
+            {"term": f"Related Concepts to {topic}", "definition": f"{topic} connects to other important concepts in its field. Understanding these relationships provides broader context and deeper insight. Recognizing connections helps build comprehensive knowledge networks.", "difficulty": "advanced"},
+            {"term": f"Future Developments in {topic}", "definition": f"Recent research and emerging developments continue to advance understanding of {topic}. New applications and technologies build on foundational principles. Staying current with developments is important for expertise.", "difficulty": "advanced"}
+        ],
+        
+        "quiz_questions": [
+            {"id": 1, "question": f"What is the primary focus of {topic}?", "type": "multiple_choice", "options": ["Understanding fundamental principles and applications", "Memorizing random facts", "Avoiding practical use", "Ignoring theoretical foundations"], "correct": 0, "explanation": f"The primary focus of {topic} is understanding its fundamental principles and how they apply in practice. This combination of theory and application is essential for mastery.", "difficulty": "easy"},
+            
+            {"id": 2, "question": f"{topic} has practical real-world applications.", "type": "true_false", "correct": True, "explanation": f"True. {topic} has numerous practical applications across various fields including technology, industry, and research. Understanding these applications is key to seeing its relevance.", "difficulty": "easy"},
+            
+            {"id": 3, "question": f"Which aspect is most important for understanding {topic}?", "type": "multiple_choice", "options": ["Grasping core principles and mechanisms", "Memorizing definitions only", "Skipping examples", "Avoiding practice"], "correct": 0, "explanation": f"Understanding the core principles and mechanisms of {topic} is most important. This foundational knowledge enables deeper learning and practical application.", "difficulty": "medium"},
+            
+            {"id": 4, "question": f"How does understanding {topic} benefit students?", "type": "multiple_choice", "options": ["Enables problem-solving and connects theory to practice", "Has no practical value", "Only useful for tests", "Irrelevant to real world"], "correct": 0, "explanation": f"Understanding {topic} enables effective problem-solving and helps connect theoretical knowledge to practical applications. This makes learning both meaningful and useful.", "difficulty": "medium"},
+            
+            {"id": 5, "question": f"Learning {topic} requires understanding both theory and practice.", "type": "true_false", "correct": True, "explanation": f"True. Mastering {topic} requires understanding theoretical foundations as well as practical applications. Both aspects are essential for comprehensive knowledge.", "difficulty": "medium"},
+            
+            {"id": 6, "question": f"What is a common misconception about {topic}?", "type": "multiple_choice", "options": ["That it has no practical applications", "That it is well-understood", "That it is important", "That it requires study"], "correct": 0, "explanation": f"A common misconception is that {topic} has no practical applications. In reality, it has numerous real-world uses across various fields and industries.", "difficulty": "hard"},
+            
+            {"id": 7, "question": f"Advanced understanding of {topic} involves recognizing connections to other concepts.", "type": "true_false", "correct": True, "explanation": f"True. Advanced mastery of {topic} requires recognizing how it connects to related concepts and broader principles. These connections deepen understanding and enable expert-level knowledge.", "difficulty": "hard"},
+            
+            {"id": 8, "question": f"Which approach best supports learning {topic}?", "type": "multiple_choice", "options": ["Combining theory, examples, and practice problems", "Only reading definitions", "Avoiding difficult concepts", "Skipping fundamentals"], "correct": 0, "explanation": f"The best approach combines theoretical understanding with concrete examples and practice problems. This multi-faceted method builds comprehensive knowledge of {topic}.", "difficulty": "hard"},
+            
+            {"id": 9, "question": f"What makes {topic} relevant to modern applications?", "type": "multiple_choice", "options": ["Its principles apply to current technology and industry", "It is outdated", "It has no modern use", "It is purely theoretical"], "correct": 0, "explanation": f"{topic} remains relevant because its principles apply to modern technology and industry. Understanding it is essential for working with current applications and innovations.", "difficulty": "hard"},
+            
+            {"id": 10, "question": f"Mastering {topic} requires both foundational knowledge and advanced insights.", "type": "true_false", "correct": True, "explanation": f"True. Complete mastery of {topic} requires building strong foundations while also exploring advanced concepts and applications. Both levels of understanding are necessary for expertise.", "difficulty": "medium"}
+        ]
+    }
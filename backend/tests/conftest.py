@@ -0,0 +1,8 @@
+import os
+import sys
+import tempfile
+
+# Shared-state modules open their SQLite files under SVL_DATA_DIR on first use,
+# so point it at a throwaway directory before any of them is imported
+os.environ["SVL_DATA_DIR"] = tempfile.mkdtemp(prefix="svl-tests-")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
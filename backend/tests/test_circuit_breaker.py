@@ -0,0 +1,95 @@
+import asyncio
+import pytest
+import circuit_breaker
+from circuit_breaker import allow_request, breaker_states, record_result, release_probe
+
+def trip(name: str):
+    for _ in range(circuit_breaker.BREAKER_MIN_CALLS):
+        record_result(name, False, 0.1)
+
+def test_failures_open_the_breaker():
+    trip("test:open")
+    assert breaker_states(["test:open"])["test:open"]["state"] == circuit_breaker.OPEN
+    assert allow_request("test:open") is False
+
+def test_one_probe_after_cooldown(monkeypatch):
+    trip("test:probe")
+    monkeypatch.setattr(circuit_breaker, "BREAKER_COOLDOWN", 0)
+    # Peeking does not take the probe
+    assert allow_request("test:probe", claim=False) is True
+    permit = allow_request("test:probe")
+    assert permit and permit is not True
+    assert allow_request("test:probe") is False
+    record_result("test:probe", True, 0.1)
+    assert allow_request("test:probe") is True
+
+def test_failed_probe_reopens(monkeypatch):
+    trip("test:probe-fails")
+    monkeypatch.setattr(circuit_breaker, "BREAKER_COOLDOWN", 0)
+    assert allow_request("test:probe-fails")
+    record_result("test:probe-fails", False, 0.1)
+    assert breaker_states(["test:probe-fails"])["test:probe-fails"]["state"] == circuit_breaker.OPEN
+
+def test_released_probe_can_be_claimed_again(monkeypatch):
+    trip("test:release")
+    monkeypatch.setattr(circuit_breaker, "BREAKER_COOLDOWN", 0)
+    permit = allow_request("test:release")
+    release_probe("test:release", permit)
+    assert allow_request("test:release")
+
+def test_stale_release_keeps_the_newer_probe(monkeypatch):
+    trip("test:stale")
+    monkeypatch.setattr(circuit_breaker, "BREAKER_COOLDOWN", 0)
+    monkeypatch.setattr(circuit_breaker, "BREAKER_PROBE_TIMEOUT", 0)
+    first = allow_request("test:stale")
+    # The first probe timed out and was handed on; releasing it late must not free the second
+    second = allow_request("test:stale")
+    assert second and second != first
+    monkeypatch.setattr(circuit_breaker, "BREAKER_PROBE_TIMEOUT", 120)
+    release_probe("test:stale", first)
+    assert allow_request("test:stale") is False
+
+def test_cancelled_probe_is_released(monkeypatch):
+    pytest.importorskip("httpx")
+    import ai_client
+
+    async def hang(prompt, max_tokens, schema=None):
+        await asyncio.sleep(60)
+
+    provider = {"name": "test:cancel", "key": "x", "attempts": 1, "call": hang,
+                "model": "gpt-4o-mini", "max_output": 1000, "rpm": 0, "tpm": 0}
+    trip("test:cancel")
+    monkeypatch.setattr(circuit_breaker, "BREAKER_COOLDOWN", 0)
+
+    async def lose_hedge():
+        task = asyncio.ensure_future(ai_client._try_provider(provider, "prompt"))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(lose_hedge())
+    assert allow_request("test:cancel")
+
+def test_json_mode_retry_keeps_the_probe(monkeypatch):
+    pytest.importorskip("httpx")
+    import ai_client
+
+    calls = []
+
+    async def picky(prompt, max_tokens, schema=None):
+        calls.append(schema)
+        if schema:
+            raise ValueError("response_format is not supported")
+        return "plain"
+
+    provider = {"name": "test:json", "key": "x", "attempts": 1, "call": picky,
+                "model": "gpt-4o-mini", "max_output": 1000, "rpm": 0, "tpm": 0}
+    trip("test:json")
+    monkeypatch.setattr(circuit_breaker, "BREAKER_COOLDOWN", 0)
+    monkeypatch.setattr(ai_client, "_rejected_json_mode", lambda e: True)
+    monkeypatch.setitem(ai_client.provider_latencies, "test:json", [])
+    result = asyncio.run(ai_client._try_provider(provider, "prompt", schema={"type": "object"}))
+    assert result == "plain"
+    assert calls == [{"type": "object"}, None]
+    assert breaker_states(["test:json"])["test:json"]["state"] == circuit_breaker.CLOSED
@@ -0,0 +1,21 @@
+import pytest
+from context_store import MemoryContextStore, SqliteContextStore
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request):
+    store = MemoryContextStore(1000) if request.param == "memory" else SqliteContextStore(1000)
+    store.clear()
+    return store
+
+def test_oversized_entry_is_kept(store):
+    store.put("small", {"title": "Small", "transcript": "short"})
+    store.put("large", {"title": "Large", "content": "x" * 5000})
+    # The newest entry survives even on its own over the limit; older ones make room
+    assert store.get("large")["title"] == "Large"
+    assert store.get("small") == {}
+
+def test_least_recently_used_is_evicted(store):
+    for video_id in ("first", "second", "third"):
+        store.put(video_id, {"title": video_id, "content": "x" * 400})
+    assert store.get("first") == {}
+    assert store.get("third")["title"] == "third"
@@ -0,0 +1,69 @@
+import item_pool
+
+def card(term: str, definition: str) -> dict:
+    return {"term": term, "definition": definition}
+
+def question(text: str, qtype: str) -> dict:
+    return {"question": text, "type": qtype}
+
+def test_reworded_copy_is_rejected():
+    added = item_pool.add("video-dup", "flashcards", [
+        card("Photosynthesis", "The process plants use to turn light into chemical energy"),
+        card("Photosynthesis process", "The process that plants use to turn light into their chemical energy"),
+        card("Mitochondria", "Organelles that produce most of the cell's supply of ATP"),
+    ])
+    assert added == 2
+    # Same term, different wording, in a later batch
+    assert item_pool.add("video-dup", "flashcards", [card("photosynthesis", "How green plants make sugar")]) == 0
+    assert item_pool.size("video-dup", "flashcards") == 2
+
+def test_items_are_not_served_twice():
+    item_pool.add("video-take", "flashcards", [card(f"Term {word}", f"Definition about {word}") for word in
+                                               ("alpha", "bravo", "charlie", "delta", "echo", "foxtrot")])
+    first = item_pool.take("video-take", "flashcards", "client-a", 4)
+    second = item_pool.take("video-take", "flashcards", "client-a", 4)
+    assert len(first) == 4 and len(second) == 2
+    assert not {item["term"] for item in first} & {item["term"] for item in second}
+    # Another client still gets the whole pool
+    assert len(item_pool.take("video-take", "flashcards", "client-b", 10)) == 6
+
+def test_sample_mixes_question_types():
+    item_pool.add("video-types", "quiz", [
+        question("Which planet is closest to the sun?", "multiple_choice"),
+        question("Which gas do plants absorb from the air?", "multiple_choice"),
+        question("Which metal is liquid at room temperature?", "multiple_choice"),
+        question("Water boils at 100 degrees Celsius at sea level.", "true_false"),
+        question("Explain why the sky looks blue during the day.", "short_answer"),
+    ], "easy")
+    sample = item_pool.take("video-types", "quiz", "client", 3, "easy")
+    assert {item["type"] for item in sample} == {"multiple_choice", "true_false", "short_answer"}
+    only = item_pool.take("video-types", "quiz", "other", 5, "easy", "multiple_choice")
+    assert len(only) == 3 and {item["type"] for item in only} == {"multiple_choice"}
+
+def test_forget_drops_one_video():
+    item_pool.add("video-keep", "flashcards", [card("Kept", "Stays in the pool")])
+    item_pool.add("video-drop", "flashcards", [card("Dropped", "Goes away")])
+    assert item_pool.forget("video-drop") == 1
+    assert item_pool.size("video-drop", "flashcards") == 0
+    assert item_pool.size("video-keep", "flashcards") == 1
+
+def test_full_pool_repeats_oldest_served(monkeypatch):
+    monkeypatch.setattr(item_pool, "POOL_MAX_ITEMS", 3)
+    item_pool.add("video-full", "flashcards", [card(f"Term {word}", f"Definition about {word}") for word in
+                                               ("golf", "hotel", "india")])
+    assert item_pool.full("video-full", "flashcards")
+    first = item_pool.take("video-full", "flashcards", "client", 2)
+    rest = item_pool.take("video-full", "flashcards", "client", 2)
+    assert len(rest) == 1
+    # The two served first come back before the one just served
+    again = item_pool.take_again("video-full", "flashcards", "client", 2)
+    assert {item["term"] for item in again} == {item["term"] for item in first}
+
+def test_old_served_rows_are_purged(monkeypatch):
+    item_pool.add("video-purge", "flashcards", [card("Juliet", "A served card"), card("Kilo", "Another card")])
+    assert item_pool.take("video-purge", "flashcards", "client", 1)
+    monkeypatch.setattr(item_pool, "POOL_SERVED_TTL", -1)
+    monkeypatch.setattr(item_pool, "_calls", 499)
+    # The purge runs on every 500th take, so the card served before is unused again
+    item_pool.take("video-purge", "flashcards", "other", 0)
+    assert item_pool.unused("video-purge", "flashcards", "client") == 2
@@ -0,0 +1,74 @@
+import asyncio
+import time
+import jobs
+
+def run_claimed(result):
+    job_id, _, _ = jobs._claim()
+    jobs._finish(job_id, result=result)
+    return job_id
+
+def test_done_job_is_reused():
+    first = jobs.submit("test-done", {}, "key")
+    assert run_claimed({"ok": True}) == first["job_id"]
+    again = jobs.submit("test-done", {}, "key")
+    assert again["job_id"] == first["job_id"]
+    assert again["status"] == "done"
+
+def test_partial_job_is_run_again():
+    first = jobs.submit("test-partial", {}, "key")
+    run_claimed(jobs.Partial({"fallback": True}))
+    assert jobs.get_job(first["job_id"], with_result=True)["result"] == {"fallback": True}
+    assert jobs.get_job(first["job_id"])["status"] == "partial"
+    again = jobs.submit("test-partial", {}, "key")
+    assert again["job_id"] != first["job_id"]
+    assert again["status"] == "queued"
+    assert run_claimed({}) == again["job_id"]
+
+def test_background_jobs_wait_and_are_capped(monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_MAX_RUNNING", 4)
+    monkeypatch.setattr(jobs, "JOB_MAX_BACKGROUND", 1)
+    monkeypatch.setattr(jobs, "background_kinds", {"test-refill"})
+    refills = [jobs.submit("test-refill", {}, f"refill-{index}")["job_id"] for index in range(3)]
+    user = jobs.submit("test-user", {}, "user")["job_id"]
+    # Queued after the refills, but claimed first
+    assert jobs._claim()[0] == user
+    assert jobs._claim()[0] == refills[0]
+    # One refill is running, so the others wait even with slots free
+    assert jobs._claim() is None
+    jobs._finish(refills[0], result={})
+    assert jobs._claim()[0] == refills[1]
+    for job_id in (user, refills[1]):
+        jobs._finish(job_id, result={})
+    jobs._finish(jobs._claim()[0], result={})
+
+def test_only_jobs_without_heartbeat_are_requeued():
+    job_id = jobs.submit("test-slow", {}, "slow")["job_id"]
+    assert jobs._claim()[0] == job_id
+    long_ago = time.time() - 10 * jobs.JOB_LOST_AFTER
+    # Running for a long time, but its worker is alive
+    with jobs._lock:
+        jobs._db().execute("UPDATE jobs SET started = ? WHERE id = ?", (long_ago, job_id))
+    assert jobs._claim() is None
+    assert jobs.get_job(job_id)["status"] == "running"
+    # The worker stopped heartbeating
+    with jobs._lock:
+        jobs._db().execute("UPDATE jobs SET heartbeat = ? WHERE id = ?", (long_ago, job_id))
+    assert jobs._claim()[0] == job_id
+    assert jobs.get_job(job_id)["attempts"] == 2
+    jobs._finish(job_id, result={})
+
+def test_job_interrupted_by_shutdown_is_requeued(monkeypatch):
+    monkeypatch.setitem(jobs.handlers, "test-interrupted", lambda payload, report: asyncio.sleep(60))
+    job_id = jobs.submit("test-interrupted", {}, "interrupted")["job_id"]
+
+    async def run_and_stop():
+        jobs.start_workers()
+        while jobs.get_job(job_id)["status"] != "running":
+            await asyncio.sleep(0.05)
+        await jobs.stop_workers()
+
+    asyncio.run(run_and_stop())
+    job = jobs.get_job(job_id)
+    assert job["status"] == "queued"
+    assert job["attempts"] == 0
+    assert run_claimed({}) == job_id
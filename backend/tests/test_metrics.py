@@ -0,0 +1,70 @@
+import asyncio
+import pytest
+import metrics
+from singleflight import single_flight, single_flight_stats
+
+def samples(text: str) -> dict:
+    return dict(line.rsplit(' ', 1) for line in text.splitlines() if line and not line.startswith('#'))
+
+def test_counter_and_histogram_render():
+    metrics.counter("test_events_total", "Events")
+    metrics.histogram("test_latency_seconds", "Latency")
+    metrics.inc("test_events_total", 2, kind="a")
+    metrics.observe("test_latency_seconds", 0.3, route="/x")
+    text = metrics.render()
+    assert "# TYPE test_events_total counter" in text
+    assert "# TYPE test_latency_seconds histogram" in text
+    values = samples(text)
+    assert float(values['test_events_total{kind="a"}']) == 2
+    assert float(values['test_latency_seconds_bucket{le="0.25",route="/x"}']) == 0
+    assert float(values['test_latency_seconds_bucket{le="0.5",route="/x"}']) == 1
+    assert float(values['test_latency_seconds_bucket{le="+Inf",route="/x"}']) == 1
+    assert float(values['test_latency_seconds_count{route="/x"}']) == 1
+
+def test_label_called_name():
+    metrics.inc("test_named_total", 1, name="x")
+    metrics.observe("test_named_seconds", 0.1, name="x")
+    assert 'test_named_total{name="x"}' in samples(metrics.render())
+
+def test_tracked_single_flight_renders():
+    metrics.track(
+        "test_single_flight_total", ("flight", "role"),
+        lambda: {(name, role): count for name, counts in single_flight_stats().items()
+                 for role, count in counts.items() if role != "in_flight"},
+        "Single-flight callers"
+    )
+
+    async def compute():
+        await asyncio.sleep(0.01)
+        return 1
+
+    async def callers():
+        return await asyncio.gather(*(single_flight("test-metrics", "key", compute) for _ in range(3)))
+
+    assert asyncio.run(callers()) == [1, 1, 1]
+    values = samples(metrics.render())
+    assert float(values['test_single_flight_total{flight="test-metrics",role="leaders"}']) == 1
+    assert float(values['test_single_flight_total{flight="test-metrics",role="coalesced"}']) == 2
+
+def test_broken_source_does_not_block_flush():
+    def broken():
+        raise RuntimeError("boom")
+
+    metrics.track("test_broken_total", ("x",), broken, "Always fails")
+    metrics.inc("test_after_broken_total", 1)
+    assert 'test_after_broken_total' in samples(metrics.render())
+
+def test_app_metrics_after_single_flight():
+    pytest.importorskip("fastapi")
+    pytest.importorskip("httpx")
+    try:
+        import app as app_module
+    except ImportError as e:
+        pytest.skip(f"app dependencies missing: {e}")
+    from fastapi.testclient import TestClient
+
+    with TestClient(app_module.app) as client:
+        asyncio.run(single_flight("test-app", "key", lambda: asyncio.sleep(0, result=1)))
+        response = client.get("/metrics")
+    assert response.status_code == 200
+    assert 'svl_single_flight_total{flight="test-app",role="leaders"}' in response.text
@@ -0,0 +1,40 @@
+import pytest
+
+# semantic_cache reuses retrieval's tokenizer, which pulls in the transcript and AI client modules
+pytest.importorskip("youtube_transcript_api")
+pytest.importorskip("httpx")
+
+from semantic_cache import AnswerCache, normalize_question, similarity
+
+THRESHOLD = 0.85
+
+def score(a: str, b: str) -> float:
+    return similarity(normalize_question(a), normalize_question(b))
+
+@pytest.mark.parametrize("a, b", [
+    ("convert celsius to fahrenheit", "convert fahrenheit to celsius"),
+    ("why does ice float on water", "why does water float on ice"),
+    ("is every square a rectangle", "is every rectangle a square"),
+    ("what happens to the current when resistance increases", "what happens to the current when resistance decreases"),
+    ("what is a for loop", "what is a while loop"),
+    ("why is the sky blue", "how is the sky blue"),
+    ("is light a wave", "is light not a wave"),
+])
+def test_different_questions_do_not_match(a, b):
+    assert score(a, b) < THRESHOLD
+
+@pytest.mark.parametrize("a, b", [
+    ("What is photosynthesis?", "what is photosynthesis"),
+    ("Can you explain photosynthesis please", "explain photosynthesis"),
+    ("what is photosynthesis", "what is photosynthsis"),
+    ("how do the forces act on a bridge", "how does the force act on bridges"),
+])
+def test_rewordings_match(a, b):
+    assert score(a, b) >= THRESHOLD
+
+def test_lookup_does_not_serve_reversed_question():
+    cache = AnswerCache("test_answer_cache", threshold=THRESHOLD, max_entries=100, ttl=3600)
+    cache.store("chat", "video:x", "convert celsius to fahrenheit", {"response": "multiply by 9/5, add 32"})
+    assert cache.lookup("chat", "video:x", "Convert Celsius to Fahrenheit?") == {"response": "multiply by 9/5, add 32"}
+    assert cache.lookup("chat", "video:x", "convert fahrenheit to celsius") is None
+    assert cache.lookup("chat", "video:y", "convert celsius to fahrenheit") is None
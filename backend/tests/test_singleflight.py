@@ -0,0 +1,84 @@
+import asyncio
+import os
+import time
+import singleflight
+from singleflight import single_flight
+
+def test_concurrent_callers_share_one_call():
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "value"
+
+    async def callers():
+        return await asyncio.gather(*(single_flight("test-local", "key", compute) for _ in range(5)))
+
+    assert asyncio.run(callers()) == ["value"] * 5
+    assert len(calls) == 1
+    assert singleflight.stats["test-local"]["coalesced"] == 4
+
+def hold_lease_elsewhere(name: str, key: str):
+    # A lease owned by another worker process
+    singleflight._db().execute(
+        "INSERT INTO leases (name, key, owner, expires) VALUES (?, ?, ?, ?)",
+        (name, key, os.getpid() + 1, time.time() + 60)
+    )
+
+def test_waits_for_other_workers_result(monkeypatch):
+    monkeypatch.setattr(singleflight, "LEASE_POLL_INTERVAL", 0.01)
+    hold_lease_elsewhere("test-shared", "key")
+    shared = {}
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        return "mine"
+
+    async def other_worker_finishes():
+        await asyncio.sleep(0.1)
+        shared["key"] = "theirs"
+
+    async def run():
+        asyncio.ensure_future(other_worker_finishes())
+        return await single_flight("test-shared", "key", compute, lambda: shared.get("key"))
+
+    assert asyncio.run(run()) == "theirs"
+    assert not calls
+    assert singleflight.stats["test-shared"]["coalesced_shared"] == 1
+
+def test_takes_over_when_lease_ends_without_result(monkeypatch):
+    monkeypatch.setattr(singleflight, "LEASE_POLL_INTERVAL", 0.01)
+    hold_lease_elsewhere("test-handoff", "key")
+
+    async def other_worker_gives_up():
+        await asyncio.sleep(0.1)
+        singleflight._db().execute("DELETE FROM leases WHERE name = 'test-handoff'")
+
+    async def compute():
+        return "mine"
+
+    async def run():
+        asyncio.ensure_future(other_worker_gives_up())
+        return await single_flight("test-handoff", "key", compute, lambda: None)
+
+    assert asyncio.run(run()) == "mine"
+    assert singleflight.stats["test-handoff"]["leaders"] == 1
+    # The lease is released once the result is in
+    assert not singleflight._lease_held("test-handoff", "key")
+
+def test_lease_is_renewed_while_computing(monkeypatch):
+    monkeypatch.setattr(singleflight, "LEASE_TTL", 0.1)
+    held = []
+
+    async def slow():
+        # Well past the TTL, another worker still cannot take the lease
+        await asyncio.sleep(0.35)
+        held.append(singleflight._lease_held("test-renew", "key"))
+        held.append(singleflight._acquire_lease("test-renew", "key"))
+        return "done"
+
+    assert asyncio.run(single_flight("test-renew", "key", slow, lambda: None)) == "done"
+    assert held == [True, False]
+    assert not singleflight._lease_held("test-renew", "key")
@@ -0,0 +1,34 @@
+import token_budget
+from token_budget import count_tokens, load_encodings
+
+class FakeEncoding:
+    def encode(self, text, disallowed_special=()):
+        return text.split()
+
+class FakeTiktoken:
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.loaded = []
+
+    def get_encoding(self, name):
+        self.loaded.append(name)
+        if self.fail:
+            raise OSError("no network")
+        return FakeEncoding()
+
+def test_counts_are_estimated_until_encodings_load(monkeypatch):
+    fake = FakeTiktoken()
+    monkeypatch.setattr(token_budget, "tiktoken", fake)
+    monkeypatch.setattr(token_budget, "_encodings", {})
+    # Nothing is downloaded on a request's path
+    assert count_tokens("one two three four five six seven eight") == 10
+    assert not fake.loaded
+    load_encodings()
+    assert count_tokens("one two three four five six seven eight") == 8
+    assert count_tokens("one two three four", "gemini-1.5-flash") == 5
+
+def test_failed_load_falls_back_to_estimate(monkeypatch):
+    monkeypatch.setattr(token_budget, "tiktoken", FakeTiktoken(fail=True))
+    monkeypatch.setattr(token_budget, "_encodings", {})
+    load_encodings()
+    assert count_tokens("one two three four five six seven eight") == 10
@@ -0,0 +1,99 @@
+import logging
+import os
+
+log = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+except ImportError:  # optional: fall back to a characters-per-token estimate
+    tiktoken = None
+
+# Rough English average, used when tiktoken is missing or the model has no public tokenizer (Gemini)
+CHARS_PER_TOKEN = 4
+
+# Expected completion size per kind of call, instead of 16000 tokens for everything.
+# Study sections use their section name; "more" endpoints and explain_batch are per generated item.
+MAX_OUTPUT_TOKENS = {
+    "topic": 30,
+    "summary": 600,
+    "chat": 900,
+    "explain": 1500,
+    "explain_batch": 1200,
+    "video_summary": 1000,
+    "detailed_explanation": 6000,
+    "key_points": 2500,
+    "flashcards": 3000,
+    "quiz_questions": 3500,
+    "more_flashcards": 120,
+    "more_quiz": 220,
+    "mindmap": 3000,
+    "infographic": 2500,
+    "roadmap_topics": 400,
+    "code_tree": 2000,
+    "custom_roadmap": 5000,
+    "practice_resources": 800,
+    "condense": 4000
+}
+
+# Transcript tokens each kind of prompt may include; longer transcripts are condensed to fit
+CONTEXT_TOKENS = {
+    "topic": 500,
+    "study_sections": int(os.getenv("STUDY_CONTEXT_TOKENS", "2500")),
+    "summary": 1500,
+    "more_flashcards": 800,
+    "more_quiz": 1000,
+    "mindmap": 1000,
+    "infographic": 1000,
+    "chat": 500,
+    "explain": 750,
+    "explain_batch": 1500
+}
+
+ENCODINGS = ("cl100k_base", "o200k_base")
+_encodings = {}
+
+def load_encodings():
+    """Load the tokenizers once, at startup and in a thread
+
+    tiktoken downloads an encoding's BPE file the first time it is used, which
+    must not happen on the event loop. Until this has run, and for an encoding
+    that failed to load, counts fall back to the estimate.
+    """
+    if tiktoken is None:
+        return
+    for name in ENCODINGS:
+        try:
+            _encodings[name] = tiktoken.get_encoding(name)
+        except Exception as e:
+            log.warning("tiktoken encoding unavailable, estimating tokens", extra={"encoding": name, "error": str(e)[:200]})
+
+def _encoding(model: str = None):
+    if model and model.startswith("gemini"):
+        return None
+    return _encodings.get("o200k_base" if model and model.startswith("gpt-4o") else "cl100k_base")
+
+def count_tokens(text: str, model: str = None) -> int:
+    """Tokens in text for the given model (Llama models are counted with cl100k)"""
+    if not text:
+        return 0
+    encoding = _encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def max_output_tokens(kind: str, count: int = 1) -> int:
+    return MAX_OUTPUT_TOKENS[kind] * count
+
+def chunk_text(text: str, max_tokens: int) -> list:
+    """Split text on word boundaries into pieces of at most about max_tokens"""
+    words = text.split()
+    if not words:
+        return []
+    tokens_per_word = count_tokens(text) / len(words)
+    step = max(1, int(max_tokens / tokens_per_word))
+    return [' '.join(words[i:i + step]) for i in range(0, len(words), step)]
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    if count_tokens(text) <= max_tokens:
+        return text
+    return chunk_text(text, max_tokens)[0]
@@ -0,0 +1,173 @@
+import asyncio
+import hashlib
+import logging
+import os
+from typing import Dict, List
+from youtube_transcript_api import (
+    YouTubeTranscriptApi,
+    TranscriptsDisabled,
+    NoTranscriptFound,
+    NoTranscriptAvailable,
+    VideoUnavailable,
+)
+from store import SqliteCache
+from ai_client import call_ai_with_fallback
+from singleflight import single_flight
+from token_budget import CONTEXT_TOKENS, count_tokens, chunk_text, truncate_to_tokens, max_output_tokens
+
+log = logging.getLogger(__name__)
+
+# Preferred caption languages, best first; any other language is still used as a last resort
+TRANSCRIPT_LANGUAGES = [lang.strip() for lang in os.getenv("TRANSCRIPT_LANGUAGES", "en").split(",") if lang.strip()]
+# Videos without captions are remembered for this long before YouTube is asked again
+TRANSCRIPT_NEGATIVE_TTL = float(os.getenv("TRANSCRIPT_NEGATIVE_TTL", 24 * 3600))
+
+# "<video_id>:<language>" -> segments, "<video_id>" -> which language was chosen (or that none exists)
+transcript_store = SqliteCache(
+    "transcripts",
+    ttl=float(os.getenv("TRANSCRIPT_TTL", 30 * 24 * 3600)),
+    max_bytes=int(os.getenv("TRANSCRIPT_STORE_MAX_MB", "500")) * 1024 * 1024
+)
+
+# Transcripts longer than a prompt's budget are condensed rather than cut off: each chunk
+# is condensed on its own (map), then the joined result again if still too long (reduce)
+CONDENSE_CHUNK_TOKENS = int(os.getenv("CONDENSE_CHUNK_TOKENS", "3000"))
+# Size of the shared map output that every smaller budget is reduced from. No larger than the
+# study sections' budget, so the prompts every video needs use it without another reduce call.
+CONDENSED_TOKENS = int(os.getenv("CONDENSED_TOKENS", CONTEXT_TOKENS["study_sections"]))
+CONDENSE_CONCURRENCY = 4
+
+# "<transcript hash>:map" -> condensed chunks, "<transcript hash>:<budget>" -> reduced to that budget
+condensed_store = SqliteCache(
+    "condensed_transcripts",
+    ttl=float(os.getenv("TRANSCRIPT_TTL", 30 * 24 * 3600)),
+    max_bytes=int(os.getenv("CONDENSED_STORE_MAX_MB", "100")) * 1024 * 1024
+)
+
+CONDENSE_PROMPT = """Condense this lecture transcript excerpt ({part} of {parts}) to about {words} words.
+Keep the facts, definitions, formulas, numbers and examples in the order they are presented.
+Write plain prose with no introduction or commentary.
+
+Excerpt:
+{text}
+
+Condensed:"""
+
+NO_CAPTIONS = (TranscriptsDisabled, NoTranscriptFound, NoTranscriptAvailable, VideoUnavailable)
+
+def clean_text(text: str) -> str:
+    # Clean control characters
+    text = text.replace('\n', ' ').replace('\r', ' ').replace('\t', ' ')
+    return ' '.join(text.split())  # Remove extra spaces
+
+def _rank(transcript) -> tuple:
+    """Manual captions before auto-generated ones, preferred languages first within each"""
+    language = transcript.language_code.split("-")[0]
+    preference = TRANSCRIPT_LANGUAGES.index(language) if language in TRANSCRIPT_LANGUAGES else len(TRANSCRIPT_LANGUAGES)
+    return (transcript.is_generated, preference)
+
+def stored_segments(video_id: str):
+    """Segments from the store, [] for a known caption-less video, None when not stored"""
+    index = transcript_store.get_json(video_id)
+    if index is None:
+        return None
+    if index.get("missing"):
+        return []
+    return transcript_store.get_json(f"{video_id}:{index['language']}")
+
+def fetch_segments(video_id: str) -> List[Dict]:
+    """Transcript segments ({text, start, duration}) from the store, or from YouTube on a miss"""
+    segments = stored_segments(video_id)
+    if segments is not None:
+        return segments
+
+    try:
+        # One listing call, then fetch the best candidate instead of walking every language
+        candidates = sorted(YouTubeTranscriptApi.list_transcripts(video_id), key=_rank)
+    except NO_CAPTIONS as e:
+        log.info("No transcript", extra={"video_id": video_id, "reason": type(e).__name__})
+        transcript_store.set_json(video_id, {"missing": True}, ttl=TRANSCRIPT_NEGATIVE_TTL)
+        return []
+    except Exception as e:
+        log.warning("Transcript list failed", extra={"video_id": video_id, "error": str(e)[:200]})
+        return []
+
+    for transcript in candidates:
+        try:
+            data = transcript.fetch()
+        except Exception as e:
+            log.warning("Transcript fetch failed", extra={"video_id": video_id, "error": str(e)[:200]})
+            continue
+        segments = []
+        for entry in data:
+            text = clean_text(entry['text'])
+            if text:
+                segments.append({"text": text, "start": entry.get('start', 0), "duration": entry.get('duration', 0)})
+        transcript_store.set_json(f"{video_id}:{transcript.language_code}", segments)
+        transcript_store.set_json(video_id, {"language": transcript.language_code, "generated": transcript.is_generated})
+        return segments
+    return []
+
+def join_segments(segments: List[Dict]) -> str:
+    return ' '.join(segment["text"] for segment in segments).strip()
+
+def get_transcript(video_id: str) -> str:
+    return join_segments(fetch_segments(video_id))
+
+async def load_segments(video_id: str) -> List[Dict]:
+    """Stored transcripts are read inline; only a miss goes to a thread for the network fetch"""
+    segments = stored_segments(video_id)
+    if segments is not None:
+        return segments
+    return await asyncio.to_thread(fetch_segments, video_id)
+
+async def load_transcript(video_id: str) -> str:
+    return join_segments(await load_segments(video_id))
+
+async def _condense(text: str, target_tokens: int, part: int = 1, parts: int = 1):
+    """(condensed text, True), or the head of text and False if the AI call failed"""
+    prompt = CONDENSE_PROMPT.format(part=part, parts=parts, words=target_tokens * 3 // 4, text=text)
+    result = await call_ai_with_fallback(prompt, max_tokens=min(target_tokens * 4 // 3, max_output_tokens("condense")))
+    if result:
+        return result, True
+    return truncate_to_tokens(text, target_tokens), False
+
+async def _map_condense(transcript: str):
+    chunks = chunk_text(transcript, CONDENSE_CHUNK_TOKENS)
+    share = max(150, CONDENSED_TOKENS // len(chunks))
+    semaphore = asyncio.Semaphore(CONDENSE_CONCURRENCY)
+
+    async def run(index: int, chunk: str):
+        async with semaphore:
+            return await _condense(chunk, share, index + 1, len(chunks))
+
+    results = await asyncio.gather(*(run(index, chunk) for index, chunk in enumerate(chunks)))
+    log.info("Condensed transcript", extra={"chunks": len(chunks), "tokens_per_chunk": share})
+    return "\n\n".join(text for text, _ in results), all(ok for _, ok in results)
+
+async def _stored_condense(key: str, func) -> str:
+    """Condense once across workers; results with a failed chunk are used but not stored"""
+    def lookup():
+        value = condensed_store.get(key)
+        return value.decode("utf-8") if value is not None else None
+
+    async def compute():
+        text, complete = await func()
+        if complete:
+            condensed_store.set(key, text.encode("utf-8"))
+        return text
+
+    return lookup() or await single_flight("condense", key, compute, lookup=lookup)
+
+async def fit_transcript(transcript: str, budget: int) -> str:
+    """Transcript within budget tokens: unchanged if it fits, otherwise condensed so later parts of the video still count"""
+    if not transcript or count_tokens(transcript) <= budget:
+        return transcript
+    digest = hashlib.sha1(transcript.encode("utf-8")).hexdigest()[:16]
+    condensed = transcript
+    if count_tokens(transcript) > CONDENSE_CHUNK_TOKENS:
+        condensed = await _stored_condense(f"{digest}:map", lambda: _map_condense(transcript))
+        if count_tokens(condensed) <= budget:
+            return condensed
+    reduced = await _stored_condense(f"{digest}:{budget}", lambda: _condense(condensed, budget))
+    return truncate_to_tokens(reduced, budget)
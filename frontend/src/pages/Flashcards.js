@@ -95,7 +95,8 @@ const Flashcards = () => {
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
           video_id: studyData.video_id,
-          count: 5
+          count: 5,
+          session_id: studyData.session_id
         })
       });
 
@@ -108,6 +109,7 @@ const Flashcards = () => {
 
       if (response.ok) {
         const data = await response.json();
+        studyData.session_id = studyData.session_id || data.session_id;
         setFlashcards(prev => [...prev, ...data.flashcards]);
         setLastGenerated(Date.now());
         setShowConfetti(true);
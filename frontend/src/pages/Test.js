@@ -206,12 +206,14 @@ const Test = () => {
         body: JSON.stringify({
           video_id: studyData.video_id,
           count: 5,
-          difficulty: difficulty
+          difficulty: difficulty,
+          session_id: studyData.session_id
         })
       });
 
       if (response.ok) {
         const data = await response.json();
+        studyData.session_id = studyData.session_id || data.session_id;
         if (data.quiz_questions && data.quiz_questions.length > 0) {
           studyData.quiz_questions = [...studyData.quiz_questions, ...data.quiz_questions];
           alert(`Generated ${data.quiz_questions.length} new ${difficulty} questions!`);